@@ -0,0 +1,76 @@
+import os
+import time
+import tracemalloc
+import pandas as pd
+from libraries.utils.preprocessingUtils import filterWithAccuracy
+from libraries.constants import TRAFFIC_FLOW_OPENDATA_FILE_PATH, ACCURACY_TRAFFIC_LOOP_OPENDATA_FILE_PATH, PROCESSED_DATA_PATH
+
+
+def legacyFilterWithAccuracy(file_input: str, file_accuracy: str, date_column: str, sensor_id_column: str,
+                             accepted_percentage: int) -> pd.DataFrame:
+    """
+    Previous implementation of filterWithAccuracy (column loop with string-based percentage comparison and compound
+    index filtering), kept here as reference for the benchmark.
+    """
+    df_input = pd.read_csv(file_input, sep=';', encoding="UTF-8")
+    df_accuracy = pd.read_csv(file_accuracy, sep=';', encoding="UTF-8")
+    for ind, column in enumerate(df_accuracy.columns):
+        if ind > 1:
+            df_accuracy[column] = df_accuracy[column].str.replace('%', '').astype(int)
+            df_accuracy = df_accuracy[df_accuracy[column] >= accepted_percentage]
+    keys = [date_column, sensor_id_column]
+    i1 = df_input.set_index(keys).index
+    i2 = df_accuracy.set_index(keys).index
+    return df_input[i1.isin(i2)]
+
+
+def measure(function, *args, **kwargs):
+    """
+    Execute a function measuring its elapsed time (s) and its peak of allocated memory (MB).
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 1024 ** 2
+
+
+def run(acceptedAccuracy: int = 95, chunkSize: int = 200000, repetitions: int = 3):
+    """
+    Compare the previous and the current implementation of filterWithAccuracy on the 2024 Open Data traffic flow
+    dataset, checking that both of them keep the same measurements.
+    """
+    chunkedOutput = os.path.join(PROCESSED_DATA_PATH, "benchmark_accurate_traffic_flow.csv")
+    results = []
+    try:
+        for repetition in range(repetitions):
+            legacy, legacyTime, legacyMemory = measure(legacyFilterWithAccuracy, TRAFFIC_FLOW_OPENDATA_FILE_PATH,
+                                                       ACCURACY_TRAFFIC_LOOP_OPENDATA_FILE_PATH, 'data', 'codice_spira',
+                                                       acceptedAccuracy)
+            current, currentTime, currentMemory = measure(filterWithAccuracy, TRAFFIC_FLOW_OPENDATA_FILE_PATH,
+                                                          ACCURACY_TRAFFIC_LOOP_OPENDATA_FILE_PATH, 'data',
+                                                          'codice_spira', None, acceptedAccuracy)
+            _, chunkedTime, chunkedMemory = measure(filterWithAccuracy, TRAFFIC_FLOW_OPENDATA_FILE_PATH,
+                                                    ACCURACY_TRAFFIC_LOOP_OPENDATA_FILE_PATH, 'data', 'codice_spira',
+                                                    chunkedOutput, acceptedAccuracy, chunkSize=chunkSize)
+            if not current.reset_index(drop=True).equals(legacy.reset_index(drop=True)):
+                raise ValueError("The current implementation does not keep the same measurements of the previous one.")
+            results.append({"repetition": repetition, "rows": len(current),
+                            "legacy_time": legacyTime, "current_time": currentTime, "chunked_time": chunkedTime,
+                            "legacy_memory_mb": legacyMemory, "current_memory_mb": currentMemory,
+                            "chunked_memory_mb": chunkedMemory})
+    finally:
+        if os.path.exists(chunkedOutput):
+            os.remove(chunkedOutput)
+    df = pd.DataFrame(results)
+    print(df.to_string(index=False))
+    print(f"Speedup (median): {df['legacy_time'].median() / df['current_time'].median():.2f}x, "
+          f"chunked peak memory: {df['chunked_memory_mb'].median():.1f} MB "
+          f"vs {df['legacy_memory_mb'].median():.1f} MB")
+    return df
+
+
+if __name__ == "__main__":
+    run()
@@ -1,9 +1,30 @@
 import os
+from typing import Optional
 from libraries.utils.preprocessingUtils import *
 from libraries.constants import TRAFFIC_FLOW_OPENDATA_FILE_PATH, ACCURACY_TRAFFIC_LOOP_OPENDATA_FILE_PATH, SUMO_NET_PATH, SUMO_DETECTORS_ADD_FILE_PATH, PROCESSED_TRAFFIC_FLOW_EDGE_FILE_PATH
 
 
-def run():
+def run(startDate: Optional[str] = None, endDate: Optional[str] = None, dailyDate: Optional[str] = None,
+        zoneFilePath: Optional[str] = None):
+    """
+    Run the preprocessing pipeline: the raw Open Data file is read once in chunks and all the steps below are chained,
+    writing only the final artefacts. Use runStepByStep() to execute (and inspect) every step on its own files.
+
+    :param startDate: start of the time window, formatted as 'mm/dd/yyyy' (e.g. "02/01/2024"). If None, together with
+        endDate, the entire dataset is processed.
+    :param endDate: end of the time window, formatted as 'mm/dd/yyyy' (e.g. "02/02/2024").
+    :param dailyDate: date, formatted as 'dd/mm/yyyy' (e.g. "01/02/2024"), of the daily flow file. If None, the daily
+        flow file is not generated.
+    :param zoneFilePath: statistical zones file (e.g. STATISTICAL_AREAS_OPENDATA_FILE_PATH). If None, no zone is added.
+    """
+    runPreprocessingPipeline(trafficFlowFile=TRAFFIC_FLOW_OPENDATA_FILE_PATH,
+                             accuracyFile=ACCURACY_TRAFFIC_LOOP_OPENDATA_FILE_PATH,
+                             sumoNetFile=SUMO_NET_PATH, acceptedAccuracy=95,
+                             startDate=startDate, endDate=endDate, zoneFilePath=zoneFilePath,
+                             dailyDate=dailyDate)
+
+
+def runStepByStep():
 
     #1. Fill missing direction in the Open Data traffic flow dataset according to convention
     fillMissingDirections(TRAFFIC_FLOW_OPENDATA_FILE_PATH)
@@ -33,6 +54,8 @@ def run():
     #7. Fill missing edge IDs in the road names file.
     fillMissingEdgeId(ROAD_NAMES_FILE_PATH)
     linkEdgeId(inputFile=TRAFFIC_FLOW_ACCURATE_FILE_PATH, roadnameFile=ROAD_NAMES_FILE_PATH, outputFile=PROCESSED_TRAFFIC_FLOW_EDGE_FILE_PATH)
+    #7.1 Store the processed traffic flow also as a date-partitioned dataset (PROCESSED_TRAFFIC_FLOW_DATASET_PATH)
+    generatePartitionedDataset(PROCESSED_TRAFFIC_FLOW_EDGE_FILE_PATH)
 
     #8. Generate shadow types for creating road, traffic loop shadows within the DT.
     filterForShadowManager(PROCESSED_TRAFFIC_FLOW_EDGE_FILE_PATH)
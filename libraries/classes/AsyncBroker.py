@@ -0,0 +1,335 @@
+# ****************************************************
+# Async Broker Module for Context Management:
+#   This module provides an asyncio-native facade to the FIWARE Context Broker (NGSI-LD API), to be used where many
+#   context entities are read or updated at once, e.g. when the traffic flows of many road segments are replayed.
+#   Differently from the synchronous ngsildclient Client used by Broker, the requests are sent on a shared pool of
+#   HTTP connections and several of them can be in flight at the same time, up to a bounded window.
+#   Classes:
+#       - AsyncBroker: Broker whose get/update/create/query operations are coroutines, with concurrent fan-out of
+#           get and update operations.
+#   Functions:
+#       - replayEdgeFlows: Replays the processed traffic flows of a time slot on the Context Broker through
+#           AsyncBroker.updateFlows.
+# ****************************************************
+import asyncio
+import logging
+from typing import Optional, List, Tuple, AsyncIterator, Dict, Any
+
+import httpx
+from ngsildclient import Entity
+
+from libraries.classes.Broker import Broker, RoadSegmentEntityError, TrafficFlowObservedError
+from libraries.constants import ROAD_SEGMENT_DATA_MODEL_TYPE, ROAD_DATA_MODEL_TYPE, \
+    PROCESSED_TRAFFIC_FLOW_EDGE_FILE_PATH
+from libraries.utils.datastoreUtils import loadTrafficData
+from libraries.utils.generalUtils import convertDate
+
+logger = logging.getLogger(__name__)
+
+
+def quoteQueryValue(value: str) -> str:
+    """
+    Quote a string value for an NGSI-LD q filter, escaping backslashes and double quotes, so that the value can not
+    alter the filter.
+
+    :param value: The value to be compared.
+    :return: The value between double quotes.
+    """
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+class AsyncBroker(Broker):
+    """
+    Class to manage the context entities in the Context Broker through asynchronous requests. The entity builders and
+    the progressive numbers of Broker are reused, while the requests to the Context Broker are sent by an
+    httpx.AsyncClient, which keeps a pool of open connections. A semaphore bounds the number of requests in flight,
+    so that large fan-outs do not overload the Context Broker.
+
+    Usage:
+        async with AsyncBroker(pn=1026, pnt=None, host="localhost", fiwareservice="openiot") as broker:
+            outcomes, errors = await broker.updateFlows([(edgeID, flow, date, timeSlot), ...])
+
+    Class Attributes:
+    - maxInFlight (int): Maximum number of requests in flight at the same time.
+    - maxConnections (int): Maximum number of connections kept open with the Context Broker.
+    - timeout (float): Timeout (s) of each request.
+    - client (Optional[httpx.AsyncClient]): The HTTP client, available between open and close.
+    """
+    maxInFlight: int
+    maxConnections: int
+    timeout: float
+    client: Optional[httpx.AsyncClient]
+
+    def __init__(self, pn: int, pnt: Optional[int], host: str, fiwareservice: str, maxInFlight: int = 16,
+                 maxConnections: int = 32, timeout: float = 10.0):
+        """
+        Initializes the AsyncBroker class with connection details. The connection pool is created by open.
+
+        Args:
+        :param pn: Port number for the Context Broker.
+        :param pnt: Temporal port number for the Context Broker.
+        :param host: Hostname of the Context Broker.
+        :param fiwareservice: FIWARE service/tenant name.
+        :param maxInFlight: Maximum number of requests in flight at the same time.
+        :param maxConnections: Maximum number of connections kept open with the Context Broker.
+        :param timeout: Timeout (s) of each request.
+        """
+        super().__init__(pn, pnt, host, fiwareservice)
+        self.maxInFlight = maxInFlight
+        self.maxConnections = maxConnections
+        self.timeout = timeout
+        self.client = None
+        self.inFlight = None
+
+    async def open(self):
+        """
+        Open the pool of connections to the Context Broker. Connections are established by the first requests.
+        """
+        if self.client is not None:
+            return
+        self.client = httpx.AsyncClient(
+            base_url=f"http://{self.hostname}:{self.portNumber}/ngsi-ld/v1",
+            headers={"NGSILD-Tenant": self.fiwareService, "Accept": "application/ld+json"},
+            limits=httpx.Limits(max_connections=self.maxConnections, max_keepalive_connections=self.maxConnections),
+            timeout=self.timeout)
+        self.inFlight = asyncio.Semaphore(self.maxInFlight)
+
+    async def close(self):
+        """
+        Close the pool of connections to the Context Broker.
+        """
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def __aenter__(self) -> 'AsyncBroker':
+        await self.open()
+        return self
+
+    async def __aexit__(self, excType, excValue, traceback):
+        await self.close()
+
+    async def request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        """
+        Send a request to the Context Broker, waiting for a free slot of the in-flight window.
+
+        :param method: HTTP method.
+        :param path: Path of the resource, relative to /ngsi-ld/v1.
+        :param kwargs: Other arguments of httpx.AsyncClient.request (params, json, headers).
+        :returns httpx.Response: The response of the Context Broker.
+        """
+        if self.client is None:
+            await self.open()
+        async with self.inFlight:
+            return await self.client.request(method, path, **kwargs)
+
+    async def get(self, entityID: str) -> Optional[Entity]:
+        """
+        Retrieve an entity by its ID.
+
+        :param entityID: ID of the entity.
+        :returns Optional[Entity]: The entity if found, otherwise None.
+        """
+        response = await self.request("GET", f"/entities/{entityID}",
+                                      headers={"Link": self.contextLink()})
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        return Entity.from_dict(response.json())
+
+    async def getMany(self, entityIDs: List[str]) -> List[Optional[Entity]]:
+        """
+        Retrieve several entities concurrently.
+
+        :param entityIDs: IDs of the entities.
+        :returns List[Optional[Entity]]: The entities, in the same order of the IDs (None for the missing ones).
+        """
+        return list(await asyncio.gather(*[self.get(entityID) for entityID in entityIDs]))
+
+    async def create(self, entities: List[Entity]) -> bool:
+        """
+        Create several entities with a single batch request.
+
+        :param entities: The entities to be created.
+        :returns bool: True if all the entities have been created, False otherwise.
+        """
+        response = await self.request("POST", "/entityOperations/create",
+                                      json=[entity.to_dict() for entity in entities],
+                                      headers={"Content-Type": "application/ld+json"})
+        return response.status_code == 201
+
+    async def update(self, entity: Entity, overwrite: bool = True) -> bool:
+        """
+        Update the attributes of an entity with the ones of the given entity.
+
+        :param entity: The entity containing the attributes to be updated.
+        :param overwrite: If False, the attributes already present in the Context Broker are not overwritten.
+        :returns bool: True if the update was successful, False otherwise.
+        """
+        payload = {key: value for key, value in entity.to_dict().items() if key not in ("id", "type")}
+        params = None if overwrite else {"options": "noOverwrite"}
+        response = await self.request("POST", f"/entities/{entity.id}/attrs", json=payload, params=params,
+                                      headers={"Content-Type": "application/ld+json"})
+        return response.status_code == 204
+
+    async def patchAttributes(self, entityID: str, attributes: Dict[str, Any]) -> bool:
+        """
+        Send a partial update of some attributes of an entity (NGSI-LD PATCH /entities/{id}/attrs).
+
+        :param entityID: ID of the entity.
+        :param attributes: The attributes to be updated, by name.
+        :returns bool: True if all the attributes were updated, False otherwise.
+        """
+        response = await self.request("PATCH", f"/entities/{entityID}/attrs", json=attributes,
+                                      headers={"Content-Type": "application/json", "Link": self.contextLink()})
+        return response.status_code == 204
+
+    async def updateMany(self, entities: List[Entity], overwrite: bool = True) -> List[bool]:
+        """
+        Update several entities concurrently.
+
+        :param entities: The entities containing the attributes to be updated.
+        :param overwrite: If False, the attributes already present in the Context Broker are not overwritten.
+        :returns List[bool]: The outcome of each update, in the same order of the entities.
+        """
+        return list(await asyncio.gather(*[self.update(entity, overwrite=overwrite) for entity in entities]))
+
+    async def queryGenerator(self, type: str, q: Optional[str] = None, pageSize: int = 100) -> AsyncIterator[Entity]:
+        """
+        Iterate over the entities of a given type, requesting them in pages.
+
+        :param type: Type of the entities.
+        :param q: Optional NGSI-LD query filter (e.g. 'edgeID=="123#0"').
+        :param pageSize: Number of entities requested for each page.
+        :returns AsyncIterator[Entity]: The entities matching the query.
+        """
+        offset = 0
+        while True:
+            params: Dict[str, Any] = {"type": type, "limit": pageSize, "offset": offset}
+            if q is not None:
+                params["q"] = q
+            response = await self.request("GET", "/entities", params=params, headers={"Link": self.contextLink()})
+            response.raise_for_status()
+            page = response.json()
+            for payload in page:
+                yield Entity.from_dict(payload)
+            if len(page) < pageSize:
+                break
+            offset += pageSize
+
+    async def searchEntity(self, dataSearch: str, eType: str) -> Optional[Entity]:
+        """
+        Search a Road by its name or a RoadSegment by its edge ID. The filter is evaluated by the Context Broker,
+        instead of scanning all the entities of the type; the searched value is quoted (see quoteQueryValue).
+
+        :param dataSearch: The road name (Road) or the edge ID (RoadSegment).
+        :param eType: "Road" or "RoadSegment".
+        :returns Optional[Entity]: The first entity found, otherwise None.
+        """
+        if eType == "RoadSegment":
+            query = self.queryGenerator(type=ROAD_SEGMENT_DATA_MODEL_TYPE, q=f'edgeID=={quoteQueryValue(dataSearch)}',
+                                        pageSize=1)
+        elif eType == "Road":
+            query = self.queryGenerator(type=ROAD_DATA_MODEL_TYPE, q=f'BolognaRoadName=={quoteQueryValue(dataSearch)}',
+                                        pageSize=1)
+        else:
+            return None
+        async for entity in query:
+            return entity
+        return None
+
+    async def updateFlow(self, newFlow: int, date: str, cEntity: Entity, eType: str, timeslot: str) -> bool:
+        """
+        Update the traffic flow, the date and the timeslot of a RoadSegment or TrafficFlowObserved entity.
+
+        :param newFlow: Traffic flow measured.
+        :param date: Date and time of the observation.
+        :param cEntity: The entity to be updated.
+        :param eType: "RoadSegment" or "TrafficFlowObserved".
+        :param timeslot: Time slot of the observation.
+        :returns bool: True if the update was successful, False otherwise.
+        """
+        if eType not in ("RoadSegment", "TrafficFlowObserved"):
+            return False
+        self.logFlowUpdate(cEntity, eType, newFlow, date, timeslot)
+        patch = self.buildFlowPatch(cEntity, newFlow, date, timeslot)
+        updated = await self.patchAttributes(cEntity.id, patch)
+        self.updateCount += 1
+        return updated
+
+    async def updateSegmentFlow(self, edgeID: str, trafficFlow: int, date: str, timeSlot: str) -> bool:
+        """
+        Update the traffic flow of the RoadSegment of an edge and of its TrafficFlowObserved entity. The two updates
+        are sent concurrently.
+
+        :param edgeID: The SUMO edge ID of the road segment.
+        :param trafficFlow: Traffic flow measured.
+        :param date: Date and time of the observation.
+        :param timeSlot: Time slot of the observation.
+        :returns bool: True if both the updates were successful.
+        :raise RoadSegmentEntityError: When the RoadSegment entity does not exist.
+        :raise TrafficFlowObservedError: When the TrafficFlowObserved entity does not exist.
+        """
+        roadSegment = await self.searchEntity(dataSearch=edgeID, eType="RoadSegment")
+        if roadSegment is None:
+            raise RoadSegmentEntityError("RoadSegment entity not found for edge", entityID=edgeID)
+        trafficFlowObsID = roadSegment['refTrafficFlowObs'].value
+        trafficFlowObs = await self.get(trafficFlowObsID)
+        if trafficFlowObs is None:
+            raise TrafficFlowObservedError(f"Traffic Flow Observed entity not found for the retrieved ID: {trafficFlowObsID}",
+                                           supposedID=trafficFlowObsID)
+        updated = await asyncio.gather(
+            self.updateFlow(newFlow=trafficFlow, date=date, cEntity=roadSegment, eType="RoadSegment", timeslot=timeSlot),
+            self.updateFlow(newFlow=trafficFlow, date=date, cEntity=trafficFlowObs, eType="TrafficFlowObserved",
+                            timeslot=timeSlot))
+        return all(updated)
+
+    async def updateFlows(self, updates: List[Tuple[str, int, str, str]]) -> Tuple[List[bool], Dict[str, Exception]]:
+        """
+        Update the traffic flow of many road segments concurrently. A failed update does not stop the others: the
+        error is logged, False is returned for that segment and the error is returned by edge ID.
+
+        :param updates: List of (edgeID, trafficFlow, date, timeSlot) tuples.
+        :returns Tuple[List[bool], Dict[str, Exception]]: The outcome of each update, in the same order of the input
+        list, and the errors raised by the failed ones, by edge ID.
+        """
+        errors: Dict[str, Exception] = {}
+
+        async def safeUpdate(edgeID: str, trafficFlow: int, date: str, timeSlot: str) -> bool:
+            try:
+                return await self.updateSegmentFlow(edgeID, trafficFlow, date, timeSlot)
+            except (httpx.HTTPError, RoadSegmentEntityError, TrafficFlowObservedError) as e:
+                logger.warning("Context update of edge %s failed: %s", edgeID, e)
+                errors[edgeID] = e
+                return False
+
+        outcomes = list(await asyncio.gather(*[safeUpdate(*update) for update in updates]))
+        return outcomes, errors
+
+
+def replayEdgeFlows(broker: AsyncBroker, date: str, timeSlot: str,
+                    inputFile: str = PROCESSED_TRAFFIC_FLOW_EDGE_FILE_PATH) -> int:
+    """
+    Replay on the Context Broker the traffic flows of all the edges in a time slot, read from the processed traffic
+    flow data. The RoadSegment and TrafficFlowObserved entities of the edges are updated concurrently by
+    AsyncBroker.updateFlows, instead of one measurement at a time.
+
+    :param broker: The AsyncBroker used for the updates, opened and closed by this function.
+    :param date: Date of the flows, in 'yyyy-mm-dd' format.
+    :param timeSlot: One-hour time slot of the flows (e.g. "08:00-09:00").
+    :param inputFile: The processed traffic flow data (.csv file or date-partitioned dataset).
+    :returns int: The number of edges whose entities have been updated (the failed updates are logged).
+    """
+    df = loadTrafficData(inputFile, date=date, columns=['edge_id', timeSlot]).dropna(subset=[timeSlot])
+    completeDate = convertDate(date=date, timeslot=timeSlot)
+    updates = [(str(edgeID), int(flow), completeDate, timeSlot) for edgeID, flow in zip(df['edge_id'], df[timeSlot])]
+
+    async def replay() -> Tuple[List[bool], Dict[str, Exception]]:
+        async with broker:
+            return await broker.updateFlows(updates)
+
+    outcomes, errors = asyncio.run(replay())
+    updated = sum(outcomes)
+    print(f"Traffic flows of slot {timeSlot} replayed: {updated}/{len(updates)} edges updated, "
+          f"{len(errors)} failed")
+    return updated
@@ -0,0 +1,74 @@
+# ****************************************************
+# Module Purpose:
+#   This library defines the BackgroundHTTPServer class, the base class of the small HTTP servers standing in for
+#   external services (ContextServer, QuantumLeapStandIn). Subclasses provide the request handler, the server runs
+#   in a daemon thread.
+#
+# ****************************************************
+import threading
+from abc import ABC, abstractmethod
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional, Type
+
+
+class BackgroundHTTPServer(ABC):
+    """
+    The base class of the HTTP servers running in a background thread. The server can be started again after being
+    stopped.
+
+    Attributes:
+        name (str): name of the server, used in the messages
+        host (str): interface on which the server listens
+        port (int): port on which the server listens
+        server (Optional[ThreadingHTTPServer]): the running server, if started
+        thread (Optional[threading.Thread]): the thread serving the requests, if started
+    """
+    name: str
+    host: str
+    port: int
+    server: Optional[ThreadingHTTPServer]
+    thread: Optional[threading.Thread]
+
+    def __init__(self, name: str, host: str, port: int):
+        """
+        Initializes the server, without starting it.
+
+        :param name: name of the server, used in the messages
+        :param host: interface on which the server listens
+        :param port: port on which the server listens
+        """
+        self.name = name
+        self.host = host
+        self.port = port
+        self.server = None
+        self.thread = None
+
+    @abstractmethod
+    def createHandler(self) -> Type[BaseHTTPRequestHandler]:
+        """
+        Create the request handler class of the server, implemented by the subclasses.
+        """
+
+    def start(self) -> str:
+        """
+        Start the server in a background thread.
+
+        :return: the base URL of the server
+        """
+        if self.server is None:
+            self.server = ThreadingHTTPServer((self.host, self.port), self.createHandler())
+            self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+            self.thread.start()
+            print(f"{self.name} listening on port {self.port}")
+        return f"http://{self.host}:{self.port}"
+
+    def stop(self):
+        """
+        Stop the server, waiting for its thread to terminate.
+        """
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.thread.join()
+            self.server = None
+            self.thread = None
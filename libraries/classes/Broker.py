@@ -4,20 +4,39 @@
 #   updating context entities based on Road, RoadSegment, and TrafficFlowObservation smart data models. The entities' state
 #   is update when data are received from IoT devices. Exceptions are raised and handled to indicate specific errors during entity creation, update,
 # or retrieval processes.
+#   Entity updates are logged through the module logger: entity diffs are written at DEBUG level, only for a sample of
+#   the updates, and are not serialised at all when the level is disabled. Each update is traced with the time spent
+#   looking up the entities, preparing them and sending them to the Context Broker.
+#   Flow updates are sent as NGSI-LD partial updates (PATCH /entities/{id}/attrs) containing only the attributes that
+#   changed with respect to the entity just retrieved from the Context Broker, instead of overwriting the whole entity.
+#   Entities and Link headers reference the JSON-LD context through contextUtils.resolveContextUrl, i.e. through the
+#   local ContextServer when it is configured, so that no @context is fetched from the internet.
 #   Classes:
 #       - Broker: Handles context updates, entity creation, and relations management.
 #       - ContextUpdateError: Custom base exception for context update errors.
 #       - RoadEntityError, RoadSegmentEntityError, TrafficFlowObservedError: Specific exceptions for errors related
 #           to road, road segment, and traffic flow observed entities.
 # ****************************************************
-import json
+import logging
 import time
+import requests
+from contextlib import contextmanager
 from ngsildclient import Client, Entity, Rel
-from typing import Optional, List, Tuple
+from typing import Optional, List, Tuple, Dict, Any
 from libraries.classes.DigitalShadowManager import DigitalShadowManager
 from libraries.constants import TRANSPORTATION_DATA_MODEL_CTX, ROAD_SEGMENT_DATA_MODEL_TYPE, ROAD_DATA_MODEL_TYPE
 from libraries.utils.generalUtils import convertDate
+from libraries.utils.contextUtils import resolveContextUrl
 
+logger = logging.getLogger(__name__)
+
+# Phases traced for each context update: entities lookup, local preparation of the update and HTTP request
+UPDATE_PHASES = ("lookup", "serialise", "http")
+# Attributes changed by a flow update. trafficFlow is always sent, since it is the measurement notified to the
+# subscribers, while the others are sent only if their value changed.
+FLOW_UPDATE_ATTRIBUTES = ("trafficFlow", "DateTime", "timeslot")
+# Timeout (s) of the partial updates sent on the Broker HTTP session
+UPDATE_TIMEOUT = 10.0
 
 class ContextUpdateError(Exception):
     """
@@ -67,6 +86,12 @@ class Broker:
     - fiwareService (str): FIWARE service name (tenant) for managing context entities.
     - entitiesList (List[Tuple[str, int]]): List of entity types and their progressive numbers.
     - shadowManagerReference (DigitalShadowManager):
+    - logSampleRate (int): One entity update out of logSampleRate is logged (at DEBUG level).
+    - updateCount (int): Number of entity updates sent.
+    - updateTimings (Dict[str, float]): Total time (s) spent in each traced phase of the updates.
+    - lastUpdateTiming (Dict[str, float]): Time (s) spent in each traced phase by the last context update.
+    - session (Optional[requests.Session]): HTTP session used for the partial updates, keeping the connection open.
+    - contextUrl (str): URL of the JSON-LD context referenced by the entities (local stand-in or remote).
 
     Class Methods:
     -
@@ -79,8 +104,14 @@ class Broker:
     hostname: str
     entitiesList: List[Tuple[str, int]]
     shadowManagerReference: Optional['DigitalShadowManager']
-
-    def __init__(self, pn: int, pnt: Optional[int], host: str, fiwareservice: str):
+    logSampleRate: int
+    updateCount: int
+    updateTimings: Dict[str, float]
+    lastUpdateTiming: Dict[str, float]
+    session: Optional[requests.Session]
+    contextUrl: str
+
+    def __init__(self, pn: int, pnt: Optional[int], host: str, fiwareservice: str, logSampleRate: int = 1):
         """
         Initializes the Broker class with connection details.
 
@@ -89,6 +120,7 @@ class Broker:
         :param pnt: Temporal port number for the Context Broker.
         :param host: Hostname of the Context Broker.
         :param fiwareservice: FIWARE service/tenant name.
+        :param logSampleRate: One entity update out of logSampleRate is logged (at DEBUG level).
         """
         self.portNumber = pn
         self.portTemporal = pnt
@@ -96,6 +128,12 @@ class Broker:
         self.fiwareService = fiwareservice
         self.entitiesList = []
         self.shadowManagerReference = None
+        self.logSampleRate = max(1, logSampleRate)
+        self.updateCount = 0
+        self.updateTimings = {phase: 0.0 for phase in UPDATE_PHASES}
+        self.lastUpdateTiming = {phase: 0.0 for phase in UPDATE_PHASES}
+        self.session = None
+        self.contextUrl = resolveContextUrl(TRANSPORTATION_DATA_MODEL_CTX)
 
     def createConnection(self) -> Client:
         """
@@ -181,6 +219,54 @@ class Broker:
         if not entityFound:
             self.entitiesList.append((entityType, newNumber))
 
+    @contextmanager
+    def traceSpan(self, phase: str):
+        """
+        Measure the time spent in a phase of the current context update, adding it to lastUpdateTiming and to
+        updateTimings.
+
+        :param phase: One of UPDATE_PHASES.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.lastUpdateTiming[phase] += elapsed
+            self.updateTimings[phase] += elapsed
+
+    def getUpdateTimings(self) -> Dict[str, float]:
+        """
+        Retrieve the average time (s) spent in each traced phase by the entity updates sent so far.
+
+        :returns Dict[str, float]: The average time of each phase, or 0 if no update has been sent.
+        """
+        return {phase: total / self.updateCount if self.updateCount else 0.0
+                for phase, total in self.updateTimings.items()}
+
+    def isUpdateLogged(self) -> bool:
+        """
+        Check if the current entity update has to be logged, i.e. if DEBUG logging is enabled and the update falls in
+        the sample. No entity is serialised for logging when this returns False.
+        """
+        return logger.isEnabledFor(logging.DEBUG) and self.updateCount % self.logSampleRate == 0
+
+    def logFlowUpdate(self, cEntity: Entity, eType: str, newFlow: int, date: str, timeslot: str):
+        """
+        Log the diff (old and new values of the changed attributes) of a flow update, if the update is sampled and
+        DEBUG logging is enabled.
+        """
+        if not self.isUpdateLogged():
+            return
+        diff = {}
+        for attribute, newValue in (("trafficFlow", newFlow), ("DateTime", date), ("timeslot", timeslot)):
+            try:
+                oldValue = cEntity[attribute].value
+            except Exception:
+                oldValue = None
+            diff[attribute] = (oldValue, newValue)
+        logger.debug("Updating %s entity %s: %s", eType, cEntity.id, diff)
+
     def updateContext(self, deviceID:str, date: str, timeSlot: str, trafficFlow: int, coordinates: List[float], laneDirection: str,
                       cbConnection: Optional[Client]) -> bool:
         """
@@ -201,6 +287,7 @@ class Broker:
         :raise TrafficFlowObservedError: When there is an issue with creating/updating a Traffic Flow Observed entity.
 
         """
+        self.lastUpdateTiming = {phase: 0.0 for phase in UPDATE_PHASES}
         try:
             if self.shadowManagerReference is None:
                 self.shadowManagerReference = DigitalShadowManager()
@@ -216,18 +303,22 @@ class Broker:
 
             if cbConnection is None:
                 cbConnection=self.createConnection()
-            entityRoad = self.searchEntity(cbConnection=cbConnection, dataSearch=roadName, eType="Road")
+            with self.traceSpan("lookup"):
+                entityRoad = self.searchEntity(cbConnection=cbConnection, dataSearch=roadName, eType="Road")
             if entityRoad is not None:
-                entityRoadSegment = self.searchEntity(cbConnection=cbConnection, dataSearch=edgeID, eType="RoadSegment")
+                with self.traceSpan("lookup"):
+                    entityRoadSegment = self.searchEntity(cbConnection=cbConnection, dataSearch=edgeID, eType="RoadSegment")
                 if entityRoadSegment is not None:
-                    if self.updateFlow(cbConnection=cbConnection, newFlow=trafficFlow, date=completeDate,
-                                       cEntity=entityRoadSegment, eType="RoadSegment", timeslot=timeSlot):
+                    if self.updateFlow(newFlow=trafficFlow, date=completeDate, cEntity=entityRoadSegment,
+                                       eType="RoadSegment", timeslot=timeSlot):
                         trafficFlowObsID = entityRoadSegment['refTrafficFlowObs'].value
-                        trafficFlowObs = cbConnection.get(trafficFlowObsID)
+                        with self.traceSpan("lookup"):
+                            trafficFlowObs = cbConnection.get(trafficFlowObsID)
                         if trafficFlowObs is not None:
-                            if self.updateFlow(cbConnection=cbConnection, newFlow=trafficFlow,
-                                                   date=completeDate, cEntity=trafficFlowObs,
-                                                   eType="TrafficFlowObserved", timeslot=timeSlot):
+                            if self.updateFlow(newFlow=trafficFlow, date=completeDate, cEntity=trafficFlowObs,
+                                               eType="TrafficFlowObserved", timeslot=timeSlot):
+                                logger.debug("Context update of device %s traced: %s", deviceID,
+                                             self.lastUpdateTiming)
                                 return True
                             else:
                                 raise TrafficFlowObservedError(f"Unable to update flow of Traffic Flow Observed entity for the retrieved ID: {trafficFlowObsID}",
@@ -250,7 +341,7 @@ class Broker:
                     if created and updated:
                         self.updateProgressiveNumber("RoadSegment", rsNumber)
                         self.updateProgressiveNumber("TrafficFlowObserved", tfoNumber)
-                        print(self.getProgressiveNumber("RoadSegment"))
+                        logger.debug("RoadSegment progressive number: %d", self.getProgressiveNumber("RoadSegment"))
                         return True
                     else:
                         raise ContextUpdateError("Failed to create or update context entities.", entityType=["RoadSegment", "TrafficFlowObserved"])
@@ -277,7 +368,7 @@ class Broker:
                                 edgeID: str, trafficFlow: int, date: str, trafficLoopID: str, timeslot: str) -> Entity:
 
         roadSegmentID = 'RS{:03d}'.format(progressiveNumber)
-        roadSegment = Entity("RoadSegment", roadSegmentID, ctx=TRANSPORTATION_DATA_MODEL_CTX)
+        roadSegment = Entity("RoadSegment", roadSegmentID, ctx=self.contextUrl)
         roadSegment.prop('startPoint', int(startPoint))
         roadSegment.prop('endPoint', int(endPoint))
         if len(coordinates) == 2:
@@ -303,7 +394,7 @@ class Broker:
     def createTrafficFlowObsEntity(self, progressiveNumber: int, direction: str, trafficFlow: int, date: str,
                                    trafficLoopID: str, roadSegmentID: str, timeslot: str) -> Entity:
         trafficFlowID = 'TFO{:03d}'.format(progressiveNumber)
-        trafficFlowObs = Entity("TrafficFlowObserved", trafficFlowID, ctx=TRANSPORTATION_DATA_MODEL_CTX)
+        trafficFlowObs = Entity("TrafficFlowObserved", trafficFlowID, ctx=self.contextUrl)
         trafficFlowObs.prop('laneDirection', direction)
         trafficFlowObs.rel('refRoadSegment', roadSegmentID)
         trafficFlowObs.prop('trafficFlow', trafficFlow).rel(Rel.OBSERVED_BY, roadSegmentID, nested=True)
@@ -314,7 +405,7 @@ class Broker:
 
     def createRoadEntity(self,progressiveNumber: int, roadName: str) -> Entity:
         roadID = 'R{:03d}'.format(progressiveNumber)
-        road = Entity("Road", roadID, ctx=TRANSPORTATION_DATA_MODEL_CTX)
+        road = Entity("Road", roadID, ctx=self.contextUrl)
         road.prop('BolognaRoadName', roadName)
         return road
 
@@ -333,31 +424,88 @@ class Broker:
             e: Entity | None = next((e for e in generator if e["BolognaRoadName"].value == dataSearch), None)
             return e
 
-    def updateFlow(self, cbConnection: Client, newFlow: int, date: str, cEntity: Entity, eType: str, timeslot: str) -> bool:
-        if eType == "RoadSegment":
-            cEntity["trafficFlow"].value = newFlow
-            cEntity.tprop("DateTime",date)
-            cEntity.prop('timeslot', timeslot)
-            # print("Updating RoadSegment Entity: " + json.dumps(cEntity.to_json(), indent=4))
-            output = json.dumps(json.loads(cEntity.to_json()), indent=4, ensure_ascii=False)
-            print("Updating RoadSegment Entity: ")
-            # time.sleep(1)
-            print(output)
-            # time.sleep(3)
-            response = cbConnection.update(cEntity, overwrite=True)
-            return response
-        elif eType=="TrafficFlowObserved":
-            cEntity["trafficFlow"].value = newFlow
-            cEntity.tprop('DateTime',date)
-            cEntity.prop('timeslot', timeslot)
-            output = json.dumps(json.loads(cEntity.to_json()), indent=4, ensure_ascii=False)
-            print("Updating TrafficFlowObserved Entity: ")
-            # time.sleep(1)
-            print(output)
-            # time.sleep(3)
-            response = cbConnection.update(cEntity, overwrite=True)
-            return response
-        else:
-            return False
+    def contextLink(self) -> str:
+        """
+        Link header pointing to the JSON-LD context of the transportation data models, so that plain JSON payloads and
+        queries are expanded with the same context used to create the entities.
+        """
+        return f'<{self.contextUrl}>; rel="http://www.w3.org/ns/json-ld#context"; type="application/ld+json"'
 
+    def getSession(self) -> requests.Session:
+        """
+        Get the HTTP session used for the partial updates, creating it at the first call. The session sends the tenant
+        and the JSON-LD context as headers, so that they are not repeated in every payload.
+        """
+        if self.session is None:
+            self.session = requests.Session()
+            self.session.headers.update({"Content-Type": "application/json", "NGSILD-Tenant": self.fiwareService,
+                                         "Link": self.contextLink()})
+        return self.session
 
+    def buildFlowPatch(self, cEntity: Entity, newFlow: int, date: str, timeslot: str) -> Dict[str, Any]:
+        """
+        Build the partial update payload of a flow update, containing trafficFlow and the other attributes of
+        FLOW_UPDATE_ATTRIBUTES whose value differs from the one of the entity as retrieved from the Context Broker.
+        The update is applied to a copy of the entity, which is not modified. Attributes are sent whole, so that their
+        sub-attributes (e.g. the observedBy relationship of trafficFlow) are preserved.
+
+        :param cEntity: The entity to be updated, as just retrieved from the Context Broker.
+        :param newFlow: Traffic flow measured.
+        :param date: Date and time of the observation.
+        :param timeslot: Time slot of the observation.
+        :returns Dict[str, Any]: The attributes to be sent, by name.
+        """
+        retrievedValues = {}
+        for attribute in FLOW_UPDATE_ATTRIBUTES:
+            try:
+                retrievedValues[attribute] = cEntity[attribute].value
+            except Exception:
+                retrievedValues[attribute] = None
+        updated = cEntity.dup()
+        updated["trafficFlow"].value = newFlow
+        updated.tprop("DateTime", date)
+        updated.prop('timeslot', timeslot)
+        patch = {}
+        for attribute in FLOW_UPDATE_ATTRIBUTES:
+            if attribute == "trafficFlow" or updated[attribute].value != retrievedValues[attribute]:
+                patch[attribute] = dict(updated[attribute])
+        return patch
+
+    def patchAttributes(self, entityID: str, attributes: Dict[str, Any]) -> bool:
+        """
+        Send a partial update of some attributes of an entity (NGSI-LD PATCH /entities/{id}/attrs).
+
+        :param entityID: ID of the entity.
+        :param attributes: The attributes to be updated, by name.
+        :returns bool: True if all the attributes were updated, False otherwise.
+        """
+        url = f"http://{self.hostname}:{self.portNumber}/ngsi-ld/v1/entities/{entityID}/attrs"
+        response = self.getSession().patch(url, json=attributes, timeout=UPDATE_TIMEOUT)
+        if response.status_code != 204:
+            logger.warning("Partial update of entity %s failed (%d): %s", entityID, response.status_code,
+                           response.text)
+            return False
+        return True
+
+    def updateFlow(self, newFlow: int, date: str, cEntity: Entity, eType: str, timeslot: str) -> bool:
+        """
+        Update the traffic flow, the date and the timeslot of a RoadSegment or TrafficFlowObserved entity, sending
+        only the changed attributes on the Broker HTTP session (see getSession). When the update is logged, only the
+        changed attributes (old and new values) are written.
+
+        :param newFlow: Traffic flow measured.
+        :param date: Date and time of the observation.
+        :param cEntity: The entity to be updated.
+        :param eType: "RoadSegment" or "TrafficFlowObserved".
+        :param timeslot: Time slot of the observation.
+        :returns bool: True if the update was successful, False otherwise.
+        """
+        if eType not in ("RoadSegment", "TrafficFlowObserved"):
+            return False
+        with self.traceSpan("serialise"):
+            self.logFlowUpdate(cEntity, eType, newFlow, date, timeslot)
+            patch = self.buildFlowPatch(cEntity, newFlow, date, timeslot)
+        with self.traceSpan("http"):
+            response = self.patchAttributes(cEntity.id, patch)
+        self.updateCount += 1
+        return response
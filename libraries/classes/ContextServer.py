@@ -0,0 +1,75 @@
+# ****************************************************
+# Module Purpose:
+#   This library defines the ContextServer class, a small HTTP server that publishes the local copies of the JSON-LD
+#   contexts registered in contextUtils.CONTEXT_REGISTRY. It stands in for the remote context URLs (GitHub) when the
+#   deployment has no internet access: the Context Broker resolves the @context of the entities against it.
+#
+#   The documents are the unmodified upstream copies saved by contextUtils.refreshContexts; the missing ones are
+#   downloaded once at start-up (when the machine is online), then all of them are read and kept in memory, and responses carry an ETag and a long Cache-Control so that the Context Broker can
+#   cache them.
+#
+# ****************************************************
+import hashlib
+from http.server import BaseHTTPRequestHandler
+from typing import Dict, Tuple
+
+from libraries.classes.BackgroundHTTPServer import BackgroundHTTPServer
+from libraries.constants import JSONLD_CONTEXT_SERVER_PORT, JSONLD_CONTEXTS_PATH
+from libraries.utils.contextUtils import CONTEXT_REGISTRY, readContextDocument, refreshContexts
+
+
+class ContextServer(BackgroundHTTPServer):
+    """
+    HTTP stand-in for the remote JSON-LD contexts.
+
+    Attributes (see BackgroundHTTPServer for the server ones):
+        documents (Dict[str, Tuple[bytes, str]]): body and ETag of each served context, by request path
+    """
+    documents: Dict[str, Tuple[bytes, str]]
+
+    def __init__(self, host: str = "0.0.0.0", port: int = JSONLD_CONTEXT_SERVER_PORT,
+                 contextsPath: str = JSONLD_CONTEXTS_PATH):
+        """
+        Initializes the server, loading the registered contexts in memory. The contexts without a local copy are
+        downloaded first, so that an online machine prepares the copies used later offline.
+
+        :param host: interface on which the server listens
+        :param port: port on which the server listens
+        :param contextsPath: folder containing the local copies of the contexts
+        :raises ValueError: if the local copy of a registered context is missing and cannot be downloaded
+        """
+        super().__init__("JSON-LD context server", host, port)
+        refreshContexts(contextsPath, missingOnly=True)
+        self.documents = {}
+        for contextUrl, fileName in CONTEXT_REGISTRY.items():
+            body = readContextDocument(contextUrl, contextsPath)
+            self.documents["/" + fileName] = (body, '"' + hashlib.sha1(body).hexdigest() + '"')
+
+    def createHandler(self):
+        documents = self.documents
+
+        class ContextRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                document = documents.get(self.path.split("?")[0])
+                if document is None:
+                    self.send_error(404, "Unknown JSON-LD context")
+                    return
+                body, etag = document
+                if self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/ld+json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", "public, max-age=86400")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # requests are not logged, the Context Broker may fetch the contexts very often
+                pass
+
+        return ContextRequestHandler
@@ -1,11 +1,86 @@
+import io
+import os
 import pandas as pd
 import typing
 from typing import Optional
+import threading
+import time
+import json
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
 import psycopg2
+import pyarrow as pa
+import pyarrow.csv
+from psycopg2 import sql
 from psycopg2.extensions import connection as PsycopgConnection, cursor as PsycopgCursor
+from psycopg2.pool import ThreadedConnectionPool
 from pymongo import MongoClient
 from pymongo.database import Database
 from datetime import datetime
+from libraries.utils.simulationOutputUtils import readSlotOutputs
+
+# Schema and tables in which QuantumLeap stores the NGSI-LD entity types
+QUANTUMLEAP_SCHEMA = "mtopeniot"
+QUANTUMLEAP_TABLES = {
+    "roadsegment": "ethttps://smartdatamodels.org/datamodel.transportation/roadsegm",
+    "trafficflowobserved": "ethttps://smartdatamodels.org/datamodel.transportation/trafficf",
+    "device": "etdevice",
+}
+# Hourly continuous aggregates (edge x hour) used for the slot retrievals, by entity type
+CONTINUOUS_AGGREGATES = {
+    "roadsegment": {
+        "view": "roadsegment_flow_hourly",
+        "groupColumns": "edgeid",
+        "valueColumns": ", last(ST_X(location), time_index) AS lat, last(ST_Y(location), time_index) AS lon",
+    },
+    "trafficflowobserved": {
+        "view": "trafficflowobserved_flow_hourly",
+        "groupColumns": "refroadsegment",
+        "valueColumns": "",
+    },
+}
+# Number of slot retrievals kept in cache, and seconds after which they are read again
+SLOT_CACHE_SIZE = 256
+SLOT_CACHE_TTL = 600
+# Policies used to route the reads across the managers of a database type
+LEAST_LOADED = "least-loaded"
+ROUND_ROBIN = "round-robin"
+READ_POLICIES = (LEAST_LOADED, ROUND_ROBIN)
+# Seconds after which the health of a database manager is checked again
+HEALTH_CHECK_INTERVAL = 30
+# Seconds within which a database must answer a health check, and a TimescaleDB connection must be established
+HEALTH_CHECK_TIMEOUT = 5
+CONNECT_TIMEOUT = 5
+# Connections kept open and maximum connections of each TimescaleDB connection pool
+POOL_MIN_CONNECTIONS = 1
+POOL_MAX_CONNECTIONS = 10
+# Rows fetched from the server at each round trip by the server-side cursors
+STREAM_CHUNK_SIZE = 10000
+# Schema and hypertables of the simulation results. Every table also has the time, run_id and timeslot columns
+SIMULATION_SCHEMA = "simulation"
+SIMULATION_RUNS_TABLE = "runs"
+SIMULATION_TABLES = {
+    "edgedata": {"edge_id": "TEXT", "interval_begin": "DOUBLE PRECISION", "interval_end": "DOUBLE PRECISION",
+                 "sampled_seconds": "DOUBLE PRECISION", "entered": "DOUBLE PRECISION", "left_count": "DOUBLE PRECISION",
+                 "density": "DOUBLE PRECISION", "lane_density": "DOUBLE PRECISION", "occupancy": "DOUBLE PRECISION",
+                 "waiting_time": "DOUBLE PRECISION", "time_loss": "DOUBLE PRECISION", "speed": "DOUBLE PRECISION",
+                 "travel_time": "DOUBLE PRECISION"},
+    "tripinfo": {"vehicle_id": "TEXT", "vtype": "TEXT", "depart": "DOUBLE PRECISION",
+                 "depart_delay": "DOUBLE PRECISION", "arrival": "DOUBLE PRECISION", "duration": "DOUBLE PRECISION",
+                 "route_length": "DOUBLE PRECISION", "waiting_time": "DOUBLE PRECISION",
+                 "time_loss": "DOUBLE PRECISION"},
+    "summary": {"step_time": "DOUBLE PRECISION", "loaded": "INTEGER", "inserted": "INTEGER", "running": "INTEGER",
+                "waiting": "INTEGER", "ended": "INTEGER", "halting": "INTEGER", "mean_speed": "DOUBLE PRECISION",
+                "mean_waiting_time": "DOUBLE PRECISION", "mean_travel_time": "DOUBLE PRECISION"},
+    "macroscopic": {"edge_id": "TEXT", "length": "DOUBLE PRECISION", "lanecount": "INTEGER",
+                    "flow": "DOUBLE PRECISION", "vehiclespersecond": "DOUBLE PRECISION",
+                    "vpsperlane": "DOUBLE PRECISION", "lanevps": "DOUBLE PRECISION", "density": "DOUBLE PRECISION",
+                    "lanedensity": "DOUBLE PRECISION", "maxdensity": "DOUBLE PRECISION", "vmax": "DOUBLE PRECISION",
+                    "velocity": "DOUBLE PRECISION", "normvelocity": "DOUBLE PRECISION"},
+}
+# Seconds, from the start of the slot, at which each row of the simulation tables happens
+SIMULATION_TIME_OFFSETS = {"edgedata": "interval_begin", "tripinfo": "depart", "summary": "step_time"}
 
 
 #TODO: this class is responsible for managing all data. this means that has to be enriched
@@ -16,75 +91,163 @@ class DataManager:
     across the Digital Twin platform. It allows for adding and retrieving various database managers, and
     fetching connections to work with the database.
 
+    Several managers can be added for the same database type: the first one (or the one added with primary=True) is
+    the primary, which receives the writes, while the reads are routed across all the healthy managers of the type
+    (primary and read replicas), either to the least loaded one or round-robin. Managers are health-checked at most
+    every healthCheckInterval seconds and unhealthy ones are skipped until they recover.
+
     Class Attributes:
     - name (str): The name of the data management system.
     - dbManagersByTypes (Dict[str, List[Any]]): A dictionary to store database managers by type.
+    - primaryManagers (Dict[str, Any]): The primary (write) manager of each database type.
+    - readPolicy (str): How reads are routed across the managers of a type ("least-loaded" or "round-robin").
+    - healthCheckInterval (float): Seconds after which the health of a manager is checked again.
+    - connectionPools (Dict[Tuple[int, str], ThreadedConnectionPool]): The connection pools of the process, by process
+      id and connection string. The dictionary is process-wide on purpose: all the DataManager instances and managers
+      connecting to the same database share one pool, guarded by connectionPoolsLock.
 
     Class Methods:
     - addDBManager: Adds database managers to the system.
-    - getDBManagerByType: Retrieves the database manager for the requested database type.
+    - getDBManagerByType: Retrieves the database manager for the requested database type, for reads or writes.
+    - getDBManagersByType: Retrieves all the database managers of a type.
     - getDBConnectionByType: Retrieves the database connection and related attributes for the requested type.
+    - checkHealth: Checks the health of the database managers.
+    - getConnectionPool: Retrieves (creating it if needed) the connection pool of a database.
+    - closeConnectionPools: Closes all the connection pools of the process.
     """
 
     name: str
     dbManagersByTypes: typing.Dict[str, typing.List[typing.Any]]
-
-    def __init__(self, name: str):
+    primaryManagers: typing.Dict[str, typing.Any]
+    readPolicy: str
+    healthCheckInterval: float
+    # shared by all the instances (see getConnectionPool), so that a database has a single pool for each process
+    connectionPools: typing.Dict[typing.Tuple[int, str], ThreadedConnectionPool] = {}
+    connectionPoolsLock = threading.Lock()
+
+    def __init__(self, name: str, readPolicy: str = LEAST_LOADED, healthCheckInterval: float = HEALTH_CHECK_INTERVAL):
         """
         Initializes the DataManager with a default name for the data management system.
 
         :param name: The name of the data management system.
+        :param readPolicy: How reads are routed across the managers of a type: "least-loaded" (default) or
+        "round-robin".
+        :param healthCheckInterval: Seconds after which the health of a manager is checked again (0 checks it at
+        every routing).
+        :raises ValueError: If the read policy is not supported.
         """
+        if readPolicy not in READ_POLICIES:
+            raise ValueError(f"Unsupported read policy: {readPolicy}. Supported policies: {READ_POLICIES}")
         self.name = name
         self.dbManagersByTypes = {}
+        self.primaryManagers = {}
+        self.readPolicy = readPolicy
+        self.healthCheckInterval = healthCheckInterval
+        self.routingCounters = {}
+        self.routingLock = threading.Lock()
+
+    @staticmethod
+    def normalizeType(dbType: str) -> str:
+        """
+        Get the database type used as key of the managers (e.g. "TimescaleDBManager" -> "TimescaleDB").
+        """
+        return dbType.replace("Manager", "")
 
-    def addDBManager(self, dbManager: typing.Any):
+    def addDBManager(self, dbManager: typing.Any, primary: Optional[bool] = None):
         """
         Adds a new database manager to the dictionary of managers by type.
 
         :param dbManager: The database manager instance (e.g., TimescaleManager, MongoDBManager).
+        :param primary: If True, the manager becomes the primary of its type. If None, it is the primary only if it is
+        the first manager of its type, otherwise it is used as a read replica.
         """
-        dbType = dbManager.name.replace("Manager", "")
+        dbType = self.normalizeType(dbManager.name)
         if dbType not in self.dbManagersByTypes:
             self.dbManagersByTypes[dbType] = []
         self.dbManagersByTypes[dbType].append(dbManager)
-        print(f"Added {dbType} database manager reference.")
+        if primary or (primary is None and dbType not in self.primaryManagers):
+            self.primaryManagers[dbType] = dbManager
+        role = "primary" if self.primaryManagers[dbType] is dbManager else "replica"
+        print(f"Added {dbType} database manager reference ({role}).")
 
-    def getDBManagerByType(self, dbType: str) -> typing.Any:
+    def getDBManagersByType(self, dbType: str) -> typing.List[typing.Any]:
         """
-        Retrieves a specific database manager for the given database type.
+        Retrieves all the database managers of the given database type, the primary first.
 
         :param dbType: The type of the database (e.g., "TimescaleDB", "MongoDB").
-        :return: The database manager for the specified type.
+        :return: The list of database managers.
         :raises ValueError: If the specified database type is not found.
         """
-        dbType = dbType.replace("Manager", "")
-        if dbType in self.dbManagersByTypes:
-            return self.dbManagersByTypes[dbType][0]  # Return the first manager of that type
-        else:
+        dbType = self.normalizeType(dbType)
+        if dbType not in self.dbManagersByTypes:
             raise ValueError(f"No database connections found for type: {dbType}")
+        primary = self.primaryManagers[dbType]
+        return [primary] + [manager for manager in self.dbManagersByTypes[dbType] if manager is not primary]
 
+    def checkHealth(self, dbType: Optional[str] = None, force: bool = True) -> typing.Dict[str, bool]:
+        """
+        Checks the health of the database managers, recording the outcome in each manager.
 
-    def getDBConnectionByType(self, dbType: str):
+        :param dbType: Optional type of the database, if None the managers of all types are checked.
+        :param force: If False, managers checked less than healthCheckInterval seconds ago are not checked again.
+        :return: The health of each checked manager, by manager name and connection description.
+        """
+        dbTypes = [self.normalizeType(dbType)] if dbType is not None else list(self.dbManagersByTypes)
+        health = {}
+        for currentType in dbTypes:
+            for manager in self.getDBManagersByType(currentType):
+                if force or time.monotonic() - manager.lastHealthCheck >= self.healthCheckInterval:
+                    manager.checkHealth()
+                health[f"{manager.name}@{manager.describe()}"] = manager.healthy
+        return health
+
+    def getDBManagerByType(self, dbType: str, readOnly: bool = False) -> typing.Any:
+        """
+        Retrieves a specific database manager for the given database type. Writes are pinned to the primary, reads
+        are routed according to the read policy across the healthy managers of the type.
+
+        :param dbType: The type of the database (e.g., "TimescaleDB", "MongoDB").
+        :param readOnly: If True, the manager is only used for reads and can be a read replica.
+        :return: The database manager for the specified type.
+        :raises ValueError: If the specified database type is not found.
+        """
+        managers = self.getDBManagersByType(dbType)
+        if not readOnly or len(managers) == 1:
+            return managers[0]
+        self.checkHealth(dbType, force=False)
+        healthy = [manager for manager in managers if manager.healthy]
+        if not healthy:
+            # nothing better can be done than trying the primary
+            return managers[0]
+        dbType = self.normalizeType(dbType)
+        with self.routingLock:
+            counter = self.routingCounters.get(dbType, 0)
+            self.routingCounters[dbType] = counter + 1
+        if self.readPolicy == ROUND_ROBIN:
+            return healthy[counter % len(healthy)]
+        # least loaded manager, ties are broken round-robin so that idle replicas share the reads
+        rotated = healthy[counter % len(healthy):] + healthy[:counter % len(healthy)]
+        return min(rotated, key=lambda manager: manager.getLoad())
+
+    def getDBConnectionByType(self, dbType: str, readOnly: bool = False):
         """
         Retrieves the connection and related attributes for a specific database type.
 
         :param dbType: The type of the database (e.g., "TimescaleDBManager", "MongoDBManager").
-        :return: The connection and cursor for TimescaleDBManager or client and db for MongoDBManager.
+        :param readOnly: If True, the connection is only used for reads and can be the one of a read replica.
+        :return: The connection pool and connection string for TimescaleDBManager or client and db for MongoDBManager.
         :raises ValueError: If the specified database type is not found or not supported.
         """
-        if dbType not in self.dbManagersByTypes:
-            raise ValueError(f"No database managers found for type: {dbType}")
-
-        manager = self.dbManagersByTypes[dbType]#[0]
+        manager = self.getDBManagerByType(dbType, readOnly=readOnly)
+        dbType = self.normalizeType(dbType)
 
         if dbType == "TimescaleDB" or dbType == "Timescale":
             # Ensure the manager has the required attributes
-            if hasattr(manager, 'connection') and hasattr(manager, 'cursor'):
-                return manager.connection, manager.cursor
+            if hasattr(manager, 'connectionPool') and hasattr(manager, 'connectionString'):
+                return manager.connectionPool, manager.connectionString
             else:
                 raise AttributeError(
-                    f"The manager for {dbType} does not have the required attributes (connection, cursor).")
+                    f"The manager for {dbType} does not have the required attributes (connectionPool, connectionString).")
 
         elif dbType == "MongoDB" or dbType == "Mongo":
             if hasattr(manager, 'client') and hasattr(manager, 'db'):
@@ -95,6 +258,35 @@ class DataManager:
         else:
             raise ValueError(f"Unsupported database type: {dbType}")
 
+    @classmethod
+    def getConnectionPool(cls, connectionString: str, minConnections: int = POOL_MIN_CONNECTIONS,
+                          maxConnections: int = POOL_MAX_CONNECTIONS) -> ThreadedConnectionPool:
+        """
+        Retrieves the connection pool of a database, creating it at the first request of the process. Pools inherited
+        from a parent process (e.g. by forked workers) are not reused, since their connections can not be shared.
+
+        :param connectionString: The connection string of the database.
+        :param minConnections: The number of connections opened when the pool is created.
+        :param maxConnections: The maximum number of connections of the pool.
+        :return: The thread-safe connection pool of the database.
+        """
+        key = (os.getpid(), connectionString)
+        with cls.connectionPoolsLock:
+            if key not in cls.connectionPools:
+                cls.connectionPools[key] = ThreadedConnectionPool(minConnections, maxConnections, connectionString)
+            return cls.connectionPools[key]
+
+    @classmethod
+    def closeConnectionPools(cls):
+        """
+        Closes all the connection pools created by the process.
+        """
+        with cls.connectionPoolsLock:
+            for (pid, connectionString), pool in list(cls.connectionPools.items()):
+                if pid == os.getpid():
+                    pool.closeall()
+                    del cls.connectionPools[(pid, connectionString)]
+
 
 class DBManager:
     """
@@ -102,8 +294,19 @@ class DBManager:
 
     Class Attributes:
     - name (str): The name of the database manager.
+    - healthy (bool): The outcome of the last health check.
+    - lastHealthCheck (float): The time (time.monotonic) of the last health check.
+
+    Class Methods:
+    - checkHealth: Checks whether the database can be reached.
+    - getLoad: Gets the number of operations currently running on the database.
+    - describe: Gets a description of the database, without credentials.
     """
 
+    name: str
+    healthy: bool
+    lastHealthCheck: float
+
     def __init__(self, name: str):
         """
         Initializes the DBManager with a default name.
@@ -111,6 +314,45 @@ class DBManager:
         :param name: The name of the database manager.
         """
         self.name = name
+        self.healthy = True
+        self.lastHealthCheck = float("-inf")
+
+    def ping(self):
+        """
+        Run the cheapest possible operation on the database, raising an exception if it can not be reached.
+        """
+        pass
+
+    def checkHealth(self) -> bool:
+        """
+        Checks whether the database can be reached, recording the outcome in healthy.
+
+        :return: True if the database is healthy.
+        """
+        try:
+            self.ping()
+            healthy = True
+        except Exception as e:
+            print(f"Health check of {self.name}@{self.describe()} failed: {e}")
+            healthy = False
+        if healthy and not self.healthy:
+            print(f"{self.name}@{self.describe()} is healthy again.")
+        self.healthy = healthy
+        self.lastHealthCheck = time.monotonic()
+        return healthy
+
+    def getLoad(self) -> int:
+        """
+        Gets the number of operations currently running on the database, used to route reads to the least loaded
+        manager.
+        """
+        return 0
+
+    def describe(self) -> str:
+        """
+        Gets a description of the database (e.g. host and port), without credentials.
+        """
+        return ""
 
 class TimescaleManager(DBManager):
     """
@@ -119,21 +361,32 @@ class TimescaleManager(DBManager):
 
     Class Attributes:
     - connectionString (str): The connection string for connecting to the database.
-    - connection (psycopg2.connection): The connection object for interacting with the TimescaleDB.
-    - cursor (psycopg2.cursor): The cursor object for executing SQL queries.
+    - connectionPool (ThreadedConnectionPool): The connection pool of the database, owned by DataManager and created
+      at the first use.
+    - slotCache (OrderedDict): LRU cache of the slot retrievals, keyed by (entity type, date, timeslot).
+    - aggregatesAvailable (Dict[str, bool]): Whether each continuous aggregate exists in the database.
 
     Class Methods:
-    - dbConnect: Establishes a connection to the TimescaleDB.
-    - storeSimulationData: Stores simulation data in the TimescaleDB.
+    - configureConnection: Sets the connection string and the pool size, without connecting.
+    - dbConnect: Retrieves the connection pool of the TimescaleDB.
+    - getConnection / getCursor: Borrow a pooled connection (or a cursor on it) for a transaction.
+    - streamQuery: Streams the results of a query in DataFrame chunks through a server-side cursor.
+    - copyQuery: Reads the results of a query through COPY into an Arrow table or a DataFrame.
+    - createContinuousAggregates: Creates the hourly continuous aggregates over the QuantumLeap tables.
+    - createSimulationTables: Creates the hypertables of the simulation results.
+    - retrieveHistoricalDataForTimeslot: Retrieves the historical data of a time slot.
+    - storeSimulationData: Stores the outputs of a one-hour slot simulation in the TimescaleDB through COPY.
     - retrieveHistoricalData: Retrieves historical data from the TimescaleDB.
     """
 
     connectionString: str
-    connection: Optional[PsycopgConnection]
-    cursor: Optional[PsycopgCursor]
+    slotCache: "OrderedDict[typing.Tuple[str, str, str], typing.Tuple[float, pd.DataFrame]]"
+    aggregatesAvailable: typing.Dict[str, bool]
 
     def __init__(self, host="localhost", port="5432", dbname="quantumleap", username="postgres",
-                 password="postgres", managerName: Optional[str] = "TimescaleDBManager"):
+                 password="postgres", managerName: Optional[str] = "TimescaleDBManager",
+                 slotCacheSize: int = SLOT_CACHE_SIZE, slotCacheTTL: float = SLOT_CACHE_TTL,
+                 minConnections: int = POOL_MIN_CONNECTIONS, maxConnections: int = POOL_MAX_CONNECTIONS):
         """
         Initializes the TimescaleManager with a connection to a TimescaleDB.
 
@@ -143,74 +396,486 @@ class TimescaleManager(DBManager):
         :param username: The username for the database (default is 'postgres').
         :param password: The password for the database (default is 'postgres').
         :param managerName: Optional name to identify this manager. If not provided, defaults to 'TimescaleDBManager'.
+        :param slotCacheSize: Number of slot retrievals kept in cache (0 disables the cache).
+        :param slotCacheTTL: Seconds after which a cached slot retrieval is read again from the database.
+        :param minConnections: The number of connections opened when the pool is created.
+        :param maxConnections: The maximum number of connections of the pool.
         """
         super().__init__(name=managerName)
-        self.connection, self.cursor = self.dbConnect(host=host, port=port, dbname=dbname, username=username, password=password)
+        self.slotCache = OrderedDict()
+        self.slotCacheSize = slotCacheSize
+        self.slotCacheTTL = slotCacheTTL
+        self.slotCacheLock = threading.Lock()
+        self.aggregatesAvailable = {}
+        self.activeConnections = 0
+        self.activeConnectionsLock = threading.Lock()
+        # the pool is only created at the first use, so that an unreachable database (e.g. a read replica that is
+        # down) does not prevent the creation of the manager and is reported as unhealthy by checkHealth
+        self.configureConnection(host=host, port=port, dbname=dbname, username=username, password=password,
+                                 minConnections=minConnections, maxConnections=maxConnections)
+
+    def configureConnection(self, host="localhost", port="5432", dbname="quantumleap", username="postgres",
+                            password="postgres", minConnections: int = POOL_MIN_CONNECTIONS,
+                            maxConnections: int = POOL_MAX_CONNECTIONS):
+        """
+        Sets the connection string and the size of the connection pool of a TimescaleDB database, without connecting.
+
+        :param host: The database host (default is localhost).
+        :param port: The database port (default is 5432).
+        :param dbname: The name of the database (default is 'quantumleap').
+        :param username: The username for the database (default is 'postgres').
+        :param password: The password for the database (default is 'postgres').
+        :param minConnections: The number of connections opened when the pool is created.
+        :param maxConnections: The maximum number of connections of the pool.
+        """
+        self.address = f"{host}:{port}/{dbname}"
+        self.connectionString = f"postgres://{username}:{password}@{host}:{port}/{dbname}?connect_timeout={CONNECT_TIMEOUT}"
+        self.minConnections = minConnections
+        self.maxConnections = maxConnections
 
     def dbConnect(self, host="localhost", port="5432", dbname="quantumleap", username="postgres",
-                  password="postgres") -> typing.Tuple[PsycopgConnection, PsycopgCursor]:
+                  password="postgres", minConnections: int = POOL_MIN_CONNECTIONS,
+                  maxConnections: int = POOL_MAX_CONNECTIONS) -> ThreadedConnectionPool:
         """
-        Establishes a connection to a TimescaleDB database using psycopg2.
+        Retrieves the pool of connections to a TimescaleDB database, shared with the other managers of the process
+        connecting to the same database.
 
         :param host: The database host (default is localhost).
         :param port: The database port (default is 5432).
         :param dbname: The name of the database (default is 'quantumleap').
         :param username: The username for the database (default is 'postgres').
         :param password: The password for the database (default is 'postgres').
-        :return: A tuple containing the connection and cursor objects.
+        :param minConnections: The number of connections opened when the pool is created.
+        :param maxConnections: The maximum number of connections of the pool.
+        :return: The connection pool.
+        """
+        self.configureConnection(host=host, port=port, dbname=dbname, username=username, password=password,
+                                 minConnections=minConnections, maxConnections=maxConnections)
+        return self.connectionPool
+
+    @property
+    def connectionPool(self) -> ThreadedConnectionPool:
+        """
+        The pool of connections to the database, created at the first use (see DataManager.getConnectionPool).
+
+        :raises psycopg2.OperationalError: If the pool is created and the database can not be reached.
         """
-        self.connectionString = f"postgres://{username}:{password}@{host}:{port}/{dbname}"
-        connection = psycopg2.connect(self.connectionString)
-        cursor = connection.cursor()
-        return connection, cursor
+        return DataManager.getConnectionPool(self.connectionString, minConnections=self.minConnections,
+                                             maxConnections=self.maxConnections)
 
+    @contextmanager
+    def getConnection(self, autocommit: bool = False) -> typing.Iterator[PsycopgConnection]:
+        """
+        Borrow a connection from the pool for the duration of a transaction: the transaction is committed at the end
+        of the block, or rolled back if an exception is raised, and the connection is given back to the pool.
+
+        :param autocommit: If True, the connection is used in autocommit mode (e.g. for statements that can not run
+        inside a transaction).
+        :return: The pooled connection.
+        """
+        connection = self.connectionPool.getconn()
+        with self.activeConnectionsLock:
+            self.activeConnections += 1
+        try:
+            connection.autocommit = autocommit
+            yield connection
+            if not autocommit:
+                connection.commit()
+        except Exception:
+            if not connection.closed:
+                connection.rollback()
+            raise
+        finally:
+            if not connection.closed:
+                connection.autocommit = False
+            # broken connections are discarded instead of being reused
+            self.connectionPool.putconn(connection, close=bool(connection.closed))
+            with self.activeConnectionsLock:
+                self.activeConnections -= 1
+
+    def ping(self):
+        """
+        Run SELECT 1 on a pooled connection, within HEALTH_CHECK_TIMEOUT seconds.
+        """
+        with self.getCursor() as cursor:
+            cursor.execute("SET LOCAL statement_timeout = %s", (HEALTH_CHECK_TIMEOUT * 1000,))
+            cursor.execute("SELECT 1")
+
+    def getLoad(self) -> int:
+        """
+        Gets the number of pooled connections currently borrowed.
+        """
+        return self.activeConnections
+
+    def describe(self) -> str:
+        return self.address
+
+    @contextmanager
+    def getCursor(self, autocommit: bool = False) -> typing.Iterator[PsycopgCursor]:
+        """
+        Get a cursor on a pooled connection, see getConnection.
+
+        :param autocommit: If True, the connection is used in autocommit mode.
+        :return: The cursor, closed at the end of the block.
+        """
+        with self.getConnection(autocommit=autocommit) as connection:
+            with connection.cursor() as cursor:
+                yield cursor
 
-    def retrieveHistoricalDataForTimeslot(self, timeslot: str, date: str, entityType: str, timecolumn: str) -> pd.DataFrame:
+    def streamQuery(self, query, params: typing.Optional[tuple] = None,
+                    chunkSize: int = STREAM_CHUNK_SIZE) -> typing.Iterator[pd.DataFrame]:
+        """
+        Execute a query through a named (server-side) cursor and yield its results in chunks, so that large result
+        sets are never fully held in memory.
+
+        :param query: The query (string or psycopg2.sql composable).
+        :param params: The query parameters.
+        :param chunkSize: The number of rows of each chunk.
+        :return: A generator of DataFrames with at most chunkSize rows each.
+        """
+        with self.getConnection() as connection:
+            with connection.cursor(name=f"stream_{uuid.uuid4().hex}") as cursor:
+                cursor.itersize = chunkSize
+                cursor.execute(query, params)
+                columns = None
+                while True:
+                    records = cursor.fetchmany(chunkSize)
+                    if columns is None:
+                        columns = [desc[0] for desc in cursor.description]
+                    if not records:
+                        break
+                    yield pd.DataFrame(records, columns=columns)
+
+    def copyQuery(self, query, params: typing.Optional[tuple] = None,
+                  asArrow: bool = False) -> typing.Union[pd.DataFrame, pa.Table]:
+        """
+        Read the results of a query through COPY ... TO STDOUT, parsed by the pyarrow CSV reader. Rows are not
+        converted to Python tuples, which makes it much faster than fetchall() for large result sets.
+
+        :param query: The query (string or psycopg2.sql composable).
+        :param params: The query parameters.
+        :param asArrow: If True, the Arrow table is returned instead of a DataFrame.
+        :return: The results, as a DataFrame or as an Arrow table.
+        """
+        buffer = io.BytesIO()
+        with self.getCursor() as cursor:
+            boundQuery = cursor.mogrify(query, params).decode()
+            cursor.copy_expert(f"COPY ({boundQuery}) TO STDOUT WITH (FORMAT csv, HEADER true)", buffer)
+        buffer.seek(0)
+        table = pyarrow.csv.read_csv(buffer)
+        return table if asArrow else table.to_pandas()
+
+    def getCachedSlot(self, key: typing.Tuple[str, str, str]) -> Optional[pd.DataFrame]:
+        """
+        Get a cached slot retrieval, if present and not older than slotCacheTTL seconds.
+
+        :param key: The (entity type, date, timeslot) key of the retrieval.
+        :return: A copy of the cached DataFrame, or None if missing or expired.
+        """
+        with self.slotCacheLock:
+            cached = self.slotCache.get(key)
+            if cached is None:
+                return None
+            storedAt, df = cached
+            if time.monotonic() - storedAt > self.slotCacheTTL:
+                del self.slotCache[key]
+                return None
+            self.slotCache.move_to_end(key)
+            return df.copy()
+
+    def storeCachedSlot(self, key: typing.Tuple[str, str, str], df: pd.DataFrame):
+        """
+        Store a slot retrieval in the cache, evicting the least recently used entries beyond slotCacheSize.
+
+        :param key: The (entity type, date, timeslot) key of the retrieval.
+        :param df: The retrieved DataFrame.
+        """
+        if self.slotCacheSize <= 0:
+            return
+        with self.slotCacheLock:
+            self.slotCache[key] = (time.monotonic(), df.copy())
+            self.slotCache.move_to_end(key)
+            while len(self.slotCache) > self.slotCacheSize:
+                self.slotCache.popitem(last=False)
+
+    def clearSlotCache(self):
+        """
+        Empty the cache of the slot retrievals (e.g. after historical data have been reloaded).
+        """
+        with self.slotCacheLock:
+            self.slotCache.clear()
+
+    def createContinuousAggregates(self, refreshInterval: str = "1 hour", refreshWindow: str = "30 days"):
+        """
+        Create the TimescaleDB continuous aggregates (CONTINUOUS_AGGREGATES) over the QuantumLeap hypertables, with a
+        refresh policy, and the indexes used by the time-range predicates of the raw queries. Tables not created by
+        QuantumLeap yet (no notification received) are skipped, so the method can be called again later. The whole
+        history is materialised only when an aggregate is created: afterwards the refresh policy keeps the last
+        refreshWindow up to date and the buckets not materialised yet are computed at query time.
+
+        :param refreshInterval: How often the refresh policy materialises new buckets.
+        :param refreshWindow: How far back, with respect to now, buckets are refreshed by the policy.
+        :return: The names of the available continuous aggregates.
+        """
+        available = []
+        # continuous aggregates and their refresh can not be created inside a transaction
+        with self.getCursor(autocommit=True) as cursor:
+            for entityType, spec in CONTINUOUS_AGGREGATES.items():
+                tableName = QUANTUMLEAP_TABLES[entityType]
+                table = sql.Identifier(QUANTUMLEAP_SCHEMA, tableName)
+                view = sql.Identifier(spec["view"])
+                cursor.execute("SELECT to_regclass(%s)", (f'{QUANTUMLEAP_SCHEMA}."{tableName}"',))
+                if cursor.fetchone()[0] is None:
+                    print(f"Table {tableName} not found: continuous aggregate '{spec['view']}' not created.")
+                    continue
+                try:
+                    cursor.execute("SELECT to_regclass(%s)", (spec["view"],))
+                    created = cursor.fetchone()[0] is None
+                    cursor.execute(sql.SQL(
+                        "CREATE INDEX IF NOT EXISTS {index} ON {table} (timeslot, datetime)"
+                    ).format(index=sql.Identifier(spec["view"] + "_slot_idx"), table=table))
+                    cursor.execute(sql.SQL(
+                        "CREATE MATERIALIZED VIEW IF NOT EXISTS {view} "
+                        "WITH (timescaledb.continuous, timescaledb.materialized_only = false) AS "
+                        "SELECT time_bucket(INTERVAL '1 hour', time_index) AS bucket, entity_id, {groupColumns}, "
+                        "timeslot, (datetime AT TIME ZONE 'UTC')::date AS day, "
+                        "last(trafficflow, time_index) AS trafficflow, avg(trafficflow) AS avgtrafficflow, "
+                        "count(*) AS observations{valueColumns} "
+                        "FROM {table} "
+                        "GROUP BY bucket, entity_id, {groupColumns}, timeslot, day "
+                        "WITH NO DATA"
+                    ).format(view=view, table=table, groupColumns=sql.SQL(spec["groupColumns"]),
+                             valueColumns=sql.SQL(spec["valueColumns"]))
+                    )
+                    cursor.execute(sql.SQL(
+                        "CREATE INDEX IF NOT EXISTS {index} ON {view} (day, timeslot)"
+                    ).format(index=sql.Identifier(spec["view"] + "_day_slot_idx"), view=view))
+                    cursor.execute(
+                        "SELECT add_continuous_aggregate_policy(%s, start_offset => %s::interval, "
+                        "end_offset => NULL, schedule_interval => %s::interval, if_not_exists => true)",
+                        (spec["view"], refreshWindow, refreshInterval)
+                    )
+                    if created:
+                        cursor.execute("CALL refresh_continuous_aggregate(%s, NULL, NULL)", (spec["view"],))
+                    available.append(spec["view"])
+                    print(f"Continuous aggregate '{spec['view']}' available for table '{tableName}'.")
+                except psycopg2.Error as e:
+                    print(f"Error during continuous aggregate creation for '{tableName}': {e}")
+        self.aggregatesAvailable = {view: True for view in available}
+        self.clearSlotCache()
+        return available
+
+    def createSimulationTables(self):
+        """
+        Create the schema and the hypertables (SIMULATION_TABLES) in which the simulation results are stored, the
+        table of the simulation runs and the edge_flow_comparison view, which puts side by side the simulated edge
+        flows and the macroscopic model built from the measurements. Existing tables are kept.
+        """
+        schema = sql.Identifier(SIMULATION_SCHEMA)
+        with self.getCursor() as cursor:
+            cursor.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {schema}").format(schema=schema))
+            cursor.execute(sql.SQL(
+                "CREATE TABLE IF NOT EXISTS {table} (run_id TEXT PRIMARY KEY, date DATE, parameters JSONB, "
+                "folder TEXT, ingested_at TIMESTAMPTZ NOT NULL DEFAULT now())"
+            ).format(table=sql.Identifier(SIMULATION_SCHEMA, SIMULATION_RUNS_TABLE)))
+            for tableName, columns in SIMULATION_TABLES.items():
+                table = sql.Identifier(SIMULATION_SCHEMA, tableName)
+                columnDefinitions = sql.SQL(", ").join(
+                    sql.SQL("{name} {type}").format(name=sql.Identifier(name), type=sql.SQL(columnType))
+                    for name, columnType in columns.items())
+                cursor.execute(sql.SQL(
+                    "CREATE TABLE IF NOT EXISTS {table} (time TIMESTAMPTZ NOT NULL, run_id TEXT NOT NULL, "
+                    "timeslot TEXT NOT NULL, {columns})"
+                ).format(table=table, columns=columnDefinitions))
+                cursor.execute("SELECT create_hypertable(%s, 'time', if_not_exists => TRUE)",
+                               (f"{SIMULATION_SCHEMA}.{tableName}",))
+                cursor.execute(sql.SQL("CREATE INDEX IF NOT EXISTS {index} ON {table} (run_id, timeslot, time)").format(
+                    index=sql.Identifier(f"{tableName}_run_slot_idx"), table=table))
+            cursor.execute(sql.SQL(
+                "CREATE OR REPLACE VIEW {view} AS "
+                "SELECT e.run_id, e.time, e.timeslot, e.edge_id, e.entered AS simulated_count, "
+                "e.speed AS simulated_speed, e.density AS simulated_density, m.flow AS model_count, "
+                "m.velocity AS model_velocity, m.density AS model_density "
+                "FROM {edgedata} e JOIN {macroscopic} m "
+                "ON m.run_id = e.run_id AND m.timeslot = e.timeslot AND m.edge_id = e.edge_id"
+            ).format(view=sql.Identifier(SIMULATION_SCHEMA, "edge_flow_comparison"),
+                     edgedata=sql.Identifier(SIMULATION_SCHEMA, "edgedata"),
+                     macroscopic=sql.Identifier(SIMULATION_SCHEMA, "macroscopic")))
+        print(f"Simulation tables available in schema '{SIMULATION_SCHEMA}'.")
+
+    def copyDataFrame(self, cursor: PsycopgCursor, tableName: str, df: pd.DataFrame) -> int:
+        """
+        Bulk load a dataframe into a simulation table through COPY FROM STDIN, serialising it as a CSV buffer.
+        Only the columns of the table are loaded.
+
+        :param cursor: The cursor of the transaction in which the rows are loaded.
+        :param tableName: The name of the table, in SIMULATION_SCHEMA.
+        :param df: The rows to be loaded.
+        :return: The number of loaded rows.
+        """
+        columns = ["time", "run_id", "timeslot"] + [column for column in SIMULATION_TABLES[tableName]
+                                                    if column in df.columns]
+        df = df[columns].copy()
+        # integer columns read as floats (e.g. from .csv files) would be written as "2.0", rejected by COPY
+        for column in columns:
+            if SIMULATION_TABLES[tableName].get(column) == "INTEGER":
+                df[column] = pd.to_numeric(df[column], errors='coerce').round().astype("Int64")
+        buffer = io.StringIO()
+        df.to_csv(buffer, index=False, header=False)
+        buffer.seek(0)
+        copyQuery = sql.SQL("COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)").format(
+            table=sql.Identifier(SIMULATION_SCHEMA, tableName),
+            columns=sql.SQL(", ").join(map(sql.Identifier, columns)))
+        cursor.copy_expert(copyQuery.as_string(cursor), buffer)
+        return len(df)
+
+    def storeSimulationData(self, runId: str, slotFolderPath: str, date: str, timeslot: str,
+                            parameters: Optional[dict] = None, outputs: Optional[typing.Dict[str, pd.DataFrame]] = None,
+                            replace: bool = True) -> typing.Dict[str, int]:
+        """
+        Store the outputs of a one-hour slot simulation (SUMO edgedata, tripinfo and summary outputs and the
+        TrafficModeler macroscopic model) in the simulation hypertables, tagged with the run id and the slot. Rows
+        are timestamped with the date and the slot start plus their simulation time, so that they can be compared
+        with the observed series. Everything is loaded in a single transaction.
+
+        :param runId: The identifier of the run (e.g. the name of its configuration folder).
+        :param slotFolderPath: The folder of the slot simulation, from which the outputs are read.
+        :param date: The simulated date (yyyy-mm-dd).
+        :param timeslot: The simulated slot (e.g. "07:00-08:00").
+        :param parameters: The parameters of the run (models, tau, car following parameters), stored with the run.
+        :param outputs: Optional dataframes by table name, used instead of reading them from slotFolderPath.
+        :param replace: If True, rows previously stored for the same run and slot are deleted first.
+        :return: The number of rows stored in each table.
+        """
+        if outputs is None:
+            outputs = readSlotOutputs(slotFolderPath)
+        slotStart = pd.Timestamp(f"{date} {timeslot.split('-')[0]}", tz="UTC")
+        storedRows = {}
+        with self.getCursor() as cursor:
+            cursor.execute(sql.SQL(
+                "INSERT INTO {table} (run_id, date, parameters, folder) VALUES (%s, %s, %s, %s) "
+                "ON CONFLICT (run_id) DO UPDATE SET date = EXCLUDED.date, parameters = EXCLUDED.parameters, "
+                "folder = EXCLUDED.folder, ingested_at = now()"
+            ).format(table=sql.Identifier(SIMULATION_SCHEMA, SIMULATION_RUNS_TABLE)),
+                (runId, date, json.dumps(parameters or {}, default=str), os.path.dirname(os.path.abspath(slotFolderPath))))
+            for tableName, df in outputs.items():
+                if tableName not in SIMULATION_TABLES:
+                    continue
+                if replace:
+                    cursor.execute(sql.SQL("DELETE FROM {table} WHERE run_id = %s AND timeslot = %s").format(
+                        table=sql.Identifier(SIMULATION_SCHEMA, tableName)), (runId, timeslot))
+                df = df.copy()
+                offsetColumn = SIMULATION_TIME_OFFSETS.get(tableName)
+                if offsetColumn is not None:
+                    df["time"] = slotStart + pd.to_timedelta(df[offsetColumn].fillna(0), unit="s")
+                else:
+                    df["time"] = slotStart
+                df["run_id"] = runId
+                df["timeslot"] = timeslot
+                storedRows[tableName] = self.copyDataFrame(cursor, tableName, df)
+        print(f"Stored simulation data of run '{runId}', slot {timeslot}: {storedRows}")
+        return storedRows
+
+    def isAggregateAvailable(self, view: str) -> bool:
+        """
+        Check (once for each view) whether a continuous aggregate exists in the database.
+
+        :param view: The name of the continuous aggregate.
+        :return: True if the continuous aggregate can be queried.
+        """
+        if view not in self.aggregatesAvailable:
+            with self.getCursor() as cursor:
+                cursor.execute("SELECT to_regclass(%s)", (view,))
+                self.aggregatesAvailable[view] = cursor.fetchone()[0] is not None
+        return self.aggregatesAvailable[view]
+
+    def retrieveHistoricalDataForTimeslot(self, timeslot: str, date: str, entityType: str, timecolumn: str,
+                                          useCache: bool = True) -> pd.DataFrame:
         """
         Retrieves historical data from the TimescaleDB based on the provided parameters.
 
+        Road segments and traffic flow observations are returned with one row for each entity, holding its last flow
+        in the slot. They are read from the hourly continuous aggregates, when available (see
+        createContinuousAggregates); otherwise, the raw QuantumLeap tables are queried with a range on the observation
+        datetime, which can use the (timeslot, datetime) index instead of computing DATE() of every row, keeping the
+        last notification of each entity. Results are cached by (entity type, date, slot).
+
         :param timeslot: The time slot for which data is retrieved (e.g., "00:00-01:00").
         :param date: The date for which data is retrieved (e.g., "2024-02-01").
         :param entityType: The type of entity (e.g., "roadsegment", "device", "trafficflowobserved").
         :param timecolumn: The name of the time column in the database (default is 'timeslot').
+        :param useCache: If False, the cache is bypassed (and refreshed with the retrieved data).
         :return: A pandas DataFrame containing the retrieved historical data.
         """
 
         if not timeslot or not date or not entityType or not timecolumn:
             raise ValueError("All parameters (timeslot, date, entityType, timecolumn) must be provided.")
 
-        if entityType.lower() in ["road segment", "roadsegment"]:
-            tableName = "ethttps://smartdatamodels.org/datamodel.transportation/roadsegm"
-            query = (
-                f'SELECT entity_id, trafficflow, ST_X(location) as lat, ST_Y(location) as lon, edgeid as edgeID '
-                f'FROM "mtopeniot"."ethttps://smartdatamodels.org/datamodel.transportation/roadsegm" '
-                f'WHERE {timecolumn} = %s AND DATE(datetime) = %s'
-            )
-            self.cursor.execute(query, (timeslot, date))
-
-        elif entityType.lower() == "device":
+        entityKey = entityType.lower().replace(" ", "")
+        cacheKey = (f"{entityKey}:{timecolumn}", date, timeslot)
+        if useCache:
+            df = self.getCachedSlot(cacheKey)
+            if df is not None:
+                return df
+
+        if entityKey == "roadsegment":
+            columns = "entity_id, trafficflow, lat, lon, edgeid"
+        elif entityKey == "trafficflowobserved":
+            columns = "entity_id, trafficflow"
+        elif entityKey == "device":
             try:
                 queryDate = datetime.strptime(date, "%Y/%m/%d").strftime("%d/%m/%Y")
             except ValueError as e:
                 print(f"Error converting date: {e}")
                 return None
-            query = (
-                f'SELECT entity_id, trafficflow, ST_X(location) as lat, ST_Y(location) as lon '
-                f'FROM mtopeniot.etdevice '
-                f'WHERE {timecolumn} LIKE %s AND dateobserved LIKE %s'
-            )
-            self.cursor.execute(query, (timeslot, queryDate))
-
-        elif entityType.lower() in ["trafficflowobserved", "traffic flow observed"]:
-            query = (
-                f'SELECT entity_id, trafficflow '
-                f'FROM "mtopeniot"."ethttps://smartdatamodels.org/datamodel.transportation/trafficf" '
-                f'WHERE {timecolumn} = %s AND DATE(datetime) = %s'
-            )
-            self.cursor.execute(query, (timeslot, date))
-
-        records = self.cursor.fetchall()
-        columns = [desc[0] for desc in self.cursor.description]
+            # equality instead of LIKE without wildcards, so that an index on the two columns can be used
+            query = sql.SQL(
+                'SELECT entity_id, trafficflow, ST_X(location) as lat, ST_Y(location) as lon '
+                'FROM {table} WHERE {timecolumn} = %s AND dateobserved = %s'
+            ).format(table=sql.Identifier(QUANTUMLEAP_SCHEMA, QUANTUMLEAP_TABLES["device"]),
+                     timecolumn=sql.Identifier(timecolumn))
+            df = self.fetchDataFrame(query, (timeslot, queryDate))
+            self.storeCachedSlot(cacheKey, df)
+            return df
+        else:
+            raise ValueError(f"Unsupported entity type: {entityType}")
+
+        view = CONTINUOUS_AGGREGATES[entityKey]["view"]
+        if timecolumn == "timeslot" and self.isAggregateAvailable(view):
+            # the last bucket of each entity holds its last flow for the slot
+            query = sql.SQL(
+                'SELECT DISTINCT ON (entity_id) {columns} FROM {view} '
+                'WHERE day = %s::date AND timeslot = %s ORDER BY entity_id, bucket DESC'
+            ).format(columns=sql.SQL(columns), view=sql.Identifier(view))
+            df = self.fetchDataFrame(query, (date, timeslot))
+        else:
+            if entityKey == "roadsegment":
+                columns = "entity_id, trafficflow, ST_X(location) as lat, ST_Y(location) as lon, edgeid"
+            # observation datetimes are written in UTC; as in the aggregates, the last notification of each entity is kept
+            query = sql.SQL(
+                'SELECT DISTINCT ON (entity_id) {columns} FROM {table} WHERE {timecolumn} = %s '
+                "AND datetime >= (%s::date)::timestamp AT TIME ZONE 'UTC' "
+                "AND datetime < (%s::date + 1)::timestamp AT TIME ZONE 'UTC' "
+                "ORDER BY entity_id, time_index DESC"
+            ).format(columns=sql.SQL(columns),
+                     table=sql.Identifier(QUANTUMLEAP_SCHEMA, QUANTUMLEAP_TABLES[entityKey]),
+                     timecolumn=sql.Identifier(timecolumn))
+            df = self.fetchDataFrame(query, (timeslot, date, date))
+        self.storeCachedSlot(cacheKey, df)
+        return df
+
+    def fetchDataFrame(self, query, params: typing.Optional[tuple] = None) -> pd.DataFrame:
+        """
+        Execute a query and return its results as a DataFrame.
+
+        :param query: The query (string or psycopg2.sql composable).
+        :param params: The query parameters.
+        :return: A pandas DataFrame with the query results.
+        """
+        with self.getCursor() as cursor:
+            cursor.execute(query, params)
+            records = cursor.fetchall()
+            columns = [desc[0] for desc in cursor.description]
         return pd.DataFrame(records, columns=columns)
 
     def createView(self,tableName: str, viewName: str, schema="mtopeniot"):
@@ -226,8 +891,8 @@ class TimescaleManager(DBManager):
             CREATE VIEW {viewName} AS SELECT * FROM {schema}."{tableName}";
             """
         try:
-            self.cursor.execute(query)
-            self.connection.commit()
+            with self.getCursor() as cursor:
+                cursor.execute(query)
             print(f"View '{viewName}' successfully created from table '{tableName}'!")
         except psycopg2.Error as e:
             print(f"Error during view creation: {e}")
@@ -256,7 +921,13 @@ class MongoDBManager(DBManager):
         :param dbName: The name of the MongoDB database to use.
         """
         super().__init__(name="MongoDBManager")
-        self.client = MongoClient(connectionString)
+        self.client = MongoClient(connectionString, serverSelectionTimeoutMS=HEALTH_CHECK_TIMEOUT * 1000)
         self.db = self.client[dbName]
 
+    def ping(self):
+        self.db.command("ping")
+
+    def describe(self) -> str:
+        return f"{','.join(f'{host}:{port}' for host, port in self.client.topology_description.server_descriptions())}/{self.db.name}"
+
 
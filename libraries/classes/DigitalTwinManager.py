@@ -1,18 +1,18 @@
 import sys
 import pandas as pd
+import psycopg2
 from libraries.classes.SumoSimulator import Simulator
 from libraries.classes.Planner import Planner
 from libraries.classes.DataManager import DataManager
-from typing import Optional
+from typing import Optional, Callable
 from libraries import constants
 import os
-import subprocess
-from subprocess import Popen
 from PIL import Image
 import pytz
 from datetime import datetime
-from libraries.classes.TrafficModeler import TrafficModeler
-from libraries.constants import SUMO_PATH, SUMO_NET_PATH, projectPath
+from libraries.classes.TrafficModeler import TrafficModeler, slotColumn
+from libraries.classes.SumoToolPool import getSumoToolPool
+from libraries.constants import SUMO_PATH, SUMO_NET_PATH, STORE_SIMULATION_RESULTS, projectPath
 
 
 class DigitalTwinManager:
@@ -31,6 +31,7 @@ class DigitalTwinManager:
        - simulateBasicScenarioForOneHourSlot: Simulates a basic scenario for a one-hour time slot using historical data.
        - configureCalibrateAndRun: configure and calibrates macroscopic and car-following model. Then, a 24h simulation
        is executed and outputs are compared with the macroscopic values estimated before.
+       - storeSimulationResults: stores the outputs of a slot simulation in the TimescaleDB, if available.
        - generateGraphs: function to generate graphs based on a specific simulated scenario.
        - showGraphs: function to show the generated graphs made up with generateGraphs.
 
@@ -55,6 +56,7 @@ class DigitalTwinManager:
         # self.sumoSimulator = Simulator(configurationPath=configurationPath, logFile=logFile)
         self.sumoSimulator = simulator
         self.planner = Planner(simulator=self.sumoSimulator)
+        self.simulationTablesReady = False
 
     def simulateBasicScenarioForOneHourSlot(self, timeslot: str, date: str, entityType: str, totalVehicles: int,
                                             minLoops: int, congestioned: bool, activeGui: bool=False, timecolumn: Optional[str] = "timeslot"):
@@ -74,13 +76,15 @@ class DigitalTwinManager:
         Returns: A string representing the folder where the scenario is stored.
         """
         if entityType.lower() in ["road segment", "roadsegment"]:
-            timescaleManager = self.dtDataManager.getDBManagerByType("TimescaleDBManager")
+            timescaleManager = self.dtDataManager.getDBManagerByType("TimescaleDBManager", readOnly=True)
             df = timescaleManager.retrieveHistoricalDataForTimeslot(timeslot=timeslot, date=date, entityType=entityType, timecolumn=timecolumn)
             scenarioFolder = self.planner.planBasicScenarioForOneHourSlot(df, entityType=entityType, totalVehicles=totalVehicles, minLoops=minLoops, congestioned=False, activeGui=activeGui)
             return scenarioFolder
 
     def configureCalibrateAndRun(self, dataFilePath: str, carFollowingModel: str, macroModelType: str, tau: str,
-                             parameters: {}, date: str, timeslot: [], edge_id: str):
+                             parameters: {}, date: str, timeslot: [], edge_id: str,
+                             progressCallback: Optional[Callable[[float, str], None]] = None, showImage: bool = True,
+                             storeResults: Optional[bool] = None):
         """
         Process of estimating traffic macroscopic values, calibrating traffic models and simulating them based on
         collected data. The function is designed to be applicable for an entire day's measurements or a smaller
@@ -96,15 +100,29 @@ class DigitalTwinManager:
             :param date: the date, in yyyy-mm-dd format, in which to go to evaluate the measurements
             :param timeslot: The time slot for which historical traffic data is retrieved (e.g., "00:00-01:00").
             :param edge_id:
+            :param progressCallback: optional function called as progressCallback(progress, message) while the process
+            advances, with progress in [0, 1]. Used by background jobs to report their state.
+            :param showImage: if False, the final plot is only saved to file (e.g. when running without a display).
+            :param storeResults: if True, the outputs of each slot simulation are stored in the TimescaleDB (see
+            storeSimulationResults). If None, the STORE_SIMULATION_RESULTS setting is used (disabled by default).
 
         Returns: returns the folder path in which simulations and results are stored.
         """
+        def reportProgress(progress: float, message: str):
+            if progressCallback is not None:
+                progressCallback(progress, message)
+
+        if storeResults is None:
+            storeResults = STORE_SIMULATION_RESULTS
+
         basemodel = TrafficModeler(simulator=self.sumoSimulator, trafficDataFile=dataFilePath,
                                    sumoNetFile=SUMO_NET_PATH,
                                    date=date,
                                    timeSlot='00:00-01:00',
                                    modelType=macroModelType)
         print("Starting Configuration")
+        reportProgress(0.0, "Starting configuration")
+        slotCount = max(1, timeslot[1] - timeslot[0])
         # For each timeslot a TrafficModeler is set, hence constructing the macroscopic model
         for hour in range(timeslot[0], timeslot[1]):
             timeSlotFolder = ''
@@ -140,6 +158,15 @@ class DigitalTwinManager:
             print(route_folder_path)
             self.sumoSimulator.changeRouteFilePath(route_folder_path)
             self.sumoSimulator.start(activeGui=False, logFilePath=self.sumoSimulator.logFile)
+            slotMessage = f"Simulated time slot {timeSlotFolder}"
+            if storeResults:
+                runParameters = {"carFollowingModel": carFollowingModel, "macroModelType": macroModelType, "tau": tau,
+                                 "parameters": parameters, "edge_id": edge_id}
+                storedRows = self.storeSimulationResults(runId=folder_name.split('/')[0], slotFolderPath=typeFilePath,
+                                                         date=date, timeslot=slotColumn(hour), parameters=runParameters)
+                if storedRows is None:
+                    slotMessage += " (results not stored: TimescaleDB unreachable)"
+            reportProgress(0.7 * (hour - timeslot[0] + 1) / slotCount, slotMessage)
 
         # confPath = projectPath + "/" + confPath
         paramvalues = list(parameters.values())
@@ -147,7 +174,7 @@ class DigitalTwinManager:
         # macroscopic values. Simulation output of flow, speed and density are compared to the macroscopic ones
         df = pd.read_csv(typeFilePath + "/model.csv", sep=';', decimal=',')
         edge_ids = df[["edge_id"]].values
-        for edge_id in edge_ids:
+        for index, edge_id in enumerate(edge_ids):
             os.makedirs(confPath + "/detected_output/", exist_ok=True)
             # Evaluate output according to macroscopic data. Data are saved in a dedicated folder
             basemodel.evaluateModel(edge_id=edge_id[0], confPath=confPath, outputFilePath=confPath + "/detected_output/" + str(edge_id[0]) + "_detectedFlow_t" + str(tau)
@@ -158,9 +185,37 @@ class DigitalTwinManager:
                                                    + "_ap" + str(paramvalues[1]) + ".csv",
                                     outputFilePath=confPath + "/error_output/" + str(edge_id[0]) + "_error_summary_t"+ str(tau)
                                                    + "_ap" + str(paramvalues[0]) + "_ap" + str(paramvalues[1]) + ".csv")
-        basemodel.plotTemporalResultsAverage(folderPath=confPath + "/detected_output", showImage=True)
+            reportProgress(0.7 + 0.25 * (index + 1) / len(edge_ids), f"Evaluated edge {edge_id[0]}")
+        basemodel.plotTemporalResultsAverage(folderPath=confPath + "/detected_output", showImage=showImage)
+        reportProgress(1.0, "Completed")
         return confPath
 
+    def storeSimulationResults(self, runId: str, slotFolderPath: str, date: str, timeslot: str,
+                               parameters: Optional[dict] = None) -> Optional[dict]:
+        """
+        Store the outputs of a one-hour slot simulation in the simulation hypertables of the TimescaleDB (see
+        TimescaleManager.storeSimulationData). If the TimescaleDB can not be reached, the error is printed and the
+        simulation goes on without storing the results; any other error is raised.
+        Args:
+            :param runId: the identifier of the run (the name of its configuration folder)
+            :param slotFolderPath: the folder of the slot simulation
+            :param date: the simulated date, in yyyy-mm-dd format
+            :param timeslot: the simulated slot (e.g. "07:00-08:00")
+            :param parameters: the parameters of the run
+        Returns: the number of rows stored in each table, or None if the TimescaleDB could not be reached.
+        :raises ValueError: if no TimescaleDB manager has been added to the DataManager
+        """
+        timescaleManager = self.dtDataManager.getDBManagerByType("TimescaleDBManager")
+        try:
+            if not self.simulationTablesReady:
+                timescaleManager.createSimulationTables()
+                self.simulationTablesReady = True
+            return timescaleManager.storeSimulationData(runId=runId, slotFolderPath=slotFolderPath, date=date,
+                                                        timeslot=timeslot, parameters=parameters)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            print(f"Simulation results of run '{runId}', slot {timeslot} not stored, TimescaleDB unreachable: {e}")
+            return None
+
     def generateGraphs(self, scenarioFolder: str):
         """
         Generate graphs based on the simulation outcome. The generated graphs show some info about the trajectory
@@ -168,24 +223,28 @@ class DigitalTwinManager:
         Args:
             :param scenarioFolder: the folder where the simulated scenario output is stored
         Return:
+            the results of the three plotXMLAttributes jobs (see SumoToolPool.runToolJob)
         """
-        graphScript = constants.SUMO_TOOLS_PATH + '/visualization/plotXMLAttributes.py'
         scenarioFolder = os.path.abspath(scenarioFolder)
 
-        trajectory_cmd = [sys.executable, graphScript, "-x", "x", "-y", "y", "-o", scenarioFolder + "/traj_out.png",
+        trajectory_cmd = ["-x", "x", "-y", "y", "-o", scenarioFolder + "/traj_out.png",
                           scenarioFolder + "/fcd.xml", "--blind"]
-        running_halted_cmd = [sys.executable, graphScript, scenarioFolder + "/summary.xml", "-x", "time", "-y",
+        running_halted_cmd = [scenarioFolder + "/summary.xml", "-x", "time", "-y",
                               "running,halting", "-o", scenarioFolder + "/plot_running.png", "--legend", "--blind"]
-        depart_delay_cmd = [sys.executable, graphScript, "-i", "id", "-x", "depart", "-y", "departDelay",
+        depart_delay_cmd = ["-i", "id", "-x", "depart", "-y", "departDelay",
                             "--scatterplot", "--xlabel", '"depart time [s]"', "--ylabel", '"depart delay [s]"',
                             "--ylim", "0,40", "--xticks", "0,1200,200,10", "--yticks", "0,40,5,10", "--xgrid",
                             "--ygrid", "--title", '"depart delay over depart time"', "--titlesize", "16",
                             scenarioFolder + "/tripinfos.xml", "--blind", "-o", scenarioFolder + "/departDelay.png"]
 
         commands = [trajectory_cmd, running_halted_cmd, depart_delay_cmd]
-        procs = [Popen(i) for i in commands]
-        for p in procs:
-            p.wait()
+        # the three graphs are drawn in parallel by the workers of the shared pool; a failed graph does not stop the
+        # others, its error is printed
+        results = getSumoToolPool().runAll([("plotXMLAttributes", command) for command in commands], check=False)
+        for result in results:
+            if result["error"] is not None:
+                print(f"Unable to draw {result['args'][-1]}: {result['error']}\n{result['stderr']}")
+        return results
 
     def showGraphs(self, scenarioFolder: str, saveSummary = False):
         """
@@ -0,0 +1,145 @@
+# ****************************************************
+# Module Purpose:
+#   This library defines the EntityResolver class, which resolves the measurements sent by the physical devices to the
+#   entities stored by Orion-LD in MongoDB.
+#
+#   - A single MongoClient (with its connection pool) is shared by all the resolvers using the same connection string.
+#   - Entities are looked up by exact id or by anchored id prefix, both served by an index on `_id.id`, instead of
+#     unanchored regular expressions that scan the whole collection. The same indexes are used by the entity listing
+#     of the web application (udtApp.entityQueries).
+#   - The collection belongs to Orion-LD, hence its indexes are never created implicitly: they are created once, as a
+#     setup step, with `python -m libraries.classes.EntityResolver` (or EntityResolver(createIndex=True)).
+#   - The entities of all the devices measuring in a time slot can be fetched at once with a single `$in` query.
+#
+# ****************************************************
+import re
+from typing import Dict, List, Optional
+
+from pymongo import MongoClient
+from pymongo.collection import Collection
+
+from libraries.constants import ORION_MONGO_CONNECTION_STRING, ORION_ENTITIES_DB_NAME
+
+# Prefix of the ids of the Device entities created by the IoT Agent (see Agent.measurementRegistration)
+DEVICE_ID_PREFIX = "urn:ngsi-ld:Device:"
+# Fields read by default from the entity documents
+DEFAULT_PROJECTION = {"_id": 1, "modDate": 1}
+
+
+class EntityResolver:
+    """
+    Resolves device identifiers to the Orion-LD entity documents.
+
+    Class Attributes:
+    - sharedClients (Dict[str, MongoClient]): MongoDB clients shared by all the resolvers, by connection string.
+    - collection (Collection): The Orion-LD entities collection.
+    """
+    sharedClients: Dict[str, MongoClient] = {}
+    collection: Collection
+
+    def __init__(self, connectionString: str = ORION_MONGO_CONNECTION_STRING, dbName: str = ORION_ENTITIES_DB_NAME,
+                 createIndex: bool = False):
+        """
+        Initializes the resolver on the entities collection of the given database.
+
+        :param connectionString: The connection string of the MongoDB server used by Orion-LD.
+        :param dbName: The name of the Orion-LD database of the tenant.
+        :param createIndex: If True, the indexes of ensureEntityIndexes are created (if missing). This changes the
+        database of Orion-LD, so it is opt-in: without the indexes the lookups still work, scanning the collection.
+        """
+        self.collection = self.getClient(connectionString)[dbName]["entities"]
+        if createIndex:
+            self.ensureIndex()
+
+    @classmethod
+    def getClient(cls, connectionString: str) -> MongoClient:
+        """
+        Get the MongoClient shared by all the resolvers using the given connection string.
+        """
+        if connectionString not in cls.sharedClients:
+            cls.sharedClients[connectionString] = MongoClient(connectionString)
+        return cls.sharedClients[connectionString]
+
+    def ensureIndex(self):
+        """
+        Create the indexes on the entities collection (see ensureEntityIndexes). Nothing is done if they already
+        exist.
+        """
+        self.ensureEntityIndexes(self.collection)
+
+    @staticmethod
+    def ensureEntityIndexes(collection: Collection):
+        """
+        Create on an Orion-LD entities collection the index on the entity id (`_id.id`), used by the exact and prefix
+        lookups and by the keyset pagination, and the index on type and id, used by the type filter of the listing.
+        Nothing is done if the indexes already exist.
+
+        :param collection: The Orion-LD entities collection.
+        """
+        collection.create_index("_id.id", name="entity_id")
+        collection.create_index([("_id.type", 1), ("_id.id", 1)], name="entity_type_id")
+
+    @staticmethod
+    def deviceEntityID(devicePartialID: str) -> str:
+        """
+        Get the id of the Device entity of a physical device.
+
+        :param devicePartialID: The device identifier used with the IoT Agent.
+        :return: the NGSI-LD id of the Device entity.
+        """
+        return DEVICE_ID_PREFIX + str(devicePartialID)
+
+    def findEntity(self, entityID: str, projection: Optional[dict] = None) -> Optional[dict]:
+        """
+        Find an entity by its exact id.
+
+        :param entityID: The NGSI-LD id of the entity.
+        :param projection: Fields to be read, DEFAULT_PROJECTION if None.
+        :return: the entity document, or None if not found.
+        """
+        return self.collection.find_one({"_id.id": entityID}, projection or DEFAULT_PROJECTION)
+
+    def findByPrefix(self, idPrefix: str, projection: Optional[dict] = None) -> List[dict]:
+        """
+        Find the entities whose id starts with the given prefix. The regular expression is anchored, so that the
+        index on `_id.id` is used.
+
+        :param idPrefix: The beginning of the entity ids.
+        :param projection: Fields to be read, DEFAULT_PROJECTION if None.
+        :return: the entity documents found.
+        """
+        return list(self.collection.find({"_id.id": {"$regex": "^" + re.escape(idPrefix)}},
+                                         projection or DEFAULT_PROJECTION))
+
+    def findDevice(self, devicePartialID: str, projection: Optional[dict] = None) -> Optional[dict]:
+        """
+        Find the Device entity of a physical device.
+
+        :param devicePartialID: The device identifier used with the IoT Agent.
+        :param projection: Fields to be read, DEFAULT_PROJECTION if None.
+        :return: the entity document, or None if not found.
+        """
+        return self.findEntity(self.deviceEntityID(devicePartialID), projection)
+
+    def prefetchDevices(self, devicePartialIDs: List[str], projection: Optional[dict] = None) -> Dict[str, dict]:
+        """
+        Fetch with a single query the Device entities of several physical devices, e.g. all the devices measuring in
+        a time slot.
+
+        :param devicePartialIDs: The device identifiers used with the IoT Agent.
+        :param projection: Fields to be read, DEFAULT_PROJECTION if None.
+        :return: the entity documents found, by device identifier.
+        """
+        entityIDs = {self.deviceEntityID(partialID): str(partialID) for partialID in set(devicePartialIDs)}
+        if not entityIDs:
+            return {}
+        projection = dict(projection or DEFAULT_PROJECTION)
+        projection["_id"] = 1
+        cursor = self.collection.find({"_id.id": {"$in": list(entityIDs.keys())}}, projection)
+        return {entityIDs[entry["_id"]["id"]]: entry for entry in cursor}
+
+
+if __name__ == "__main__":
+    # one-off setup step: create the indexes on the Orion-LD entities collection of the openiot tenant
+    EntityResolver(createIndex=True)
+    print(f"Entity indexes available on {ORION_ENTITIES_DB_NAME}.entities")
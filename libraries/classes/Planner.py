@@ -1,7 +1,6 @@
 import os
 import sys
 import xml.etree.ElementTree as ET
-import subprocess
 from tkinter import Tk     # from tkinter import Tk for Python 3.x
 from tkinter.filedialog import askopenfilename
 
@@ -9,6 +8,7 @@ from libraries.classes.DataManager import *
 from libraries import constants
 from libraries.classes.SumoSimulator import Simulator
 from libraries.constants import SUMO_TOOLS_PATH, SUMO_NET_PATH
+from libraries.classes.SumoToolPool import getSumoToolPool
 
 
 class ScenarioGenerator:
@@ -38,6 +38,20 @@ class ScenarioGenerator:
         self.sumoConfiguration = sumocfg
         self.sim = sim
 
+    @staticmethod
+    def runSumoTool(tool: str, args: list) -> dict:
+        """
+        Run a SUMO tool on the shared pool. As when the tools were run as scripts, a failure does not stop the
+        generation: its error is printed and returned in the job result.
+
+        :param tool: name of the tool (see SumoToolPool.SUMO_TOOLS)
+        :param args: command line arguments of the tool
+        :return: the job result (see SumoToolPool.runToolJob)
+        """
+        result = getSumoToolPool().run(tool, args, check=False)
+        if result["error"] is not None:
+            print(f"SUMO tool '{tool}' failed: {result['error']}\n{result['stderr']}")
+        return result
 
     def defineScenarioFolder(self, congestioned: bool = False) -> str:
         """
@@ -72,9 +86,6 @@ class ScenarioGenerator:
         if not os.path.exists(constants.SUMO_TOOLS_PATH):
             raise FileNotFoundError("sumoenv tools path does not exist.")
 
-
-        script1 = constants.SUMO_TOOLS_PATH + "/randomTrips.py"
-
         arg1 = ""
         if constants.SUMO_PATH.startswith("./"):
             arg1 = constants.SUMO_PATH[2:]
@@ -85,23 +96,23 @@ class ScenarioGenerator:
         print(arg1)
         print(edgefile)
 
-        subprocess.run(['python', script1, "-n", arg1, "-r", folderPath + "sampleRoutes.rou.xml",
-                        "--fringe-factor", "10", "--random", "--min-distance", "100", "--random-factor", "200"])
+        self.runSumoTool("randomTrips", ["-n", arg1, "-r", folderPath + "sampleRoutes.rou.xml",
+                                     "--fringe-factor", "10", "--random", "--min-distance", "100",
+                                     "--random-factor", "200"])
 
-        script2 = constants.SUMO_TOOLS_PATH + "/routeSampler.py"
         if congestioned:
             #TODO: here some actions has to be taken in order to generate a congestioned scenario. Note that using
             # the totalVehicles parameters and the minLoops can generate congestioned traffic even if this parameter
             # is not set.
-            subprocess.run([sys.executable,  script2, "-r", folderPath + "sampleRoutes.rou.xml",
-                        "--edgedata-files", edgefile, "-o", folderPath +
-                        "generatedRoutes.rou.xml", "--total-count", str(totalVehicles), "--optimize",
-                        "full", "--min-count", str(minLoops)])
+            self.runSumoTool("routeSampler", ["-r", folderPath + "sampleRoutes.rou.xml",
+                                          "--edgedata-files", edgefile, "-o", folderPath +
+                                          "generatedRoutes.rou.xml", "--total-count", str(totalVehicles), "--optimize",
+                                          "full", "--min-count", str(minLoops)])
         else:
-            subprocess.run([sys.executable,  script2, "-r", folderPath + "sampleRoutes.rou.xml",
-                        "--edgedata-files", edgefile, "-o", folderPath +
-                        "generatedRoutes.rou.xml", "--total-count", str(totalVehicles), "--optimize",
-                        "full", "--min-count", str(minLoops)])
+            self.runSumoTool("routeSampler", ["-r", folderPath + "sampleRoutes.rou.xml",
+                                          "--edgedata-files", edgefile, "-o", folderPath +
+                                          "generatedRoutes.rou.xml", "--total-count", str(totalVehicles), "--optimize",
+                                          "full", "--min-count", str(minLoops)])
         print("Routes Generated")
         # self.sim.changeRoutePath(newpath + "generatedRoutes.rou.xml")
 
@@ -137,15 +148,15 @@ class ScenarioGenerator:
         else:
             print("No route file path was provided or selected.")
 
-    def generateRandomRoute(self, sumoNetPath: str, timeSlot: str):
+    def generateRandomRoute(self, sumoNetPath: str, timeSlot: str) -> dict:
         """
-
+        Generate random trips and routes over the whole network, used as initial routes to be sampled by generateRoute.
         Args:
-            sumoNetPath:
-            timeSlot:
+            sumoNetPath: the SUMO network on which routes are generated
+            timeSlot: the timeslot of the simulation. It is used as a folder name.
 
         Returns:
-
+            the result of the randomTrips job (see SumoToolPool.runToolJob)
         """
         timeSlot = timeSlot.replace(':', '-')
         #folder_name = f"{date}_{modelType}_{carFollowingModelType}/{timeSlot}"
@@ -153,18 +164,18 @@ class ScenarioGenerator:
         folder_name = f"{timeSlot}"
         folder_path = os.path.join("sumoenv/routes", folder_name)
         os.makedirs(folder_path, exist_ok=True)
-        script = SUMO_TOOLS_PATH + "/randomTrips.py"
-        subprocess.run(['python', script, "-n", sumoNetPath, "-r", folder_path + "/generatedRoutes.rou.xml",
-                        "--output-trip-file", folder_path + "/randomTrips.rou.xml",
-                        "--trip-attributes", "type='customModel'",
-                        "--random-departpos", "--random-arrivalpos",
-                        "--allow-fringe", "--random",
-                        "--remove-loops",
-                        "--fringe-factor", "10", "--min-distance", "100", "--max-distance", "2000",
-                        "--random-routing-factor", "10", "--period", "0.1"])
-
-
-    def generateRoute(self, inputEdgePath: str, timeSlot: str, withInitialRoute=True ):
+        return self.runSumoTool("randomTrips", ["-n", sumoNetPath, "-r", folder_path + "/generatedRoutes.rou.xml",
+                                                     "--output-trip-file", folder_path + "/randomTrips.rou.xml",
+                                                     "--trip-attributes", "type='customModel'",
+                                                     "--random-departpos", "--random-arrivalpos",
+                                                     "--allow-fringe", "--random",
+                                                     "--remove-loops",
+                                                     "--fringe-factor", "10", "--min-distance", "100",
+                                                     "--max-distance", "2000",
+                                                     "--random-routing-factor", "10", "--period", "0.1"])
+
+
+    def generateRoute(self, inputEdgePath: str, timeSlot: str, withInitialRoute=True ) -> dict:
         """
         Based on the input edgefile that contains the traffic counts detected by the specific traffic loops in the map,
         the function generates routes for the map (saved in :param sumoNetPath) that respect these crossing constraints
@@ -175,6 +186,7 @@ class ScenarioGenerator:
             routes to sample.
 
         Returns:
+            the result of the routeSampler job (see SumoToolPool.runToolJob), including its captured output
         """
         timeSlot = timeSlot.replace(':', '-')
         if withInitialRoute:
@@ -186,18 +198,15 @@ class ScenarioGenerator:
         os.makedirs(folder_path, exist_ok=True)
         random_route_path = folder_path
         outputRoutePath = folder_path + "/generatedRoutes.rou.xml"
-        script = SUMO_TOOLS_PATH + "/routeSampler.py"
         type = "type='customModel'"
-        process = subprocess.run([sys.executable, script, "--r", random_route_path + "/randomTrips.rou.xml",
-                                  "--edgedata-files", inputEdgePath, "-o",
-                                  folder_path + "/generatedRoutes.rou.xml", "--edgedata-attribute", "qPKW",
-                                  "--write-flows", "number", "--attributes", type,
-                                  "--total-count", "10000", "--optimize", "full", "--minimize-vehicles", "1",
-                                  "--threads", "8"],
-                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, text=True,
-                                 env=os.environ.copy(), bufsize=1)
-
-        # process.wait()
+        # a single thread per job: the parallelism comes from the SumoToolPool workers running the jobs
+        return self.runSumoTool("routeSampler", ["--r", random_route_path + "/randomTrips.rou.xml",
+                                                      "--edgedata-files", inputEdgePath, "-o",
+                                                      folder_path + "/generatedRoutes.rou.xml",
+                                                      "--edgedata-attribute", "qPKW",
+                                                      "--write-flows", "number", "--attributes", type,
+                                                      "--total-count", "10000", "--optimize", "full",
+                                                      "--minimize-vehicles", "1", "--threads", "1"])
 
 
 class Planner:
@@ -0,0 +1,188 @@
+# ****************************************************
+# Module Purpose:
+#   This library defines the QuantumLeapStandIn class, a small HTTP server that receives the NGSI-LD notifications of
+#   the Context Broker in place of QuantumLeap. Notifications are only counted, not persisted, so that the throughput
+#   and the latency of the notification path (Broker -> Orion-LD -> notification endpoint) can be measured under
+#   replay load for each subscription profile, without the TimescaleDB write cost.
+#
+#   The statistics are returned by getStatistics and published at GET /v2/stats; GET /version answers as QuantumLeap
+#   does, so that health checks keep working.
+#
+# ****************************************************
+import json
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler
+from typing import Dict, List, Optional
+
+from libraries.classes.BackgroundHTTPServer import BackgroundHTTPServer
+from libraries.constants import QUANTUMLEAP_STANDIN_PORT
+
+# Latency samples kept for the percentiles, the oldest ones are discarded
+MAX_LATENCY_SAMPLES = 100000
+
+
+def parseTimestamp(value: Optional[str]) -> Optional[float]:
+    """
+    Parse an NGSI-LD timestamp (e.g. "2024-02-01T10:00:00.123Z") into seconds since the epoch, or None if invalid.
+    """
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def percentile(samples: List[float], fraction: float) -> Optional[float]:
+    """
+    Get the given percentile (fraction in [0, 1]) of a list of samples, or None if there are no samples.
+    """
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class QuantumLeapStandIn(BackgroundHTTPServer):
+    """
+    HTTP stand-in for the QuantumLeap notification endpoint, measuring the notifications it receives.
+
+    Attributes (see BackgroundHTTPServer for the server ones):
+        notifications (int): number of received notifications
+        entities (int): number of notified entities
+        receivedBytes (int): size of the received notification bodies
+        notificationsBySubscription (Dict[str, int]): number of received notifications, by subscription id
+        deliveryLatencies (List[float]): seconds between the notifiedAt of each notification and its reception
+        updateLatencies (List[float]): seconds between the update of each notified entity and the reception of the
+            notification: the modifiedAt of the entity (the stand-in subscriptions request system attributes, see
+            QuantumLeapManager.buildSubscription), or else the observedAt of its trafficFlow
+    """
+    notifications: int
+    entities: int
+    receivedBytes: int
+    notificationsBySubscription: Dict[str, int]
+    deliveryLatencies: List[float]
+    updateLatencies: List[float]
+
+    def __init__(self, host: str = "0.0.0.0", port: int = QUANTUMLEAP_STANDIN_PORT):
+        """
+        Initializes the stand-in.
+
+        :param host: interface on which the server listens
+        :param port: port on which the server listens
+        """
+        super().__init__("QuantumLeap stand-in", host, port)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """
+        Reset the statistics, e.g. before a new measurement.
+        """
+        with self.lock:
+            self.notifications = 0
+            self.entities = 0
+            self.receivedBytes = 0
+            self.notificationsBySubscription = {}
+            self.deliveryLatencies = []
+            self.updateLatencies = []
+            self.firstReceivedAt = None
+            self.lastReceivedAt = None
+
+    def recordNotification(self, body: bytes, receivedAt: float):
+        """
+        Record a received notification.
+
+        :param body: the JSON body of the notification
+        :param receivedAt: the reception time, in seconds since the epoch
+        """
+        notification = json.loads(body)
+        data = notification.get("data", [])
+        with self.lock:
+            self.notifications += 1
+            self.entities += len(data)
+            self.receivedBytes += len(body)
+            subscriptionId = notification.get("subscriptionId", "")
+            self.notificationsBySubscription[subscriptionId] = self.notificationsBySubscription.get(subscriptionId, 0) + 1
+            if self.firstReceivedAt is None:
+                self.firstReceivedAt = receivedAt
+            self.lastReceivedAt = receivedAt
+            notifiedAt = parseTimestamp(notification.get("notifiedAt"))
+            if notifiedAt is not None:
+                self.deliveryLatencies.append(receivedAt - notifiedAt)
+            for entity in data:
+                updatedAt = parseTimestamp(entity.get("modifiedAt"))
+                if updatedAt is None and isinstance(entity.get("trafficFlow"), dict):
+                    updatedAt = parseTimestamp(entity["trafficFlow"].get("observedAt"))
+                if updatedAt is not None:
+                    self.updateLatencies.append(receivedAt - updatedAt)
+            del self.deliveryLatencies[:-MAX_LATENCY_SAMPLES]
+            del self.updateLatencies[:-MAX_LATENCY_SAMPLES]
+
+    def getStatistics(self) -> dict:
+        """
+        Get the statistics of the notifications received since the start (or the last reset).
+
+        :return: counts, entities per notification, throughput (notifications and entities per second, between the
+        first and the last notification) and latency percentiles in seconds
+        """
+        with self.lock:
+            elapsed = (self.lastReceivedAt - self.firstReceivedAt) if self.firstReceivedAt is not None else 0.0
+            return {
+                "notifications": self.notifications,
+                "entities": self.entities,
+                "receivedBytes": self.receivedBytes,
+                "subscriptions": dict(self.notificationsBySubscription),
+                "entitiesPerNotification": self.entities / self.notifications if self.notifications else 0.0,
+                "elapsedSeconds": elapsed,
+                "notificationsPerSecond": self.notifications / elapsed if elapsed > 0 else None,
+                "entitiesPerSecond": self.entities / elapsed if elapsed > 0 else None,
+                "deliveryLatency": {"p50": percentile(self.deliveryLatencies, 0.5),
+                                    "p95": percentile(self.deliveryLatencies, 0.95),
+                                    "max": max(self.deliveryLatencies, default=None)},
+                "updateLatency": {"p50": percentile(self.updateLatencies, 0.5),
+                                  "p95": percentile(self.updateLatencies, 0.95),
+                                  "max": max(self.updateLatencies, default=None)},
+            }
+
+    def createHandler(self):
+        standIn = self
+
+        class NotificationRequestHandler(BaseHTTPRequestHandler):
+            def sendJson(self, status: int, payload: dict):
+                body = json.dumps(payload).encode("UTF-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                receivedAt = time.time()
+                if self.path.split("?")[0] != "/v2/notify":
+                    self.send_error(404, "Unknown endpoint")
+                    return
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                try:
+                    standIn.recordNotification(body, receivedAt)
+                except ValueError as e:
+                    self.sendJson(400, {"error": f"Invalid notification: {e}"})
+                    return
+                self.sendJson(200, {"message": "Notification successfully processed"})
+
+            def do_GET(self):
+                path = self.path.split("?")[0]
+                if path == "/version":
+                    self.sendJson(200, {"version": "stand-in"})
+                elif path == "/v2/stats":
+                    self.sendJson(200, standIn.getStatistics())
+                else:
+                    self.send_error(404, "Unknown endpoint")
+
+            def log_message(self, format, *args):
+                # notifications are not logged, logging would dominate the measured time
+                pass
+
+        return NotificationRequestHandler
@@ -1,22 +1,70 @@
 from ngsildclient import Client, SubscriptionBuilder
 import typing
+from typing import Optional
 from libraries.constants import ROAD_SEGMENT_DATA_MODEL_TYPE, TRAFFIC_FLOW_OBSERVED_DATA_MODEL_TYPE
 
+# Notification settings of a subscription. Existing subscriptions are reused only if these settings match
+SUBSCRIPTION_SETTINGS = ("throttling", "timeInterval", "notifiedAttributes", "format", "sysAttrs")
+# Subscriptions listed per request: the Context Broker returns only the first page (20 by default) if not paginated
+SUBSCRIPTION_PAGE_SIZE = 100
+# Tag prefixed to the description of the subscriptions created by the twin: only these are ever deleted, the ones of
+# other tools or instances notifying the same QuantumLeap endpoint are left untouched
+SUBSCRIPTION_OWNER_TAG = "[IntelliFlowTwin]"
+# Entity types whose traffic flow is persisted by QuantumLeap
+TRAFFIC_ENTITY_TYPES = ("RoadSegment", "trafficflowobserved", "Device")
+# Named subscription profiles:
+# - live: one subscription per entity type, notifying all the attributes of the changed entity at each trafficFlow
+#   change.
+# - replay: a single subscription for all the entity types, notifying only the attributes persisted for the replayed
+#   measurements at each trafficFlow change, so that QuantumLeap receives smaller notifications (but as many as with
+#   the live profile) while historical data are replayed at high rate.
+# - replay-batched: as replay, but every entity is notified once per timeInterval (REPLAY_BATCH_INTERVAL seconds)
+#   instead of at each change, which bounds the number of notifications. Only the last value of each interval is
+#   notified, so the interval must not be shorter than the pace at which a slot is replayed.
+# Throttling can be opted in (e.g. createProfileSubscriptions(..., throttling=5)) but it is lossy: Orion-LD discards
+# the changes notified within the throttling window instead of aggregating them. timeInterval can be overridden too
+# (e.g. createProfileSubscriptions(..., profile="replay-batched", timeInterval=60)): every matching entity is
+# notified once per interval, whether it changed or not.
+REPLAY_BATCH_INTERVAL = 10
+SUBSCRIPTION_PROFILES = {
+    "live": {"groupTypes": False, "throttling": None, "timeInterval": None, "notifiedAttributes": None,
+             "systemAttributes": False},
+    "replay": {"groupTypes": True, "throttling": None, "timeInterval": None,
+               "notifiedAttributes": ["trafficFlow", "DateTime", "timeslot"], "systemAttributes": False},
+    "replay-batched": {"groupTypes": True, "throttling": None, "timeInterval": REPLAY_BATCH_INTERVAL,
+                       "notifiedAttributes": ["trafficFlow", "DateTime", "timeslot"], "systemAttributes": False},
+}
+
+
+def normalizeTerm(term: str) -> str:
+    """
+    Get the short, lowercase form of an NGSI-LD term, either compacted ("trafficFlow") or expanded
+    ("https://uri.etsi.org/ngsi-ld/default-context/trafficFlow"), so that terms are compared regardless of the
+    context used by the Context Broker when listing the subscriptions.
+    """
+    return term.rstrip("/").rsplit("/", 1)[-1].rsplit("#", 1)[-1].lower()
+
 
 class QuantumLeapManager:
     """
     A class to manage NGSI-LD subscriptions for monitoring and interacting with the context broker.
 
+    Subscriptions are idempotent: before creating a subscription, the subscriptions of the Context Broker notifying
+    QuantumLeap are listed and matched by (entity types, watched attributes, endpoint). A matching subscription is
+    reused if it has the same notification settings, and replaced otherwise, while duplicates are deleted. Hence,
+    restarting the platform does not multiply the notifications sent to QuantumLeap. Only the subscriptions created
+    by the twin (description tagged with SUBSCRIPTION_OWNER_TAG) are replaced or deleted.
+
     Attributes:
         containerName (str): The name of the container running the context broker.
         cbPort (int): The port number for the context broker.
         quantumleapPort (int): The port number for QuantumLeap.
-        activeSubscriptions (Dict[str, List[Any]]): A dictionary to store active subscriptions.
+        activeSubscriptions (Dict[str, List[str]]): The ids of the subscriptions managed in this session, by entity type.
     """
     containerName: str
     cbPort: int
     quantumleapPort: int
-    activeSubscriptions: typing.Dict[str, typing.List[typing.Any]]
+    activeSubscriptions: typing.Dict[str, typing.List[str]]
 
     def __init__(self, containerName: str, cbPort: int, quantumleapPort: int):
         """
@@ -31,37 +79,275 @@ class QuantumLeapManager:
         self.quantumleapPort = quantumleapPort
         self.activeSubscriptions = {}
 
-    def createQuantumLeapSubscription(self, cbConnection: Client, entityType: str, attribute: str, description: str):
+    def getNotificationUrl(self) -> str:
+        """
+        Get the QuantumLeap endpoint notified by the subscriptions.
+        """
+        return f"http://{self.containerName}:{self.quantumleapPort}/v2/notify"
+
+    @staticmethod
+    def resolveEntityType(entityType: str) -> str:
+        """
+        Get the NGSI-LD type of an entity type given by name (e.g. "road segment").
+        """
+        if entityType.lower() in ["road segment", "roadsegment"]:
+            return ROAD_SEGMENT_DATA_MODEL_TYPE
+        elif entityType.lower() in ["trafficflowobserved", "traffic flow observed"]:
+            return TRAFFIC_FLOW_OBSERVED_DATA_MODEL_TYPE
+        elif entityType.lower() == "device":
+            return "Device"
+        return entityType
+
+    @staticmethod
+    def getSubscriptionKey(subscription: dict) -> typing.Tuple[typing.FrozenSet[str], typing.FrozenSet[str], str]:
+        """
+        Get the key matching equivalent subscriptions: the entity types, the watched attributes and the endpoint.
+
+        :param subscription: The subscription, as built or as listed by the Context Broker.
+        :return: The (entity types, watched attributes, endpoint uri) tuple.
+        """
+        entityTypes = frozenset(normalizeTerm(entity["type"]) for entity in subscription.get("entities", [])
+                                if "type" in entity)
+        watchedAttributes = frozenset(normalizeTerm(attribute)
+                                      for attribute in subscription.get("watchedAttributes", None) or [])
+        endpoint = subscription.get("notification", {}).get("endpoint", {}).get("uri", "")
+        return entityTypes, watchedAttributes, endpoint
+
+    @staticmethod
+    def isOwnedSubscription(subscription: dict) -> bool:
+        """
+        Check whether a subscription has been created by the twin, i.e. its description starts with
+        SUBSCRIPTION_OWNER_TAG (see buildSubscription).
+        """
+        return (subscription.get("description") or "").startswith(SUBSCRIPTION_OWNER_TAG)
+
+    @staticmethod
+    def getSubscriptionSettings(subscription: dict) -> typing.Dict[str, typing.Any]:
+        """
+        Get the notification settings (SUBSCRIPTION_SETTINGS) of a subscription.
+
+        :param subscription: The subscription, as built or as listed by the Context Broker.
+        :return: The settings, with the defaults of the NGSI-LD API for the missing ones.
+        """
+        notification = subscription.get("notification", {})
+        return {
+            "throttling": subscription.get("throttling") or 0,
+            "timeInterval": subscription.get("timeInterval") or 0,
+            "notifiedAttributes": frozenset(normalizeTerm(attribute)
+                                            for attribute in notification.get("attributes", None) or []),
+            "format": notification.get("format", "normalized"),
+            "sysAttrs": bool(notification.get("sysAttrs", False)),
+        }
+
+    def buildSubscription(self, entityTypes: typing.List[str], attributes: typing.List[str], description: str,
+                          throttling: Optional[int] = None, timeInterval: Optional[int] = None,
+                          notifiedAttributes: Optional[typing.List[str]] = None,
+                          notificationFormat: str = "normalized", systemAttributes: bool = False) -> dict:
         """
-        Creates a subscription in the context broker for a specific entity type and attribute.
+        Build the payload of a subscription notifying QuantumLeap.
+
+        :param entityTypes: The entity types to subscribe to (resolved through resolveEntityType).
+        :param attributes: The attributes whose changes trigger a notification.
+        :param description: A description for the subscription, prefixed with SUBSCRIPTION_OWNER_TAG.
+        :param throttling: Minimum number of seconds between two notifications of the subscription.
+        :param timeInterval: If set, the entities are notified periodically every timeInterval seconds instead of at
+        each change (watched attributes are not allowed by NGSI-LD in this case).
+        :param notifiedAttributes: The attributes included in the notifications (all of them if None).
+        :param notificationFormat: The format of the notified entities ("normalized" or "keyValues").
+        :param systemAttributes: If True, the notified entities include createdAt/modifiedAt (sysAttrs), e.g. for
+        measuring the update-to-notification latency.
+        :return: The subscription payload.
+        :raises ValueError: If both throttling and timeInterval are set.
+        """
+        if throttling and timeInterval:
+            raise ValueError("throttling and timeInterval can not be set on the same subscription.")
+        builder = SubscriptionBuilder(self.getNotificationUrl()).description(f"{SUBSCRIPTION_OWNER_TAG} {description}")
+        for entityType in entityTypes:
+            builder.select_type(self.resolveEntityType(entityType))
+        if not timeInterval:
+            builder.watch(list(attributes))
+        if notifiedAttributes:
+            builder.notif(list(notifiedAttributes))
+        subscription = builder.build()
+        subscription["notification"]["format"] = notificationFormat
+        if systemAttributes:
+            subscription["notification"]["sysAttrs"] = True
+        if throttling:
+            subscription["throttling"] = throttling
+        if timeInterval:
+            subscription["timeInterval"] = timeInterval
+        return subscription
+
+    @staticmethod
+    def listSubscriptions(cbConnection: Client, pageSize: int = SUBSCRIPTION_PAGE_SIZE) -> typing.List[dict]:
+        """
+        List all the subscriptions of the Context Broker, page by page (limit/offset) until a short page is returned.
+
+        :param cbConnection: An instance of the NGSI-LD Client for interacting with the context broker.
+        :param pageSize: The number of subscriptions requested per page.
+        :return: The subscriptions, as listed by the Context Broker.
+        :raises ValueError: If a page can not be retrieved.
+        """
+        subscriptions = []
+        offset = 0
+        while True:
+            response = cbConnection.session.get(cbConnection.subscriptions.url,
+                                                params={"limit": pageSize, "offset": offset},
+                                                headers={"Accept": "application/json"})
+            if response.status_code != 200:
+                raise ValueError(f"Failed to list subscriptions: {response.status_code} {response.text}")
+            page = response.json() or []
+            subscriptions.extend(page)
+            if len(page) < pageSize:
+                return subscriptions
+            offset += len(page)
+
+    def listQuantumLeapSubscriptions(self, cbConnection: Client) -> typing.List[dict]:
+        """
+        List the subscriptions of the Context Broker notifying the QuantumLeap endpoint of this manager.
+
+        :param cbConnection: An instance of the NGSI-LD Client for interacting with the context broker.
+        :return: The subscriptions, as listed by the Context Broker.
+        """
+        notificationUrl = self.getNotificationUrl()
+        return [subscription for subscription in self.listSubscriptions(cbConnection)
+                if self.getSubscriptionKey(subscription)[2] == notificationUrl]
+
+    def deleteSubscription(self, cbConnection: Client, subscriptionId: str):
+        """
+        Delete a subscription from the Context Broker.
+
+        :param cbConnection: An instance of the NGSI-LD Client for interacting with the context broker.
+        :param subscriptionId: The id of the subscription.
+        """
+        response = cbConnection.session.delete(f"{cbConnection.subscriptions.url}/{subscriptionId}")
+        if response.status_code not in (204, 404):
+            raise ValueError(f"Failed to delete subscription {subscriptionId}: {response.status_code} {response.text}")
+        for subscriptionIds in self.activeSubscriptions.values():
+            if subscriptionId in subscriptionIds:
+                subscriptionIds.remove(subscriptionId)
+
+    def ensureSubscription(self, cbConnection: Client, subscription: dict, existing: Optional[typing.List[dict]] = None) -> str:
+        """
+        Make sure that a subscription exists in the Context Broker exactly once: an equivalent subscription (same
+        key, see getSubscriptionKey) with the same settings is reused, one with different settings is replaced,
+        further equivalent subscriptions are deleted. Subscriptions not created by the twin (see isOwnedSubscription)
+        can be reused but are never deleted.
+
+        :param cbConnection: An instance of the NGSI-LD Client for interacting with the context broker.
+        :param subscription: The subscription payload (see buildSubscription).
+        :param existing: The subscriptions already listed from the Context Broker (listed here if None).
+        :return: The id of the subscription.
+        """
+        if existing is None:
+            existing = self.listQuantumLeapSubscriptions(cbConnection)
+        key = self.getSubscriptionKey(subscription)
+        settings = self.getSubscriptionSettings(subscription)
+        matches = [candidate for candidate in existing if self.getSubscriptionKey(candidate) == key]
+        reused = next((candidate for candidate in matches if self.getSubscriptionSettings(candidate) == settings), None)
+        for candidate in matches:
+            if candidate is not reused and self.isOwnedSubscription(candidate):
+                self.deleteSubscription(cbConnection, candidate["id"])
+                existing.remove(candidate)
+                print(f"Deleted {'duplicate' if reused is not None else 'outdated'} subscription {candidate['id']}")
+        if reused is not None:
+            print(f"Subscription reused: {reused['id']}")
+            return reused["id"]
+        subscriptionId = cbConnection.subscriptions.create(subscription, raise_on_conflict=False)
+        existing.append({**subscription, "id": subscriptionId})
+        print(f"Subscription created: {subscription}")
+        return subscriptionId
+
+    def createQuantumLeapSubscription(self, cbConnection: Client, entityType: str, attribute: str, description: str,
+                                      throttling: Optional[int] = None, timeInterval: Optional[int] = None,
+                                      notifiedAttributes: Optional[typing.List[str]] = None,
+                                      notificationFormat: str = "normalized") -> str:
+        """
+        Creates a subscription in the context broker for a specific entity type and attribute, unless an equivalent
+        one already exists (see ensureSubscription).
 
         :param cbConnection: An instance of the NGSI-LD Client for interacting with the context broker.
         :param entityType: The entity type to subscribe to.
         :param attribute: The attribute of the entity to watch for changes.
         :param description: A description for the subscription.
+        :param throttling: Minimum number of seconds between two notifications of the subscription.
+        :param timeInterval: If set, the entities are notified periodically every timeInterval seconds.
+        :param notifiedAttributes: The attributes included in the notifications (all of them if None).
+        :param notificationFormat: The format of the notified entities ("normalized" or "keyValues").
+        :return: The id of the subscription.
         :raises ValueError: If the subscription creation fails.
         """
-        subscriptionPayload = dict()
+        entityType = self.resolveEntityType(entityType)
         try:
-            notificationurl = f"http://{self.containerName}:{self.quantumleapPort}/v2/notify"
-
-            if entityType.lower() in ["road segment", "roadsegment"]:
-                entityType = ROAD_SEGMENT_DATA_MODEL_TYPE
-            elif entityType.lower() in ["trafficflowobserved", "traffic flow observed"]:
-                entityType = TRAFFIC_FLOW_OBSERVED_DATA_MODEL_TYPE
-            elif entityType.lower() == "device":
-                entityType = "Device"
-
-            subscriptionPayload = (
-                SubscriptionBuilder(notificationurl)
-                .description(description)
-                .select_type(entityType)
-                .watch([attribute])
-                .build()
-            )
-            newSubscription = cbConnection.subscriptions.create(subscriptionPayload)
-            self.activeSubscriptions[entityType] = self.activeSubscriptions.get(entityType, []) + [newSubscription]
-            print(f"Subscription created: {subscriptionPayload}")
+            subscriptionPayload = self.buildSubscription([entityType], [attribute], description, throttling=throttling,
+                                                         timeInterval=timeInterval,
+                                                         notifiedAttributes=notifiedAttributes,
+                                                         notificationFormat=notificationFormat)
+            subscriptionId = self.ensureSubscription(cbConnection, subscriptionPayload)
+            if subscriptionId not in self.activeSubscriptions.get(entityType, []):
+                self.activeSubscriptions[entityType] = self.activeSubscriptions.get(entityType, []) + [subscriptionId]
+            return subscriptionId
 
         except Exception as e:
             raise ValueError(f"Failed to create subscription for {entityType}: {e}")
+
+    def createProfileSubscriptions(self, cbConnection: Client, profile: str = "live",
+                                   entityTypes: typing.Iterable[str] = TRAFFIC_ENTITY_TYPES,
+                                   attribute: str = "trafficFlow", **overrides) -> typing.List[str]:
+        """
+        Creates (idempotently, see ensureSubscription) the subscriptions notifying QuantumLeap of the changes of an
+        attribute, according to a named profile of SUBSCRIPTION_PROFILES. Subscriptions of a different profile left
+        by previous runs are not matched, and can be removed with removeStaleSubscriptions.
+
+        :param cbConnection: An instance of the NGSI-LD Client for interacting with the context broker.
+        :param profile: The name of the profile ("live", "replay" or "replay-batched").
+        :param entityTypes: The entity types to subscribe to.
+        :param attribute: The attribute whose changes are notified.
+        :param overrides: Settings of the profile to be overridden (e.g. systemAttributes=True, the batching
+        timeInterval=60 or the lossy throttling=5).
+        :return: The ids of the subscriptions.
+        :raises ValueError: If the profile is unknown or the subscriptions can not be created.
+        """
+        if profile not in SUBSCRIPTION_PROFILES:
+            raise ValueError(f"Unknown subscription profile: {profile}. Available profiles: {list(SUBSCRIPTION_PROFILES)}")
+        unknownSettings = set(overrides) - set(SUBSCRIPTION_PROFILES[profile])
+        if unknownSettings:
+            raise ValueError(f"Unknown subscription profile settings: {sorted(unknownSettings)}")
+        settings = {**SUBSCRIPTION_PROFILES[profile], **overrides}
+        entityTypes = [self.resolveEntityType(entityType) for entityType in entityTypes]
+        groups = [entityTypes] if settings["groupTypes"] else [[entityType] for entityType in entityTypes]
+        try:
+            existing = self.listQuantumLeapSubscriptions(cbConnection)
+            subscriptionIds = []
+            for group in groups:
+                subscriptionPayload = self.buildSubscription(
+                    group, [attribute], f"Notify QuantumLeap of {attribute} ({profile} profile)",
+                    throttling=settings["throttling"], timeInterval=settings["timeInterval"],
+                    notifiedAttributes=settings["notifiedAttributes"], systemAttributes=settings["systemAttributes"])
+                subscriptionId = self.ensureSubscription(cbConnection, subscriptionPayload, existing=existing)
+                for entityType in group:
+                    if subscriptionId not in self.activeSubscriptions.get(entityType, []):
+                        self.activeSubscriptions[entityType] = self.activeSubscriptions.get(entityType, []) + [subscriptionId]
+                subscriptionIds.append(subscriptionId)
+            return subscriptionIds
+        except Exception as e:
+            raise ValueError(f"Failed to create the subscriptions of the {profile} profile: {e}")
+
+    def removeStaleSubscriptions(self, cbConnection: Client) -> int:
+        """
+        Delete the subscriptions created by the twin (see isOwnedSubscription) that notify QuantumLeap but have not
+        been created or reused by this manager (e.g. left by previous runs with different entity types or
+        attributes). Subscriptions of other tools or instances are kept.
+
+        :param cbConnection: An instance of the NGSI-LD Client for interacting with the context broker.
+        :return: The number of deleted subscriptions.
+        """
+        managedIds = {subscriptionId for subscriptionIds in self.activeSubscriptions.values()
+                      for subscriptionId in subscriptionIds}
+        deleted = 0
+        for subscription in self.listQuantumLeapSubscriptions(cbConnection):
+            if subscription["id"] not in managedIds and self.isOwnedSubscription(subscription):
+                self.deleteSubscription(cbConnection, subscription["id"])
+                deleted += 1
+                print(f"Deleted stale subscription {subscription['id']}")
+        return deleted
@@ -0,0 +1,266 @@
+# ****************************************************
+# Module Purpose:
+#   This library defines the SumoToolPool class, a long-lived pool of worker processes that runs the SUMO python tools
+#   (randomTrips, routeSampler, edgeDataFromFlow, mapDetectors, plotXMLAttributes) as library modules instead of
+#   starting a new interpreter for each invocation.
+#
+#   Each worker imports the tools only once and keeps the SUMO networks it parses in memory, so that consecutive jobs
+#   on the same network do not pay the net parsing again: while a job runs, sumolib.net.readNet returns the cached
+#   network itself, which the tools run by the pool only read. Jobs are queued to the workers and every job returns a
+#   structured result with the captured output and the error, if any.
+#
+# ****************************************************
+import atexit
+import contextlib
+import importlib.util
+import io
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Dict, List, Optional, Any
+
+from libraries.constants import SUMO_TOOLS_PATH
+
+# SUMO tools that can be run by the pool, with their path relative to the SUMO tools folder
+SUMO_TOOLS = {
+    "randomTrips": "randomTrips.py",
+    "routeSampler": "routeSampler.py",
+    "edgeDataFromFlow": "detector/edgeDataFromFlow.py",
+    "mapDetectors": "detector/mapDetectors.py",
+    "plotXMLAttributes": "visualization/plotXMLAttributes.py",
+}
+
+
+class SumoToolError(Exception):
+    """
+    Raise when a SUMO tool job terminates with an error.
+    """
+    def __init__(self, message: str, result: Dict[str, Any]):
+        super().__init__(message)
+        self.result = result
+
+    def __str__(self):
+        return f"SUMO tool '{self.result['tool']}' failed: {self.args[0]}\n{self.result['stderr']}"
+
+
+### WORKER SIDE
+# Tools imported by the worker process, by tool name
+workerTools = {}
+# SUMO networks parsed by the worker process, by (path, modification time, readNet arguments). The cached networks
+# are shared by all the jobs of the worker and must be treated as read-only
+workerNets = {}
+
+
+def initializeWorker(toolsPath: str):
+    """
+    Initialize a worker process: the SUMO tools folders are added to the import path.
+
+    :param toolsPath: path of the SUMO tools folder
+    """
+    for folder in [toolsPath, os.path.join(toolsPath, "detector"), os.path.join(toolsPath, "visualization")]:
+        if folder not in sys.path:
+            sys.path.insert(0, folder)
+    # plots are only saved to file by the workers
+    os.environ.setdefault("MPLBACKEND", "Agg")
+
+
+@contextlib.contextmanager
+def cachedNets():
+    """
+    Within the block, sumolib.net.readNet parses every network only once for the worker process and returns the same
+    network to each call. Copying it is not an option: a deep copy of the cyclic sumolib network costs as much as
+    parsing it again. The tools listed in SUMO_TOOLS only read the network; a tool modifying it must not be added to
+    the pool. The original readNet is restored at the end of the block.
+    """
+    import sumolib
+    readNet = sumolib.net.readNet
+
+    def cachedReadNet(filename, **others):
+        key = (os.path.abspath(filename), os.path.getmtime(filename), tuple(sorted(others.items())))
+        if key not in workerNets:
+            workerNets[key] = readNet(filename, **others)
+        return workerNets[key]
+
+    sumolib.net.readNet = cachedReadNet
+    try:
+        yield
+    finally:
+        sumolib.net.readNet = readNet
+
+
+def loadTool(toolsPath: str, tool: str):
+    """
+    Import a SUMO tool as a module, only once for each worker process.
+
+    :param toolsPath: path of the SUMO tools folder
+    :param tool: name of the tool, as listed in SUMO_TOOLS
+    :return: the imported module
+    """
+    if tool not in workerTools:
+        if tool not in SUMO_TOOLS:
+            raise ValueError(f"Unknown SUMO tool: {tool}. Available tools: {list(SUMO_TOOLS.keys())}")
+        toolPath = os.path.join(toolsPath, SUMO_TOOLS[tool])
+        spec = importlib.util.spec_from_file_location(f"sumotools_{tool}", toolPath)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        workerTools[tool] = module
+    return workerTools[tool]
+
+
+def runToolJob(toolsPath: str, tool: str, args: List[str]) -> Dict[str, Any]:
+    """
+    Run a SUMO tool inside the worker process, as `tool.main(tool.get_options(args))`, capturing its output.
+
+    :param toolsPath: path of the SUMO tools folder
+    :param tool: name of the tool, as listed in SUMO_TOOLS
+    :param args: command line arguments of the tool
+    :return: a dictionary with tool, args, returnCode, stdout, stderr, elapsed time (s) and error message (or None)
+    """
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    returnCode = 0
+    error = None
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr), cachedNets():
+            module = loadTool(toolsPath, tool)
+            getOptions = getattr(module, "get_options", None) or getattr(module, "getOptions", None)
+            if getOptions is None:
+                raise ValueError(f"SUMO tool '{tool}' defines neither get_options nor getOptions, "
+                                 f"it cannot be run by the pool")
+            returned = module.main(getOptions([str(arg) for arg in args]))
+            if isinstance(returned, int):
+                returnCode = returned
+    except SystemExit as e:
+        # argparse and the tools themselves exit on invalid options
+        if e.code is None or isinstance(e.code, int):
+            returnCode = e.code or 0
+        else:
+            returnCode = 1
+            error = str(e.code)
+    except Exception as e:
+        returnCode = 1
+        error = f"{type(e).__name__}: {e}"
+        stderr.write(traceback.format_exc())
+    if returnCode != 0 and error is None:
+        error = f"exit status {returnCode}"
+    return {
+        "tool": tool,
+        "args": [str(arg) for arg in args],
+        "returnCode": returnCode,
+        "stdout": stdout.getvalue(),
+        "stderr": stderr.getvalue(),
+        "elapsed": time.perf_counter() - start,
+        "error": error
+    }
+
+
+### CLIENT SIDE
+class SumoToolPool:
+    """
+    A pool of long-lived worker processes running the SUMO python tools. Jobs are queued with submit (which returns a
+    Future) or run (which waits for the result).
+
+    Attributes:
+        toolsPath (str): path of the SUMO tools folder
+        workers (int): number of worker processes
+        executor (ProcessPoolExecutor): the executor that queues the jobs to the workers
+    """
+    toolsPath: str
+    workers: int
+    executor: ProcessPoolExecutor
+
+    def __init__(self, toolsPath: str = SUMO_TOOLS_PATH, workers: int = 2):
+        """
+        Initializes the pool. The worker processes are started at the first submitted job.
+
+        :param toolsPath: path of the SUMO tools folder
+        :param workers: number of worker processes
+        :raises FileNotFoundError: if the SUMO tools path does not exist.
+        """
+        if not os.path.exists(toolsPath):
+            raise FileNotFoundError("sumoenv tools path does not exist.")
+        self.toolsPath = toolsPath
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(max_workers=workers, initializer=initializeWorker,
+                                            initargs=(toolsPath,))
+
+    def submit(self, tool: str, args: List[str]) -> Future:
+        """
+        Queue a job for a SUMO tool.
+
+        :param tool: name of the tool, as listed in SUMO_TOOLS
+        :param args: command line arguments of the tool
+        :return: a Future whose result is the job result dictionary (see runToolJob)
+        """
+        if tool not in SUMO_TOOLS:
+            raise ValueError(f"Unknown SUMO tool: {tool}. Available tools: {list(SUMO_TOOLS.keys())}")
+        return self.executor.submit(runToolJob, self.toolsPath, tool, list(args))
+
+    def run(self, tool: str, args: List[str], check: bool = True) -> Dict[str, Any]:
+        """
+        Run a job for a SUMO tool and wait for its result.
+
+        :param tool: name of the tool, as listed in SUMO_TOOLS
+        :param args: command line arguments of the tool
+        :param check: if True, a SumoToolError is raised when the job fails
+        :return: the job result dictionary (see runToolJob)
+        :raises SumoToolError: if check is True and the job fails
+        """
+        return self.result(self.submit(tool, args), check=check)
+
+    def runAll(self, jobs: List[tuple], check: bool = True) -> List[Dict[str, Any]]:
+        """
+        Queue several jobs at once, so that they run in parallel on the workers, and wait for all their results.
+
+        :param jobs: list of (tool, args) tuples
+        :param check: if True, a SumoToolError is raised when a job fails (after all the jobs terminated)
+        :return: the job result dictionaries, in the same order of the jobs
+        """
+        futures = [self.submit(tool, args) for tool, args in jobs]
+        results = [self.result(future, check=False) for future in futures]
+        if check:
+            for result in results:
+                if result["error"] is not None:
+                    raise SumoToolError(result["error"], result)
+        return results
+
+    @staticmethod
+    def result(future: Future, check: bool = True) -> Dict[str, Any]:
+        """
+        Wait for the result of a submitted job.
+
+        :param future: the Future returned by submit
+        :param check: if True, a SumoToolError is raised when the job fails
+        :return: the job result dictionary
+        """
+        result = future.result()
+        if check and result["error"] is not None:
+            raise SumoToolError(result["error"], result)
+        return result
+
+    def shutdown(self, wait: bool = True):
+        """
+        Stop the worker processes.
+        """
+        self.executor.shutdown(wait=wait)
+
+
+sharedPool: Optional[SumoToolPool] = None
+
+
+def getSumoToolPool(workers: int = 2) -> SumoToolPool:
+    """
+    Get the pool shared by the whole application, creating it at the first call. The pool is shut down when the
+    interpreter exits.
+
+    :param workers: number of worker processes, used only when the pool is created
+    :return: the shared SumoToolPool
+    """
+    global sharedPool
+    if sharedPool is None:
+        sharedPool = SumoToolPool(workers=workers)
+        atexit.register(sharedPool.shutdown)
+    return sharedPool
@@ -1,4 +1,6 @@
 import csv
+import glob
+import json
 import math
 import os
 import os.path
@@ -9,11 +11,63 @@ from matplotlib import pyplot as plt
 import sys
 import subprocess
 import xml.etree.ElementTree as ET
+import typing
+from typing import Optional
 from scipy.interpolate import UnivariateSpline
 from libraries.classes.SumoSimulator import Simulator
+from libraries.utils.datastoreUtils import loadTrafficData, normalizeDate
+from libraries.utils.networkUtils import loadEdgeAttributes
 from libraries.constants import SUMO_PATH, SUMO_NET_PATH, SUMO_DETECTORS_ADD_FILE_PATH, SUMO_OUTPUT_PATH, SUMO_TOOLS_PATH
 from pathlib import Path
 
+# Name of the marker file written inside route and simulation folders that must be regenerated
+STALE_MARKER_FILE = "STALE"
+# Columns of the macroscopic model, in the same order produced by TrafficModeler.getMacroscopicModel
+STATE_MODEL_COLUMNS = ["edge_id", "length", "laneCount", "flow", "vehiclesPerSecond", "vpsPerLane", "laneVps", "density",
+                       "laneDensity", "maxDensity", "vMax", "velocity", "normVelocity"]
+
+
+def getStateFilePath(stateFilePath: str, date: str) -> str:
+    """
+    Get the path of the state table file of a date (e.g. traffic_model_state.csv -> traffic_model_state_2024-02-01.csv).
+    """
+    root, extension = os.path.splitext(stateFilePath)
+    return f"{root}_{normalizeDate(date)}{extension}"
+
+
+def getDeltaFilePath(stateFilePath: str) -> str:
+    """
+    Get the path of the file collecting the cells ingested after the state table file was last written.
+    """
+    root, extension = os.path.splitext(stateFilePath)
+    return f"{root}_delta{extension}"
+
+
+def getSourceSignature(trafficDataFile: str) -> typing.Dict[str, typing.Any]:
+    """
+    Describe the traffic data a state table is built from, so that a table built from other (or since modified) data
+    is not reused. For date-partitioned datasets all the files of the dataset are considered.
+
+    :param trafficDataFile: path of the .csv file or of the dataset folder
+    :return: a dictionary with the absolute path, total size and last modification time of the data
+    """
+    if os.path.isdir(trafficDataFile):
+        files = [os.path.join(folder, name) for folder, _, names in os.walk(trafficDataFile) for name in names]
+    else:
+        files = [trafficDataFile]
+    stats = [os.stat(file) for file in files]
+    return {"trafficDataFile": os.path.abspath(trafficDataFile),
+            "size": sum(stat.st_size for stat in stats),
+            "modifiedAt": max((stat.st_mtime for stat in stats), default=0)}
+
+
+def slotColumn(hour: int) -> str:
+    """
+    Get the name of the measurement column related to a one-hour slot (e.g. 7 -> 07:00-08:00, 23 -> 23:00-24:00).
+    """
+    return f"{hour:02d}:00-{hour + 1:02d}:00"
+
+
 class TrafficModeler:
     """
     A class that manages and compares traffic patterns based on the actual data provided as input. There are functions
@@ -23,113 +77,384 @@ class TrafficModeler:
     Attributes:
         trafficData (pandas DataFrame): dataframe containing traffic measurement.
         macroscopicData (list): list of macroscopic data linked to specific induction loop location
-        sumoNet (sumolib.net): sumolib class that contains the road network information representable on SUMO
+        edgeAttributes (pandas DataFrame): length, lanes, speed, priority and TLS flag of the SUMO network edges
         simulator (SumoSimulator): instance of SumoSimulator class that manages and runs SUMO simulations
         modelType (str): name of the macroscopic model type to apply when building estimations
         date (str): date on which the measurements to be modeled were taken
         timeslot (str): hourly timeslot on which the measurements to be modeled were taken
+        incremental (bool): whether the macroscopic model is kept in an edge x slot state table
+        trafficDataFile (str): path of the traffic measurement file or dataset
+        stateTable (pandas DataFrame): edge x slot state table of the macroscopic model (incremental mode only)
+        stateFilePath (str): path of the state table file of the modeled date, or None if it is not persisted
+        staleArtefacts (dict): slots whose routes and simulations are outdated, with the changed edges
     """
 
     trafficData: pd.DataFrame
     macroscopicData: []
-    sumoNet: sumolib.net
+    edgeAttributes: pd.DataFrame
     simulator: Simulator
     modelType: str
     date: str
     timeSlot: str
-    def __init__(self, simulator: Simulator, trafficDataFile: str, sumoNetFile : str, date: str = None, timeSlot: str = '00:00-23:00', modelType: str = "greenshield"):
+    trafficDataFile: str
+    incremental: bool
+    stateTable: Optional[pd.DataFrame]
+    stateFilePath: Optional[str]
+    staleArtefacts: typing.Dict[str, typing.Set[str]]
+    def __init__(self, simulator: Simulator, trafficDataFile: str, sumoNetFile : str, date: str = None, timeSlot: str = '00:00-23:00', modelType: str = "greenshield",
+                 incremental: bool = False, stateFilePath: Optional[str] = None):
         """
         Initializes the TrafficModeler, also deriving road parameters from the SUMO network
 
-        :param trafficDataFile (str): path of the file containing traffic measurement.
+        :param trafficDataFile (str): path of the file containing traffic measurement. It can be either a .csv file or
+        a date-partitioned dataset folder (see datastoreUtils.writePartitionedDataset).
         :param sumoNetFile (str): path of the file related to the sumo network (identified with the extension .net.xml).
         :param timeSlot (str): Time window value of the measurements to be evaluated reported in the format hh:mm-hh:mm
         :param modelType (str): Name of the traffic model to apply
+        :param incremental (bool): if True, the macroscopic values of every edge are computed once for all the 24
+        one-hour slots and kept in a persistent state table, which is then updated through ingestMeasurements. A date
+        is required.
+        :param stateFilePath (str): optional path of the .csv file used to persist the state table. The actual file is
+        keyed by date (see getStateFilePath); it is loaded instead of being rebuilt only if it was built for the same
+        date from the same, unchanged traffic data file
+        :raises ValueError: if incremental is True and no date is given
         """
+        if incremental and date is None:
+            raise ValueError("The incremental TrafficModeler models a single date: a date is required.")
         self.simulator = simulator
-        trafficDataDf = pd.read_csv(trafficDataFile, sep=';')
-        if date is not None:
-            self.trafficData = trafficDataDf[trafficDataDf['data'].str.contains(date)]
-            self.date = date
+        self.date = date
+        self.trafficDataFile = trafficDataFile
+        # on date-partitioned datasets only the partition of the selected day is read
+        self.trafficData = loadTrafficData(trafficDataFile, date=date).copy()
         self.timeSlot = timeSlot
         self.timeSlot = self.timeSlot.replace(':', '-')
-        self.sumoNet = sumolib.net.readNet(sumoNetFile)
+        # edge attributes are read from the shared edge attribute table, parsing the network only when it changes
+        self.edgeAttributes = loadEdgeAttributes(sumoNetFile)
         self.modelType = modelType
+        self.incremental = incremental
+        self.stateTable = None
+        self.stateFilePath = getStateFilePath(stateFilePath, date) if incremental and stateFilePath is not None else None
+        self.staleArtefacts = {}
+        if self.incremental:
+            if self.stateFilePath is None or not self.loadStateTable(self.stateFilePath):
+                self.buildStateTable()
+                if self.stateFilePath is not None:
+                    self.saveStateTable(self.stateFilePath)
         self.getMacroscopicModel()
 
 
     def changeTimeslot(self, timeSlot: str):
         """
         change the timeslot to be evaluated. Changing the timeslot will cause a recalculation of macroscopic
-        values according to the previously selected model
+        values according to the previously selected model. In incremental mode, one-hour slots are read from the
+        state table without any recomputation.
         """
         self.timeSlot = timeSlot
         self.timeSlot = self.timeSlot.replace(':', '-')
         self.getMacroscopicModel()
 
+    def getEdgeParameters(self, edge_id: str) -> typing.Tuple[float, float, int, float]:
+        """
+        Get the road parameters used by the macroscopic models for a specific edge of the SUMO network.
+
+        :param edge_id: the edge_id to look up in the SUMO network
+        :return: a tuple with edge length (m), maximum speed (km/h), number of lanes and jam density (vehicles/km)
+        """
+        edge = self.getEdgeParameterTable([edge_id]).iloc[0]
+        return edge["length"], edge["vMax"], int(edge["laneCount"]), edge["maxDensity"]
+
+    def getEdgeParameterTable(self, edge_ids) -> pd.DataFrame:
+        """
+        Get the road parameters used by the macroscopic models for a set of edges, computed at once from the edge
+        attribute table.
+
+        :param edge_ids: the edge_ids to look up
+        :return: a dataframe with the columns edge_id, length (m), vMax (km/h), laneCount and maxDensity (vehicles/km)
+        """
+        edges = self.edgeAttributes.loc[list(edge_ids)]
+        vehicleLength = 7.5  # 7.5 # this length is including the gap between vehicles
+        return pd.DataFrame({
+            "edge_id": edges.index,
+            "length": edges["length"].to_numpy(),
+            "vMax": edges["speed"].to_numpy() * 3.6,
+            "laneCount": edges["lanes"].to_numpy(),
+            "maxDensity": (edges["lanes"].to_numpy() / vehicleLength) * 1000
+        })
+
+    def computeMacroscopicValues(self, flow, hours, vMax, laneCount, maxDensity) -> typing.Dict[str, typing.Any]:
+        """
+        Apply the selected macroscopic model to the measured vehicle counts. All the arguments can be either scalars or
+        numpy arrays of the same length, so that the same formulas are used both for a single edge and for a whole
+        block of edge x slot cells.
+
+        :param flow: number of vehicles counted in the time window
+        :param hours: length of the time window in hours
+        :param vMax: maximum speed of the edge (km/h)
+        :param laneCount: number of lanes of the edge
+        :param maxDensity: jam density of the edge (vehicles/km)
+        :return: a dictionary with the derived flow, density and velocity values
+        :raises ValueError: if the model type is not supported
+        """
+        flow = np.asarray(flow, dtype=float)
+        vps = flow / (3600 * hours)  # flow is set as vehicles per second
+        density = flow / vMax
+        # density = int(flow) / ((length/1000) * laneCount)
+        # density = density/1000
+        if self.modelType == "greenshield":
+            velocity = vMax * (1 - density / maxDensity)
+        elif self.modelType == "underwood":
+            velocity = vMax * np.exp(-density / (maxDensity/2))
+        elif self.modelType == "vanaerde":
+            critical_density = maxDensity / 2
+            q_max = critical_density * vMax  # max flow
+            c1 = (vMax / q_max) - (1 / maxDensity)
+            c2 = 1 / (maxDensity * q_max)
+
+            # Calcolo della velocità usando Van Aerde
+            velocity = vMax / (1 + c1 * density + c2 * density ** 2)
+        else:
+            raise ValueError(f"Unsupported macroscopic model type: {self.modelType}")
+        # velocity = velocity / 3.6
+        #density = vps / velocity if velocity > 0 else maxDensity
+        return {
+            "vehiclesPerSecond": vps,
+            "vpsPerLane": vps / laneCount,
+            "laneVps": vps / laneCount,
+            "density": density,
+            "laneDensity": density / laneCount,
+            "maxDensity": maxDensity,
+            "vMax": vMax,
+            "velocity": velocity,
+            "normVelocity": velocity / vMax
+        }
+
     def getMacroscopicModel(self):
         """
         calculate macroscopic data according to a selected model. This is called when a instance of the class is created
         or the timeslot is changed
         """
-        self.macroscopicData = []
-        for index, row in self.trafficData.iterrows():
-            edge_id = row["edge_id"]
-            edge = self.sumoNet.getEdge(edge_id)
-            length = edge.getLength()
-            vMax = edge.getSpeed() * 3.6
-            laneCount = len(edge.getLanes())
-            vehicleLength = 7.5  # 7.5 # this length is including the gap between vehicles
-            maxDensity = (laneCount / vehicleLength) * 1000
-            # print(f"Edge {edge_id}: k_jam = {maxDensity * 1000} vehicles/km")
-            first = int(self.timeSlot[:2])
-            last = int(self.timeSlot[6:8])
-            # Calculate the vehicle count for the specified time slot
-            if last - first > 1:  # If the time slot spans multiple hours
-                total_count = sum(row[f"{hour:02d}:00-{(hour + 1) % 24:02d}:00"] for hour in range(first, last))
-                flow = str(total_count)
-            else:
-                flow = str(row[self.timeSlot[:2]+':00-'+self.timeSlot[6:8]+':00'])
-
-            vps = int(flow) / (3600 * (last - first))  # flow is set as vehicles per second
-            density = int(flow) / vMax
-            # density = int(flow) / ((length/1000) * laneCount)
-            # density = density/1000
-            laneDensity = density / laneCount
-            laneVps = vps / laneCount
-            if self.modelType == "greenshield":
-                velocity = vMax * (1 - density / maxDensity)
-            elif self.modelType == "underwood":
-                velocity = vMax * np.exp(-density / (maxDensity/2))
-            elif self.modelType == "vanaerde":
-                critical_density = maxDensity / 2
-                q_max = critical_density * vMax  # max flow
-                c1 = (vMax / q_max) - (1 / maxDensity)
-                c2 = 1 / (maxDensity * q_max)
-
-                # Calcolo della velocità usando Van Aerde
-                velocity = vMax / (1 + c1 * density + c2 * density ** 2)
-            # velocity = velocity / 3.6
-            #density = vps / velocity if velocity > 0 else maxDensity
-            laneDensity = density / laneCount
-            normVelocity = velocity / vMax
-            vpsPerLane = vps / laneCount
-
-            self.macroscopicData.append({
-                "edge_id": edge_id,
-                "length": length,
-                "laneCount": laneCount,
-                "flow": flow,
-                "vehiclesPerSecond": vps,
-                "vpsPerLane": vpsPerLane,
-                "laneVps": laneVps,
-                "density": density,
-                "laneDensity": laneDensity,
-                "maxDensity": maxDensity,
-                "vMax": vMax,
-                "velocity": velocity,
-                "normVelocity": normVelocity
-            })
+        first = int(self.timeSlot[:2])
+        last = int(self.timeSlot[6:8])
+        if self.incremental and self.stateTable is not None and last - first == 1:
+            self.macroscopicData = self.getStateSlot(slotColumn(first)).to_dict(orient="records")
+            return
+        # the edge parameters are looked up once for the whole slot and the model is applied to all the rows at once
+        if last - first > 1:  # If the time slot spans multiple hours
+            counts = self.trafficData[[f"{hour:02d}:00-{(hour + 1) % 24:02d}:00" for hour in range(first, last)]].sum(axis=1)
+        else:
+            counts = self.trafficData[self.timeSlot[:2]+':00-'+self.timeSlot[6:8]+':00']
+        edgeParameters = self.getEdgeParameterTable(self.trafficData["edge_id"].unique())
+        model = pd.DataFrame({"edge_id": self.trafficData["edge_id"].to_numpy(), "flow": counts.to_numpy()})
+        model = model.merge(edgeParameters, on="edge_id", how="left")
+        values = self.computeMacroscopicValues(model["flow"].astype(int).to_numpy(), last - first,
+                                               model["vMax"].to_numpy(), model["laneCount"].to_numpy(),
+                                               model["maxDensity"].to_numpy())
+        model = model.assign(flow=model["flow"].astype(str), laneCount=model["laneCount"].astype(int),
+                             **{key: np.asarray(value, dtype=float) for key, value in values.items()})
+        self.macroscopicData = model[STATE_MODEL_COLUMNS].to_dict(orient="records")
+
+    ### INCREMENTAL MODELLING FUNCTIONS
+    def buildStateTable(self):
+        """
+        Build the edge x slot state table of the macroscopic model. Each measurement row of the selected date is
+        expanded over the 24 one-hour slots and the model is applied to all the cells at once. The state table is
+        then kept up to date through ingestMeasurements, without recomputing the cells that did not change.
+        """
+        print("Building the macroscopic state table...")
+        slots = [slotColumn(hour) for hour in range(24)]
+        state = self.trafficData[["edge_id"] + slots].copy()
+        state["rowId"] = state.index
+        if "ID_univoco_stazione_spira" in self.trafficData.columns:
+            state["loopId"] = self.trafficData["ID_univoco_stazione_spira"].astype(str)
+        else:
+            state["loopId"] = state["edge_id"].astype(str)
+        state = state.melt(id_vars=["rowId", "loopId", "edge_id"], value_vars=slots, var_name="timeslot",
+                           value_name="flow")
+        self.stateTable = self.computeStateCells(state).set_index(["rowId", "timeslot"]).sort_index()
+        print(f"State table built with {len(self.stateTable)} edge x slot cells.")
+
+    def computeStateCells(self, cells: pd.DataFrame) -> pd.DataFrame:
+        """
+        Compute the macroscopic values for a block of state table cells.
+
+        :param cells: dataframe with at least the edge_id, timeslot and flow columns
+        :return: the same cells enriched with the edge parameters and the macroscopic values
+        """
+        edgeParameters = self.getEdgeParameterTable(cells["edge_id"].unique())
+        cells = cells.drop(columns=["length", "vMax", "laneCount", "maxDensity"], errors="ignore")
+        cells = cells.merge(edgeParameters, on="edge_id", how="left")
+        cells["flow"] = cells["flow"].astype(int)
+        values = self.computeMacroscopicValues(cells["flow"].to_numpy(), 1, cells["vMax"].to_numpy(),
+                                               cells["laneCount"].to_numpy(), cells["maxDensity"].to_numpy())
+        for key, value in values.items():
+            cells[key] = value
+        return cells
+
+    def getStateSlot(self, timeSlot: str) -> pd.DataFrame:
+        """
+        Get the macroscopic model of a one-hour slot from the state table, with the same columns produced by
+        getMacroscopicModel.
+
+        :param timeSlot: the slot to read, in the format hh:mm-hh:mm (e.g. 07:00-08:00)
+        :return: a dataframe with one row for each measurement of the slot
+        """
+        if self.stateTable is None:
+            raise ValueError("The state table has not been built. Create the TrafficModeler with incremental=True.")
+        slot = self.stateTable.xs(timeSlot, level="timeslot")
+        slot = slot.assign(flow=slot["flow"].astype(str))
+        return slot[STATE_MODEL_COLUMNS].reset_index(drop=True)
+
+    def ingestMeasurements(self, measurements: pd.DataFrame) -> pd.DataFrame:
+        """
+        Ingest a delta of new traffic loop readings (e.g. the ones coming through the IoT path), updating only the
+        affected cells of the state table. The routes and simulations built for the changed edges and slots are
+        marked as stale.
+
+        :param measurements: dataframe with the columns 'ID_univoco_stazione_spira' (or 'edge_id'), 'timeslot' in the
+        format hh:mm-hh:mm and 'flow'. An optional 'data' column can be given: readings of other dates are ignored.
+        :return: the updated state table cells
+        """
+        if self.stateTable is None:
+            raise ValueError("The state table has not been built. Create the TrafficModeler with incremental=True.")
+        delta = measurements.copy()
+        if "data" in delta.columns:
+            delta = delta[delta["data"].astype(str).str.contains(self.date)]
+        if "ID_univoco_stazione_spira" in delta.columns:
+            delta["loopId"] = delta["ID_univoco_stazione_spira"].astype(str)
+            keys = self.stateTable[["loopId"]]
+            joinColumn = "loopId"
+        else:
+            keys = self.stateTable[["edge_id"]]
+            joinColumn = "edge_id"
+        # keep only the last reading for each loop and slot
+        delta = delta.drop_duplicates([joinColumn, "timeslot"], keep="last")
+        keys = keys.reset_index().drop_duplicates(["rowId", "timeslot"])
+        cells = keys.merge(delta[[joinColumn, "timeslot", "flow"]], on=[joinColumn, "timeslot"], how="inner")
+        if cells.empty:
+            return cells
+        cells = cells.set_index(["rowId", "timeslot"])
+        current = self.stateTable.loc[cells.index]
+        changed = cells[current["flow"].to_numpy() != cells["flow"].astype(int).to_numpy()].index
+        if len(changed) == 0:
+            return self.stateTable.iloc[0:0]
+
+        updated = self.stateTable.loc[changed].copy()
+        updated["flow"] = cells.loc[changed, "flow"].astype(int)
+        updated = self.computeStateCells(updated.reset_index()).set_index(["rowId", "timeslot"])
+        self.stateTable.loc[changed, updated.columns] = updated
+        # keep the raw measurements aligned with the state table
+        for (rowId, timeSlot), flow in updated["flow"].items():
+            self.trafficData.at[rowId, timeSlot] = flow
+
+        self.markStaleArtefacts(updated)
+        if self.stateFilePath is not None:
+            # only the changed cells are written, the whole table is rewritten when it is loaded again
+            self.appendStateDelta(updated, self.stateFilePath)
+        if slotColumn(int(self.timeSlot[:2])) in updated.index.get_level_values("timeslot"):
+            self.getMacroscopicModel()
+        print(f"Ingested {len(updated)} changed edge x slot cells.")
+        return updated
+
+    def markStaleArtefacts(self, changedCells: pd.DataFrame):
+        """
+        Mark as stale the routes and the simulation outputs related to the changed edges and slots. A marker file
+        listing the changed edges is written inside the route folder of each slot and inside the simulation folders
+        already generated for the modeled date.
+
+        :param changedCells: state table cells that have been updated, indexed by (rowId, timeslot)
+        """
+        for timeSlot, group in changedCells.reset_index().groupby("timeslot"):
+            edges = self.staleArtefacts.setdefault(timeSlot, set())
+            edges.update(group["edge_id"].astype(str))
+            slotFolder = timeSlot.replace(':', '-')
+            folders = [os.path.join(SUMO_PATH, "routes", slotFolder)]
+            folders += glob.glob(os.path.join(SUMO_PATH, f"{self.date}_{self.modelType}_*", slotFolder))
+            for folder in folders:
+                if os.path.isdir(folder):
+                    with open(os.path.join(folder, STALE_MARKER_FILE), "w", encoding="utf-8") as marker:
+                        marker.write("\n".join(sorted(edges)))
+
+    def getStaleTimeslots(self) -> typing.List[str]:
+        """
+        Get the slots whose routes and simulations must be regenerated after the last ingested measurements.
+
+        :return: sorted list of stale slots in the format hh:mm-hh:mm
+        """
+        return sorted(self.staleArtefacts.keys())
+
+    def clearStaleTimeslot(self, timeSlot: str):
+        """
+        Remove the stale mark of a slot, e.g. once its routes have been regenerated and the simulation has been run again.
+
+        :param timeSlot: the slot in the format hh:mm-hh:mm
+        """
+        self.staleArtefacts.pop(timeSlot, None)
+        slotFolder = timeSlot.replace(':', '-')
+        folders = [os.path.join(SUMO_PATH, "routes", slotFolder)]
+        folders += glob.glob(os.path.join(SUMO_PATH, f"{self.date}_{self.modelType}_*", slotFolder))
+        for folder in folders:
+            markerPath = os.path.join(folder, STALE_MARKER_FILE)
+            if os.path.isfile(markerPath):
+                os.remove(markerPath)
+
+    def saveStateTable(self, outputDataPath: str):
+        """
+        Save the edge x slot state table into a .csv file, so that it can be reloaded without being rebuilt. The date
+        and the traffic data it was built from are saved in a .json file next to it, and the cells collected by
+        appendStateDelta are discarded since they are now part of the table.
+
+        :param outputDataPath: path of the file in which to save the state table
+        """
+        os.makedirs(os.path.dirname(os.path.abspath(outputDataPath)), exist_ok=True)
+        self.stateTable.reset_index().to_csv(outputDataPath, sep=';', index=False, decimal=',')
+        with open(os.path.splitext(outputDataPath)[0] + ".json", "w", encoding="utf-8") as file:
+            json.dump({"date": normalizeDate(self.date), **getSourceSignature(self.trafficDataFile)}, file)
+        if os.path.isfile(getDeltaFilePath(outputDataPath)):
+            os.remove(getDeltaFilePath(outputDataPath))
+
+    def appendStateDelta(self, cells: pd.DataFrame, outputDataPath: str):
+        """
+        Append updated cells to the delta file of a saved state table, without rewriting the table.
+
+        :param cells: state table cells indexed by (rowId, timeslot)
+        :param outputDataPath: path of the state table file
+        """
+        deltaFilePath = getDeltaFilePath(outputDataPath)
+        cells.reset_index().to_csv(deltaFilePath, sep=';', index=False, decimal=',', mode='a',
+                                   header=not os.path.isfile(deltaFilePath))
+
+    def loadStateTable(self, inputDataPath: str) -> bool:
+        """
+        Load a previously saved edge x slot state table, applying the cells ingested after it was saved. The table is
+        only loaded if it was built for the modeled date from the current traffic data: the rowIds of the cells refer
+        to the rows of that data.
+
+        :param inputDataPath: path of the file containing the state table
+        :return: True if the state table has been loaded, False if the file is missing or outdated
+        """
+        metadataPath = os.path.splitext(inputDataPath)[0] + ".json"
+        if not os.path.isfile(inputDataPath) or not os.path.isfile(metadataPath):
+            return False
+        with open(metadataPath, encoding="utf-8") as file:
+            metadata = json.load(file)
+        expected = {"date": normalizeDate(self.date), **getSourceSignature(self.trafficDataFile)}
+        if metadata != expected:
+            print(f"The state table {inputDataPath} was built from other traffic data, it will be rebuilt.")
+            return False
+        dtypes = {"loopId": str, "edge_id": str}
+        state = pd.read_csv(inputDataPath, sep=';', decimal=',', dtype=dtypes).set_index(["rowId", "timeslot"])
+        deltaFilePath = getDeltaFilePath(inputDataPath)
+        if os.path.isfile(deltaFilePath):
+            delta = pd.read_csv(deltaFilePath, sep=';', decimal=',', dtype=dtypes).set_index(["rowId", "timeslot"])
+            delta = delta[~delta.index.duplicated(keep="last")]
+            state.loc[delta.index, delta.columns] = delta
+        self.stateTable = state.sort_index()
+        # the ingested flows are part of the saved table, not of the traffic data file
+        flows = self.stateTable["flow"].unstack("timeslot")
+        self.trafficData.loc[flows.index, flows.columns] = flows
+        if os.path.isfile(deltaFilePath):
+            self.saveStateTable(inputDataPath)
+        return True
 
     def saveTrafficData(self, outputDataPath: str):
     # TODO: set a name convention for saving new model data (e.g. greenshield_01-02-2024_00:00-23:00)
@@ -13,6 +13,25 @@ DEVICE_DATA_MODEL_CTX= "https://raw.githubusercontent.com/smart-data-models/data
 ROAD_SEGMENT_DATA_MODEL_TYPE= "https://smartdatamodels.org/dataModel.Transportation/RoadSegment"
 ROAD_DATA_MODEL_TYPE= "https://smartdatamodels.org/dataModel.Transportation/Road"
 TRAFFIC_FLOW_OBSERVED_DATA_MODEL_TYPE = "https://smartdatamodels.org/dataModel.Transportation/TrafficFlowObserved"
+# local copies of the JSON-LD contexts, served by the ContextServer stand-in when the deployment has no internet access
+JSONLD_CONTEXTS_PATH = projectPath + "/data/contexts"
+JSONLD_CONTEXT_SERVER_PORT = 8099
+# base URL under which the Context Broker reaches the ContextServer (e.g. http://host.docker.internal:8099). If not
+# set, entities keep referencing the remote context URLs.
+JSONLD_CONTEXT_SERVER_URL = os.environ.get("JSONLD_CONTEXT_SERVER_URL")
+# MongoDB instance and database in which Orion-LD stores the entities of the openiot tenant
+ORION_MONGO_CONNECTION_STRING = "mongodb://localhost:27017/"
+ORION_ENTITIES_DB_NAME = "orion-openiot"
+# subscription profile (see SubscriptionManager.SUBSCRIPTION_PROFILES) used to notify QuantumLeap: "live", "replay" or
+# "replay-batched"
+QUANTUMLEAP_SUBSCRIPTION_PROFILE = os.environ.get("QUANTUMLEAP_SUBSCRIPTION_PROFILE", "live")
+# port of the QuantumLeapStandIn, used to measure the notification throughput without QuantumLeap and TimescaleDB
+QUANTUMLEAP_STANDIN_PORT = 8669
+# host name under which the Context Broker reaches the QuantumLeapStandIn (e.g. host.docker.internal). If set, the
+# subscriptions notify the stand-in instead of QuantumLeap.
+QUANTUMLEAP_STANDIN_HOST = os.environ.get("QUANTUMLEAP_STANDIN_HOST")
+# whether the outputs of the calibration runs are stored in the TimescaleDB (see DigitalTwinManager.storeSimulationResults)
+STORE_SIMULATION_RESULTS = os.environ.get("STORE_SIMULATION_RESULTS", "false").lower() in ("1", "true", "yes")
 
 
 # DATA RELATED CONSTANTS
@@ -38,11 +57,19 @@ STATISTICAL_AREAS_OPENDATA_FILE_PATH = REAL_WORLD_DATA_PATH + "/opendata/statist
 PROCESSED_DATA_PATH = projectPath + "/data/preprocessing/generated/"
 TRAFFIC_FLOW_ACCURATE_FILE_PATH = PROCESSED_DATA_PATH + "/accurate_traffic_flow.csv"
 PROCESSED_TRAFFIC_FLOW_EDGE_FILE_PATH = PROCESSED_DATA_PATH +"/processed_traffic_flow.csv"
+# date-partitioned (day=yyyy-mm-dd) parquet version of the processed traffic flow file
+PROCESSED_TRAFFIC_FLOW_DATASET_PATH = PROCESSED_DATA_PATH + "/processed_traffic_flow"
 ROAD_NAMES_FILE_PATH = PROCESSED_DATA_PATH + "/road_names.csv"
 EDGE_DATA_FILE_PATH = PROCESSED_DATA_PATH + "/edgedata.xml"
 FLOW_DATA_FILE_PATH = PROCESSED_DATA_PATH + "/flow.csv"
 MODEL_DATA_FILE_PATH = PROCESSED_DATA_PATH + "/model.csv"
+# edge x slot state table of the incremental macroscopic model fed by the IoT path (see TrafficModeler.ingestMeasurements),
+# saved as one file per date (see TrafficModeler.getStateFilePath)
+TRAFFIC_MODEL_STATE_FILE_PATH = PROCESSED_DATA_PATH + "/traffic_model_state.csv"
 DAILY_TRAFFIC_FLOW_FILE_PATH = PROCESSED_DATA_PATH + "/daily_flow.csv"
+# length, lanes, speed, priority and traffic light flag of each edge of the SUMO net (base name: one file is saved
+# for each net, see networkUtils.getEdgeAttributesFilePath)
+EDGE_ATTRIBUTES_FILE_PATH = PROCESSED_DATA_PATH + "/edge_attributes.csv"
 
 ## SUMO ENVIRONMENT RELATED CONSTANTS
 SUMO_PATH = projectPath + "/sumoenv"
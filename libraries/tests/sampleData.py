@@ -0,0 +1,31 @@
+# ****************************************************
+# Module Purpose:
+#   Small traffic datasets shared by the library tests: the processed traffic flow of two loops on two edges and the
+#   edge attribute table of those edges.
+#
+# ****************************************************
+import pandas as pd
+
+from libraries.classes.TrafficModeler import slotColumn
+
+SLOTS = [slotColumn(hour) for hour in range(24)]
+
+
+def buildTrafficData(date: str = "2024-02-01") -> pd.DataFrame:
+    """
+    Build the processed traffic flow of two loops on two edges, with a different flow in each slot.
+    """
+    rows = []
+    for loopId, edgeId, base in [(101, "e1", 10), (102, "e2", 100)]:
+        row = {"data": date, "ID_univoco_stazione_spira": loopId, "edge_id": edgeId}
+        row.update({slot: base + hour for hour, slot in enumerate(SLOTS)})
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def buildEdgeAttributes() -> pd.DataFrame:
+    """
+    Build the edge attribute table (see networkUtils.loadEdgeAttributes) of the edges used by the tests.
+    """
+    return pd.DataFrame({"length": [100.0, 200.0], "speed": [13.89, 27.78], "lanes": [1, 2]},
+                        index=pd.Index(["e1", "e2"], name="edge_id"))
@@ -0,0 +1,46 @@
+import asyncio
+import unittest
+
+import httpx
+from ngsildclient import Entity
+
+from libraries.classes.AsyncBroker import AsyncBroker, quoteQueryValue
+
+
+class AsyncBrokerTests(unittest.TestCase):
+    def setUp(self):
+        self.queries = []
+        self.broker = AsyncBroker(pn=1026, pnt=None, host="localhost", fiwareservice="openiot")
+
+    def runWithBroker(self, operation):
+        def handler(request: httpx.Request) -> httpx.Response:
+            self.queries.append(request.url.params.get("q"))
+            return httpx.Response(200, json=[])
+
+        async def run():
+            async with self.broker:
+                self.broker.client._transport = httpx.MockTransport(handler)
+                return await operation()
+        return asyncio.run(run())
+
+    def testQuoteQueryValue(self):
+        self.assertEqual(quoteQueryValue('Via "A"\\'), '"Via \\"A\\"\\\\"')
+
+    def testSearchEntityQuotesTheValue(self):
+        self.assertIsNone(self.runWithBroker(lambda: self.broker.searchEntity('Via "A"', "Road")))
+        self.assertEqual(self.queries, ['BolognaRoadName=="Via \\"A\\""'])
+
+    def testUpdateFlowsReturnsErrors(self):
+        outcomes, errors = self.runWithBroker(
+            lambda: self.broker.updateFlows([("e1", 3, "2024-02-01T08:00:00", "08:00-09:00")]))
+        self.assertEqual(outcomes, [False])
+        self.assertEqual(list(errors), ["e1"])
+
+    def testBuildFlowPatchKeepsTheEntity(self):
+        entity = Entity("RoadSegment", "urn:ngsi-ld:RoadSegment:1")
+        entity.prop("trafficFlow", 3).prop("timeslot", "08:00-09:00")
+        patch = self.broker.buildFlowPatch(entity, 5, "2024-02-01T09:00:00Z", "08:00-09:00")
+        self.assertEqual(sorted(patch), ["DateTime", "trafficFlow"])
+        self.assertEqual(patch["trafficFlow"]["value"], 5)
+        self.assertEqual(entity["trafficFlow"].value, 3)
+        self.assertNotIn("DateTime", entity.to_dict())
@@ -0,0 +1,35 @@
+import unittest
+import urllib.request
+from http.server import BaseHTTPRequestHandler
+
+from libraries.classes.BackgroundHTTPServer import BackgroundHTTPServer
+
+
+class PingServer(BackgroundHTTPServer):
+    def createHandler(self):
+        class PingRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(b"pong")
+
+            def log_message(self, format, *args):
+                pass
+
+        return PingRequestHandler
+
+
+class BackgroundHTTPServerTests(unittest.TestCase):
+    def testHandlerIsRequired(self):
+        with self.assertRaises(TypeError):
+            BackgroundHTTPServer("incomplete", "127.0.0.1", 0)
+
+    def testRestartAfterStop(self):
+        server = PingServer("ping", "127.0.0.1", 0)
+        for _ in range(2):
+            server.start()
+            port = server.server.server_port
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=5) as response:
+                self.assertEqual(response.read(), b"pong")
+            server.stop()
+            self.assertIsNone(server.thread)
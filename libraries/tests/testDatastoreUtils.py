@@ -0,0 +1,53 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import pandas as pd
+
+from libraries.utils.datastoreUtils import writePartitionedDataset, readPartitionedDataset, isPartitionedDataset, \
+    loadTrafficData
+from libraries.tests.sampleData import buildTrafficData
+
+
+class PartitionedDatasetTests(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.datasetPath = os.path.join(self.folder, "dataset")
+        df = pd.concat([buildTrafficData(date) for date in ["01/02/2024", "02/02/2024", "03/02/2024"]])
+        writePartitionedDataset(df, self.datasetPath)
+
+    def testPartitionDetection(self):
+        self.assertTrue(isPartitionedDataset(self.datasetPath))
+        self.assertFalse(isPartitionedDataset(self.folder))
+        self.assertFalse(isPartitionedDataset(os.path.join(self.folder, "missing.csv")))
+
+    def testSingleDayInEitherFormat(self):
+        for date in ["2024-02-02", "02/02/2024"]:
+            df = readPartitionedDataset(self.datasetPath, date=date)
+            self.assertEqual(len(df), 2)
+            self.assertTrue((df["data"] == pd.Timestamp("2024-02-02")).all())
+
+    def testDateRangeAndColumns(self):
+        df = readPartitionedDataset(self.datasetPath, startDate="2024-02-02", endDate="2024-02-03",
+                                    columns=["edge_id", "08:00-09:00"])
+        self.assertEqual(sorted(df.columns), ["08:00-09:00", "edge_id"])
+        self.assertEqual(len(df), 4)
+
+    def testListOfDays(self):
+        df = readPartitionedDataset(self.datasetPath, date=["2024-02-01", "2024-02-03"])
+        self.assertEqual(sorted(df["data"].dt.day.unique()), [1, 3])
+
+
+class CsvTrafficDataTests(unittest.TestCase):
+    def testExactDayInEitherFormat(self):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        trafficDataFile = os.path.join(folder, "traffic_flow.csv")
+        # days written in both formats are matched exactly, not as substrings of the column
+        pd.concat([buildTrafficData(date) for date in ["2024-02-01", "2024-02-10", "11/02/2024"]]) \
+            .to_csv(trafficDataFile, sep=';', index=False)
+        self.assertEqual(loadTrafficData(trafficDataFile, date="01/02/2024")["data"].tolist(), ["2024-02-01"] * 2)
+        self.assertEqual(loadTrafficData(trafficDataFile, date="2024-02-11")["data"].tolist(), ["11/02/2024"] * 2)
+        self.assertEqual(len(loadTrafficData(trafficDataFile)), 6)
@@ -0,0 +1,10 @@
+import unittest
+
+from libraries.utils.generalUtils import parseAddressList
+
+
+class ParseAddressListTests(unittest.TestCase):
+    def testDefaultPortAndEmptyEntries(self):
+        self.assertEqual(parseAddressList("replica1:5433, replica2,"), [("replica1", "5433"), ("replica2", "5432")])
+        self.assertEqual(parseAddressList(""), [])
+        self.assertEqual(parseAddressList(None), [])
@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from libraries.utils.preprocessingUtils import filterWithAccuracy, generateDetectorsCoordinatesFile, \
+    generateInductionLoopFile, linkEdgeId, parseGeoShape, generateFlow
+from libraries.tests.sampleData import SLOTS, buildTrafficData
+
+
+class FilterWithAccuracyTests(unittest.TestCase):
+    def testFilterWithAccuracyMatchesLegacy(self):
+        measurements = pd.DataFrame({"data": ["01/02/2024", "01/02/2024", "02/02/2024", "02/02/2024"],
+                                     "codice_spira": ["1.1", "2.2", "1.1", "2.2"], "flow": [1, 2, 3, 4]})
+        accuracy = pd.DataFrame({"data": ["01/02/2024", "01/02/2024", "02/02/2024", "02/02/2024"],
+                                 "codice_spira": ["1.1", "2.2", "1.1", "2.2"],
+                                 "00:00-01:00": ["100%", "94%", "95%", "100%"],
+                                 "01:00-02:00": ["98%", "100%", "96%", np.nan]})
+        # previous implementation: one filter per percentage column, then a (date, sensor) index lookup
+        legacyAccuracy = accuracy.copy()
+        for column in legacyAccuracy.columns[2:]:
+            legacyAccuracy = legacyAccuracy.dropna(subset=[column])
+            legacyAccuracy[column] = legacyAccuracy[column].str.replace('%', '').astype(int)
+            legacyAccuracy = legacyAccuracy[legacyAccuracy[column] >= 95]
+        keys = ["data", "codice_spira"]
+        legacy = measurements[measurements.set_index(keys).index.isin(legacyAccuracy.set_index(keys).index)]
+
+        filtered = filterWithAccuracy(measurements, accuracy, "data", "codice_spira", None, 95)
+        pd.testing.assert_frame_equal(filtered, legacy)
+        self.assertEqual(filtered["flow"].tolist(), [1, 3])
+
+
+class TrafficLoopFileTests(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        patcher = mock.patch("libraries.utils.preprocessingUtils.MVENV_DATA_PATH", self.folder)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # loop 1 is measured twice on the same geopoint, loops 2 and 3 share a geopoint on two roads
+        self.measurements = pd.DataFrame({"Nome via": ["A", "A", "B", "C"],
+                                          "ID_univoco_stazione_spira": [1, 1, 2, 3],
+                                          "geopoint": ["44.5,11.3", "44.5,11.3", "44.6,11.4", "44.6,11.4"]})
+
+    def testDetectorCoordinatesOfEachGeopoint(self):
+        outputFile = os.path.join(self.folder, "detectors.csv")
+        generateDetectorsCoordinatesFile(self.measurements, outputFile)
+        detectors = pd.read_csv(outputFile, sep=';')
+        self.assertEqual(detectors.to_dict(orient="list"), {"id": [1, 2], "lat": [44.5, 44.6], "lon": [11.3, 11.4]})
+
+    def testInductionLoopOfEachRoadLoopAndGeopoint(self):
+        outputFile = os.path.join(self.folder, "inductionLoops.csv")
+        generateInductionLoopFile(self.measurements, outputFile)
+        loops = pd.read_csv(outputFile, sep=';')
+        self.assertEqual(loops["id"].tolist(), [1, 2, 3])
+        self.assertEqual(loops["roadname"].tolist(), ["A", "B", "C"])
+        self.assertEqual(loops["lat"].tolist(), [44.5, 44.6, 44.6])
+
+
+class GenerateFlowTests(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.inputFile = os.path.join(self.folder, "processed_traffic_flow.csv")
+        buildTrafficData().to_csv(self.inputFile, sep=';', index=False)
+        self.outputFile = os.path.join(self.folder, "flow.csv")
+        # state table with a different velocity for each edge and slot
+        self.stateTable = pd.DataFrame([{"edge_id": edgeId, "timeslot": slot, "velocity": base + hour}
+                                        for edgeId, base in [("e1", 10.0), ("e2", 50.0)]
+                                        for hour, slot in enumerate(SLOTS)])
+
+    def testVelocityOfTheRequestedSlot(self):
+        flow = generateFlow(self.inputFile, self.stateTable, self.outputFile, "2024-02-01", timeSlot="08:00-09:00")
+        self.assertEqual(flow["qPKW"].tolist(), [18, 108])
+        self.assertEqual(flow["vPKW"].tolist(), [18.0 * 3.6, 58.0 * 3.6])
+        self.assertEqual(flow["Time"].tolist(), [60, 60])
+
+    def testMultipleHourSlotAveragesVelocities(self):
+        flow = generateFlow(self.inputFile, self.stateTable, self.outputFile, "2024-02-01", timeSlot="08:00-10:00")
+        self.assertEqual(flow["qPKW"].tolist(), [18 + 19, 108 + 109])
+        self.assertEqual(flow["vPKW"].tolist(), [18.5 * 3.6, 58.5 * 3.6])
+
+    def testWholeDay(self):
+        flow = generateFlow(self.inputFile, self.stateTable, self.outputFile, "2024-02-01")
+        self.assertEqual(len(flow), 48)
+        lastSlot = flow[flow["Time"] == 24 * 60]
+        self.assertEqual(lastSlot["vPKW"].tolist(), [33.0 * 3.6, 73.0 * 3.6])
+
+    def testDetectorsOfMissingEdgesAreSkipped(self):
+        model = self.stateTable[self.stateTable["edge_id"] == "e1"]
+        flow = generateFlow(self.inputFile, model, self.outputFile, "2024-02-01", timeSlot="08:00-09:00")
+        self.assertEqual(flow["Detector"].tolist(), [101])
+        self.assertEqual(flow["vPKW"].tolist(), [18.0 * 3.6])
+
+
+class LinkEdgeIdTests(unittest.TestCase):
+    def testLinkEdgeIdKeepsMatchedRowsOnce(self):
+        measurements = pd.DataFrame({"Nome via": ["A", "A", "B", "C"], "geopoint": ["1,1", "2,2", "3,3", "4,4"],
+                                     "flow": [1, 2, 3, 4]})
+        roadNames = pd.DataFrame({"Nome via": ["A", "A", "A", "B"], "geopoint": ["1,1", "1,1", "2,2", "3,3"],
+                                  "edge_id": ["e1", "e9", "e2", "e3"]})
+        linked = linkEdgeId(measurements, roadNames, None)
+        self.assertEqual(linked["flow"].tolist(), [1, 2, 3])
+        self.assertEqual(linked["edge_id"].tolist(), ["e1", "e2", "e3"])
+
+
+class GeoShapeTests(unittest.TestCase):
+    def testJsonAndLegacyLiteral(self):
+        geoJson = '{"type": "Polygon", "coordinates": [[[11.3, 44.5], [11.4, 44.5], [11.4, 44.6], [11.3, 44.5]]]}'
+        self.assertTrue(parseGeoShape(geoJson).equals(parseGeoShape(geoJson.replace('"', "'"))))
+
+    def testInvalidShape(self):
+        for geoShape in ['{"type": "LineString", "coordinates": [[11.3, 44.5], [11.4, 44.5]]}', "not a shape"]:
+            with self.assertRaises(ValueError):
+                parseGeoShape(geoShape)
@@ -0,0 +1,80 @@
+import unittest
+from unittest import mock
+
+from libraries.classes.SubscriptionManager import QuantumLeapManager
+
+
+def buildClient(subscriptions: list) -> mock.Mock:
+    """
+    Build an NGSI-LD client whose Context Broker keeps the given subscriptions in memory, listing them in pages.
+    """
+    def getPage(url, params=None, headers=None):
+        page = subscriptions[params["offset"]:params["offset"] + params["limit"]]
+        return mock.Mock(status_code=200, json=mock.Mock(return_value=page))
+
+    def delete(url):
+        subscriptions[:] = [item for item in subscriptions if item["id"] != url.rsplit("/", 1)[-1]]
+        return mock.Mock(status_code=204)
+
+    def create(subscription, raise_on_conflict=True):
+        subscriptionId = f"urn:ngsi-ld:Subscription:new{len(subscriptions)}"
+        subscriptions.append({**subscription, "id": subscriptionId})
+        return subscriptionId
+
+    client = mock.Mock()
+    client.subscriptions.url = "http://orion:1026/ngsi-ld/v1/subscriptions"
+    client.subscriptions.create.side_effect = create
+    client.session.get.side_effect = getPage
+    client.session.delete.side_effect = delete
+    return client
+
+
+class SubscriptionTests(unittest.TestCase):
+    def setUp(self):
+        self.manager = QuantumLeapManager(containerName="quantumleap", cbPort=1026, quantumleapPort=8668)
+        self.subscription = self.manager.buildSubscription(["road segment"], ["trafficFlow"], "test")
+
+    def testKeyIgnoresContextExpansion(self):
+        expanded = {"entities": [{"type": "https://smartdatamodels.org/dataModel.Transportation/RoadSegment"}],
+                    "watchedAttributes": ["https://uri.etsi.org/ngsi-ld/default-context/trafficFlow"],
+                    "notification": {"endpoint": {"uri": self.manager.getNotificationUrl()}}}
+        self.assertEqual(self.manager.getSubscriptionKey(expanded), self.manager.getSubscriptionKey(self.subscription))
+
+    def testEnsureSubscriptionIsIdempotent(self):
+        stored = []
+        client = buildClient(stored)
+        firstId = self.manager.ensureSubscription(client, self.subscription)
+        secondId = self.manager.ensureSubscription(client, self.subscription)
+        self.assertEqual(firstId, secondId)
+        self.assertEqual(len(stored), 1)
+
+    def testEnsureSubscriptionReplacesOutdatedAndDuplicates(self):
+        outdated = {**self.subscription, "throttling": 5, "id": "urn:ngsi-ld:Subscription:old"}
+        stored = [outdated, {**outdated, "id": "urn:ngsi-ld:Subscription:copy"}]
+        subscriptionId = self.manager.ensureSubscription(buildClient(stored), self.subscription)
+        self.assertEqual([item["id"] for item in stored], [subscriptionId])
+        self.assertNotIn("throttling", stored[0])
+
+    def testListingFollowsPages(self):
+        stored = [{**self.subscription, "id": f"urn:ngsi-ld:Subscription:{index}"} for index in range(5)]
+        client = buildClient(stored)
+        self.assertEqual(len(self.manager.listSubscriptions(client, pageSize=2)), 5)
+        self.assertEqual(client.session.get.call_count, 3)
+
+    def testOnlyOwnedSubscriptionsAreRemoved(self):
+        foreign = {**self.subscription, "description": "other tool", "throttling": 5,
+                   "id": "urn:ngsi-ld:Subscription:foreign"}
+        stale = {**self.manager.buildSubscription(["device"], ["trafficFlow"], "previous run"),
+                 "id": "urn:ngsi-ld:Subscription:stale"}
+        stored = [foreign, stale]
+        client = buildClient(stored)
+        self.manager.createProfileSubscriptions(client, profile="live", entityTypes=["road segment"])
+        self.assertEqual(self.manager.removeStaleSubscriptions(client), 1)
+        self.assertIn(foreign, stored)
+        self.assertNotIn(stale, stored)
+
+    def testProfileTimeIntervalOverride(self):
+        stored = []
+        self.manager.createProfileSubscriptions(buildClient(stored), profile="replay", timeInterval=60)
+        self.assertEqual(stored[0]["timeInterval"], 60)
+        self.assertNotIn("watchedAttributes", stored[0])
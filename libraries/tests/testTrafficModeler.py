@@ -0,0 +1,83 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from libraries.classes.TrafficModeler import TrafficModeler, getStateFilePath
+from libraries.tests.sampleData import buildTrafficData, buildEdgeAttributes
+
+
+class IncrementalTrafficModelerTests(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.trafficDataFile = os.path.join(self.folder, "processed_traffic_flow.csv")
+        buildTrafficData().to_csv(self.trafficDataFile, sep=';', index=False)
+        self.stateFilePath = os.path.join(self.folder, "traffic_model_state.csv")
+        for patcher in [mock.patch("libraries.classes.TrafficModeler.loadEdgeAttributes",
+                                   return_value=buildEdgeAttributes()),
+                        mock.patch("libraries.classes.TrafficModeler.SUMO_PATH", self.folder)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.modeler = self.createModeler()
+
+    def createModeler(self, **kwargs) -> TrafficModeler:
+        arguments = dict(simulator=None, trafficDataFile=self.trafficDataFile, sumoNetFile="test.net.xml",
+                         date="2024-02-01", timeSlot="08:00-09:00", incremental=True, stateFilePath=self.stateFilePath)
+        arguments.update(kwargs)
+        return TrafficModeler(**arguments)
+
+    def testStateSlotMatchesFullModel(self):
+        fullModel = self.createModeler(incremental=False, stateFilePath=None)
+        pd.testing.assert_frame_equal(pd.DataFrame(self.modeler.macroscopicData),
+                                      pd.DataFrame(fullModel.macroscopicData))
+
+    def testIngestUpdatesOnlyChangedCells(self):
+        measurements = pd.DataFrame({"ID_univoco_stazione_spira": [101, 102], "timeslot": ["08:00-09:00"] * 2,
+                                     "flow": [50, 108], "data": ["2024-02-01"] * 2})
+        updated = self.modeler.ingestMeasurements(measurements)
+        self.assertEqual(len(updated), 1)
+        self.assertEqual(self.modeler.stateTable.loc[(0, "08:00-09:00"), "flow"], 50)
+        self.assertEqual(self.modeler.getStaleTimeslots(), ["08:00-09:00"])
+        self.assertEqual(self.modeler.staleArtefacts["08:00-09:00"], {"e1"})
+        self.assertEqual(pd.DataFrame(self.modeler.macroscopicData).loc[0, "flow"], "50")
+
+    def testIngestIgnoresOtherDatesAndUnchangedFlows(self):
+        measurements = pd.DataFrame({"ID_univoco_stazione_spira": [101, 102], "timeslot": ["09:00-10:00"] * 2,
+                                     "flow": [19, 500], "data": ["2024-02-01", "2024-02-02"]})
+        updated = self.modeler.ingestMeasurements(measurements)
+        self.assertTrue(updated.empty)
+        self.assertEqual(self.modeler.getStaleTimeslots(), [])
+
+    def testClearStaleTimeslot(self):
+        routeFolder = os.path.join(self.folder, "routes", "10-00-11-00")
+        os.makedirs(routeFolder)
+        self.modeler.ingestMeasurements(pd.DataFrame({"edge_id": ["e2"], "timeslot": ["10:00-11:00"], "flow": [1]}))
+        self.assertTrue(os.path.isfile(os.path.join(routeFolder, "STALE")))
+        self.modeler.clearStaleTimeslot("10:00-11:00")
+        self.assertEqual(self.modeler.getStaleTimeslots(), [])
+        self.assertFalse(os.path.isfile(os.path.join(routeFolder, "STALE")))
+
+    def testIngestedCellsSurviveReload(self):
+        self.modeler.ingestMeasurements(pd.DataFrame({"edge_id": ["e2"], "timeslot": ["08:00-09:00"], "flow": [7]}))
+        statePath = getStateFilePath(self.stateFilePath, "2024-02-01")
+        self.assertTrue(statePath.endswith("traffic_model_state_2024-02-01.csv"))
+        reloaded = self.createModeler()
+        self.assertEqual(reloaded.stateTable.loc[(1, "08:00-09:00"), "flow"], 7)
+        self.assertEqual(reloaded.trafficData.at[1, "08:00-09:00"], 7)
+        pd.testing.assert_frame_equal(reloaded.stateTable, self.modeler.stateTable, check_dtype=False)
+
+    def testStateOfChangedTrafficDataIsRebuilt(self):
+        self.modeler.ingestMeasurements(pd.DataFrame({"edge_id": ["e2"], "timeslot": ["08:00-09:00"], "flow": [7]}))
+        trafficData = buildTrafficData()
+        trafficData.loc[1, "08:00-09:00"] = 3000
+        trafficData.to_csv(self.trafficDataFile, sep=';', index=False)
+        rebuilt = self.createModeler()
+        self.assertEqual(rebuilt.stateTable.loc[(1, "08:00-09:00"), "flow"], 3000)
+
+    def testIncrementalModelRequiresDate(self):
+        with self.assertRaises(ValueError):
+            self.createModeler(date=None)
@@ -0,0 +1,104 @@
+import json
+import os
+from typing import Optional, Dict
+
+import requests
+
+from libraries.constants import TRANSPORTATION_DATA_MODEL_CTX, DEVICE_DATA_MODEL_CTX, JSONLD_CONTEXTS_PATH, \
+    JSONLD_CONTEXT_SERVER_URL
+
+# JSON-LD contexts used by the twin, mapped to the name of their local copy in JSONLD_CONTEXTS_PATH
+CONTEXT_REGISTRY = {
+    TRANSPORTATION_DATA_MODEL_CTX: "transportation.context.jsonld",
+    DEVICE_DATA_MODEL_CTX: "device.context.jsonld",
+}
+
+
+def getContextFilePath(contextUrl: str, contextsPath: str = JSONLD_CONTEXTS_PATH) -> str:
+    """
+    Get the path of the local copy of a registered JSON-LD context.
+
+    :param contextUrl: remote URL of the context, as listed in CONTEXT_REGISTRY
+    :param contextsPath: folder containing the local copies of the contexts
+    :return: the path of the local copy
+    :raises ValueError: if the context is not registered
+    """
+    if contextUrl not in CONTEXT_REGISTRY:
+        raise ValueError(f"JSON-LD context '{contextUrl}' is not registered. "
+                         f"Registered contexts: {list(CONTEXT_REGISTRY.keys())}")
+    return os.path.join(contextsPath, CONTEXT_REGISTRY[contextUrl])
+
+
+def readContextDocument(contextUrl: str, contextsPath: str = JSONLD_CONTEXTS_PATH) -> bytes:
+    """
+    Read the local copy of a registered JSON-LD context as it was downloaded from its remote URL.
+
+    :param contextUrl: remote URL of the context, as listed in CONTEXT_REGISTRY
+    :param contextsPath: folder containing the local copies of the contexts
+    :return: the bytes of the context document
+    :raises ValueError: if the context is not registered or its local copy is missing
+    """
+    contextFilePath = getContextFilePath(contextUrl, contextsPath)
+    if not os.path.isfile(contextFilePath):
+        raise ValueError(f"Missing local copy of the JSON-LD context '{contextUrl}'. Download the contexts with "
+                         f"'python -m libraries.utils.contextUtils' on a machine with internet access.")
+    with open(contextFilePath, 'rb') as file:
+        return file.read()
+
+
+def resolveContextUrl(contextUrl: str, serverUrl: Optional[str] = JSONLD_CONTEXT_SERVER_URL) -> str:
+    """
+    Get the URL to be used for a JSON-LD context in entities, queries and Link headers. When a local context server
+    is configured, registered contexts are referenced through it, so that the Context Broker never fetches them from
+    the internet; otherwise the remote URL is kept.
+
+    :param contextUrl: remote URL of the context
+    :param serverUrl: base URL of the local context server (see ContextServer), or None
+    :return: the URL of the context to be used
+    """
+    if serverUrl is None or contextUrl not in CONTEXT_REGISTRY:
+        return contextUrl
+    return f"{serverUrl.rstrip('/')}/{CONTEXT_REGISTRY[contextUrl]}"
+
+
+def refreshContexts(contextsPath: str = JSONLD_CONTEXTS_PATH, timeout: float = 10.0,
+                    missingOnly: bool = False) -> Dict[str, bool]:
+    """
+    Download the registered contexts from their remote URLs and save them unmodified as local copies, so that the
+    terms expand to the same IRIs offline and online. To be run once when the machine has internet access, before
+    deploying the twin offline (the ContextServer does not start without the local copies).
+
+    :param contextsPath: folder containing the local copies of the contexts
+    :param timeout: timeout (s) of each download
+    :param missingOnly: if True, only the contexts without a local copy are downloaded (fetch-once); otherwise the
+        existing copies are replaced as well
+    :return: for each registered context, True if its local copy is available
+    """
+    os.makedirs(contextsPath, exist_ok=True)
+    refreshed = {}
+    for contextUrl in CONTEXT_REGISTRY:
+        if missingOnly and os.path.isfile(getContextFilePath(contextUrl, contextsPath)):
+            refreshed[contextUrl] = True
+            continue
+        try:
+            response = requests.get(contextUrl, timeout=timeout)
+            response.raise_for_status()
+            # the document is only parsed to make sure it is valid JSON, the downloaded bytes are saved as they are
+            json.loads(response.content)
+        except (requests.RequestException, ValueError) as e:
+            print(f"Unable to download context '{contextUrl}': {e}")
+            refreshed[contextUrl] = False
+            continue
+        with open(getContextFilePath(contextUrl, contextsPath), 'wb') as file:
+            file.write(response.content)
+        refreshed[contextUrl] = True
+    return refreshed
+
+
+if __name__ == "__main__":
+    # python -m libraries.utils.contextUtils [--refresh]: fetches the missing local copies (all of them with
+    # --refresh) and prints the URLs to be configured for each context, e.g. IOTA_JSON_LD_CONTEXT in fiwareenv/.env
+    import sys
+    print(refreshContexts(missingOnly="--refresh" not in sys.argv[1:]))
+    for registeredUrl in CONTEXT_REGISTRY:
+        print(f"{registeredUrl} -> {resolveContextUrl(registeredUrl)}")
@@ -0,0 +1,153 @@
+import os
+from datetime import datetime, date as dateType
+from typing import Optional, List, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+# Name of the hive partition key (day=yyyy-mm-dd) used by the date-partitioned traffic datasets
+PARTITION_COLUMN = "day"
+# Hourly measurement columns of the traffic loop datasets (00:00-01:00 ... 23:00-24:00)
+TIME_SLOT_COLUMNS = [f"{hour:02d}:00-{hour + 1:02d}:00" for hour in range(24)]
+# Accepted formats of the dates given as filters or found in the 'data' column
+DATE_FORMATS = ['%Y-%m-%d', '%d/%m/%Y']
+
+
+def normalizeDate(date: Union[str, datetime, dateType]) -> str:
+    """
+    Convert a date into the 'yyyy-mm-dd' format used as partition key.
+
+    :param date: date given as a datetime object or as a string formatted as 'yyyy-mm-dd' or 'dd/mm/yyyy'
+    :return: the date formatted as 'yyyy-mm-dd'
+    :raises ValueError: if the date does not match any of the supported formats
+    """
+    if isinstance(date, (datetime, dateType)):
+        return date.strftime('%Y-%m-%d')
+    for dateFormat in DATE_FORMATS:
+        try:
+            return datetime.strptime(date, dateFormat).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    raise ValueError(f"Date '{date}' does not match any of the supported formats {DATE_FORMATS}")
+
+
+def parseDates(dates: pd.Series) -> pd.Series:
+    """
+    Parse a column of dates formatted as 'yyyy-mm-dd' or 'dd/mm/yyyy' (also mixed).
+
+    :param dates: column of date strings
+    :return: the column parsed as datetime
+    :raises ValueError: if some dates do not match any of the supported formats
+    """
+    parsed = pd.to_datetime(dates, format=DATE_FORMATS[0], errors='coerce')
+    if parsed.isna().any():
+        parsed = parsed.fillna(pd.to_datetime(dates, format=DATE_FORMATS[1], errors='coerce'))
+    if parsed.isna().any():
+        raise ValueError(f"Column '{dates.name}' contains dates that do not match the supported formats {DATE_FORMATS}")
+    return parsed
+
+
+def isPartitionedDataset(path: str) -> bool:
+    """
+    Check if the given path is a date-partitioned dataset rather than a single .csv file, i.e. a folder containing at
+    least one partition folder (day=yyyy-mm-dd) written by writePartitionedDataset.
+    """
+    if not os.path.isdir(path):
+        return False
+    prefix = PARTITION_COLUMN + "="
+    return any(entry.is_dir() and entry.name.startswith(prefix) for entry in os.scandir(path))
+
+
+def writePartitionedDataset(df: pd.DataFrame, datasetPath: str, dateColumn: str = "data",
+                            dateFormat: Optional[str] = None, overwrite: bool = True):
+    """
+    Write a traffic measurement dataframe as a date-partitioned parquet dataset. The date column is parsed into a
+    date type, the hourly slot columns are converted into numeric columns and each day is saved into its own
+    partition folder (e.g. datasetPath/day=2024-02-01/), so that readers can load a single day or a range of days
+    without scanning the whole year.
+
+    :param df: dataframe containing the traffic measurements
+    :param datasetPath: folder in which the dataset is written
+    :param dateColumn: name of the column containing the measurement date
+    :param dateFormat: format of the date column. If None, 'yyyy-mm-dd' and 'dd/mm/yyyy' are tried in this order
+    :param overwrite: if True, partitions already present for the written days are replaced
+    """
+    df = df.copy()
+    if dateFormat is not None:
+        df[dateColumn] = pd.to_datetime(df[dateColumn], format=dateFormat)
+    elif not pd.api.types.is_datetime64_any_dtype(df[dateColumn]):
+        df[dateColumn] = parseDates(df[dateColumn])
+    df[dateColumn] = df[dateColumn].dt.date
+    slotColumns = [column for column in TIME_SLOT_COLUMNS if column in df.columns]
+    df[slotColumns] = df[slotColumns].apply(pd.to_numeric, errors='coerce')
+    df[PARTITION_COLUMN] = df[dateColumn].astype(str)
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    os.makedirs(datasetPath, exist_ok=True)
+    ds.write_dataset(table, datasetPath, format="parquet",
+                     partitioning=ds.partitioning(pa.schema([(PARTITION_COLUMN, pa.string())]), flavor="hive"),
+                     existing_data_behavior="delete_matching" if overwrite else "overwrite_or_ignore")
+    print(f"Date-partitioned dataset with {df[PARTITION_COLUMN].nunique()} days saved at '{datasetPath}'")
+
+
+def readPartitionedDataset(datasetPath: str, date: Optional[Union[str, List[str]]] = None,
+                           startDate: Optional[str] = None, endDate: Optional[str] = None,
+                           columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Read a date-partitioned dataset, loading only the partitions of the requested days and only the requested
+    columns.
+
+    :param datasetPath: folder of the dataset
+    :param date: a single day (or a list of days) to be read
+    :param startDate: first day of the range to be read (included)
+    :param endDate: last day of the range to be read (included)
+    :param columns: columns to be read. If None, all the columns are read
+    :return: a dataframe with the selected rows and columns, with the 'data' column parsed as datetime
+    """
+    dataset = ds.dataset(datasetPath, format="parquet", partitioning="hive")
+    partition = ds.field(PARTITION_COLUMN)
+    filterExpression = None
+    if date is not None:
+        days = [date] if isinstance(date, (str, datetime, dateType)) else date
+        filterExpression = partition.isin([normalizeDate(day) for day in days])
+    if startDate is not None:
+        expression = partition >= normalizeDate(startDate)
+        filterExpression = expression if filterExpression is None else filterExpression & expression
+    if endDate is not None:
+        expression = partition <= normalizeDate(endDate)
+        filterExpression = expression if filterExpression is None else filterExpression & expression
+    if columns is not None:
+        columns = [column for column in columns if column != PARTITION_COLUMN]
+    table = dataset.to_table(columns=columns, filter=filterExpression)
+    df = table.to_pandas()
+    df = df.drop(columns=[PARTITION_COLUMN], errors='ignore')
+    if "data" in df.columns:
+        df["data"] = pd.to_datetime(df["data"])
+    return df
+
+
+def loadTrafficData(inputPath: str, date: Optional[str] = None, startDate: Optional[str] = None,
+                    endDate: Optional[str] = None, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Load traffic measurements from either a date-partitioned dataset or a .csv file. On datasets, the date filters
+    are applied through partition pruning; on .csv files the legacy full read is kept, keeping the rows whose 'data'
+    column is the same day (in either supported format).
+
+    :param inputPath: path of the dataset folder or of the .csv file
+    :param date: day to be loaded
+    :param startDate: first day of the range to be loaded (datasets only)
+    :param endDate: last day of the range to be loaded (datasets only)
+    :param columns: columns to be loaded
+    :return: a dataframe with the selected measurements
+    """
+    if isPartitionedDataset(inputPath):
+        return readPartitionedDataset(inputPath, date=date, startDate=startDate, endDate=endDate, columns=columns)
+    if os.path.isdir(inputPath):
+        raise ValueError(f"'{inputPath}' is a folder without {PARTITION_COLUMN}= partitions, not a traffic dataset")
+    if columns is not None and date is not None and 'data' not in columns:
+        columns = columns + ['data']
+    df = pd.read_csv(inputPath, sep=';', usecols=columns)
+    if date is not None:
+        df = df[parseDates(df['data']) == pd.Timestamp(normalizeDate(date))]
+    return df
@@ -6,10 +6,12 @@ import time
 from datetime import datetime, timedelta
 import random
 
+from typing import Optional
+
 from bson import ObjectId
-from pymongo import MongoClient
 
 from libraries.classes.TrafficModeler import TrafficModeler
+from libraries.classes.EntityResolver import EntityResolver
 from libraries.constants import SUMO_PATH, SUMO_NET_PATH, PROCESSED_TRAFFIC_FLOW_EDGE_FILE_PATH
 from libraries.classes.SumoSimulator import Simulator
 
@@ -61,6 +63,22 @@ def loadEnvVar(file_path):
                 env_vars[key.strip()] = value.strip()  # removing leading or trailing spaces
     return env_vars
 
+def parseAddressList(value: str, defaultPort: str = "5432"):
+    """
+    Parse a comma separated list of "host:port" addresses (e.g. the TIMESCALE_DB_REPLICAS variable).
+
+    :param value: the list of addresses; empty or missing values give an empty list.
+    :param defaultPort: the port of the addresses without one.
+    :return: a list of (host, port) tuples.
+    """
+    addresses = []
+    for address in (value or "").split(","):
+        address = address.strip()
+        if address:
+            host, _, port = address.partition(":")
+            addresses.append((host, port or defaultPort))
+    return addresses
+
 # function to calculate difference between actual and previous date time of dataset entries to properly simulate devices
 def convert_float(inp):
     splitted_data = inp.split(",")
@@ -68,11 +86,30 @@ def convert_float(inp):
 
 
 # COMMENTED PARTS ARE FOR TIME ESTIMATION PURPOSES
-def processingTlData(timeSlot, trafficData, roads: dict):
+def processingTlData(timeSlot, trafficData, roads: dict, resolver: Optional[EntityResolver] = None,
+                     modeler: Optional[TrafficModeler] = None):
+    """
+    Send the traffic loop measurements of a time slot to the IoT Agent.
+
+    :param timeSlot: Time slot of the measurements (e.g. "08:00-09:00").
+    :param trafficData: Measurements of the slot, one row for each traffic loop.
+    :param roads: Roads of the physical system, by road name.
+    :param resolver: Optional EntityResolver. If given, the Device entities of all the loops of the slot are fetched
+        with a single query before sending the measurements (debug lookup, e.g. to read their modDate); otherwise
+        MongoDB is not accessed at all.
+    :param modeler: Optional TrafficModeler created with incremental=True. If given, the measurements sent are also
+        ingested into its state table, marking as stale the routes and simulations of the changed edges.
+    """
     timestamps = []
-    client = MongoClient("mongodb://localhost:27017/")
-    db = client["orion-openiot"]
-    collection = db["entities"]
+    entries = {}
+    sentMeasurements = []
+    if resolver is not None:
+        partialIDs = []
+        for roadName, loop in zip(trafficData["road_name"], trafficData["ID_loop"]):
+            sensor = roads[roadName].getSensor("TL{}".format(str(loop))) if roadName in roads else None
+            if sensor is not None:
+                partialIDs.append(sensor.devicePartialID)
+        entries = resolver.prefetchDevices(partialIDs)
     for index, row in trafficData.iterrows():
         trafficFlow = row["flow"]
         raw_coordinates = row["geopoint"]
@@ -85,8 +122,7 @@ def processingTlData(timeSlot, trafficData, roads: dict):
         if roadName in roads:
             trafficLoopIdentifier= "TL{}".format(str(row["ID_loop"]))
             trafficLoopSensor = roads[roadName].getSensor(trafficLoopIdentifier)
-            partial_id = trafficLoopSensor.devicePartialID
-            entry = collection.find_one({"_id.id": {"$regex": partial_id}})
+            entry = entries.get(trafficLoopSensor.devicePartialID) if trafficLoopSensor is not None else None
             # if index == len(trafficData) - 1:
             #     old_mod_date = entry["modDate"] if entry else None
 
@@ -105,6 +141,8 @@ def processingTlData(timeSlot, trafficData, roads: dict):
                 trafficLoopSensor.sendData(date, timeSlot, trafficFlow, coordinates, direction,
                                            device_id=trafficLoopSensor.devicePartialID,
                                            device_key=trafficLoopSensor.apiKey)
+                sentMeasurements.append({"ID_univoco_stazione_spira": row["ID_loop"], "timeslot": timeSlot,
+                                         "flow": trafficFlow, "data": date})
                 # end_time = time.time_ns()
                 # if index == len(trafficData) - 1:
                 #     new_mod_date = wait_for_mod_date_change(entry_id=partial_id, old_mod_date=old_mod_date)
@@ -115,6 +153,9 @@ def processingTlData(timeSlot, trafficData, roads: dict):
                 # else:
                 #     timestamps.append({"evento": "Sending Data", "Sensor TL": str(trafficLoopSensor.devicePartialID),"start_timestamp": start_time, "end_timestamp": end_time,
                 #                     "elapsed_time": end_time-start_time})
+    if modeler is not None and sentMeasurements:
+        modeler.ingestMeasurements(pd.DataFrame(sentMeasurements).dropna(subset=["flow"]))
+        print(f"Slots to be simulated again: {modeler.getStaleTimeslots()}")
     # configurationPath = SUMO_PATH + "/standalone"
     # logFile = "./command_log.txt"
     # sumoSimulator = Simulator(configurationPath=configurationPath, logFile=logFile)
@@ -184,13 +225,26 @@ def convertDate(date: str, timeslot: str):
     return d
 
 # Funzione per attendere l'aggiornamento di modDate
-def wait_for_mod_date_change(entry_id, old_mod_date, timeout=60, interval=1):
-    client = MongoClient("mongodb://localhost:27017/")
-    db = client["orion-openiot"]
-    collection = db["entities"]
+def wait_for_mod_date_change(entry_id, old_mod_date, timeout=60, interval=1, resolver: Optional[EntityResolver] = None):
+    """
+    Wait until the modDate of the Device entity of a physical device changes, e.g. after a measurement has been sent.
+
+    The entity is matched exactly (urn:ngsi-ld:Device:<entry_id>, see EntityResolver.findDevice). Before, the id was
+    matched by an unanchored regular expression, which also matched the devices whose id only contains entry_id
+    (e.g. 12 matched urn:ngsi-ld:Device:123) and scanned the whole collection.
+
+    :param entry_id: The device identifier used with the IoT Agent.
+    :param old_mod_date: The modDate read before the measurement was sent.
+    :param timeout: Seconds after which old_mod_date is returned.
+    :param interval: Seconds between two lookups.
+    :param resolver: Optional EntityResolver, created on the default Orion-LD database if None.
+    :return: the new modDate, or old_mod_date on timeout.
+    """
+    if resolver is None:
+        resolver = EntityResolver()
     start_time = time.time()
     while time.time() - start_time < timeout:
-        entry = collection.find_one({"_id.id": {"$regex": entry_id}})
+        entry = resolver.findDevice(entry_id)
         new_mod_date = entry["modDate"] if entry else None
         if new_mod_date != old_mod_date:
             return new_mod_date
@@ -0,0 +1,124 @@
+import hashlib
+import os
+from functools import lru_cache
+from typing import Optional
+
+import pandas as pd
+import sumolib
+
+from libraries.constants import SUMO_NET_PATH, EDGE_ATTRIBUTES_FILE_PATH
+
+# Columns of the edge attribute table: length (m), number of lanes, maximum speed (m/s), priority and whether the edge
+# is controlled by a traffic light
+EDGE_ATTRIBUTE_COLUMNS = ['edge_id', 'length', 'lanes', 'speed', 'priority', 'tls']
+# Prefix of the first line of the edge attribute files, recording the network they were built from
+NET_SIGNATURE_PREFIX = "# net: "
+# Number of network versions kept in memory: older ones (e.g. replaced .net.xml files) are released
+NET_CACHE_SIZE = 2
+
+
+def getNetSignature(sumoNetFile: str) -> str:
+    """
+    Get the signature of a SUMO network file (absolute path, size and modification time), identifying the version
+    of the network the cached tables were built from.
+    """
+    stat = os.stat(sumoNetFile)
+    return f"{os.path.abspath(sumoNetFile)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+
+def getEdgeAttributesFilePath(sumoNetFile: str) -> str:
+    """
+    Get the default path of the edge attribute table of a SUMO network: one file for each network, named after the
+    network file and a hash of its path, next to EDGE_ATTRIBUTES_FILE_PATH.
+    """
+    netName = os.path.basename(sumoNetFile).split('.')[0]
+    pathHash = hashlib.sha1(os.path.abspath(sumoNetFile).encode("UTF-8")).hexdigest()[:10]
+    base, extension = os.path.splitext(EDGE_ATTRIBUTES_FILE_PATH)
+    return f"{base}_{netName}_{pathHash}{extension}"
+
+
+@lru_cache(maxsize=NET_CACHE_SIZE)
+def readSumoNet(sumoNetFile: str, netSignature: str):
+    return sumolib.net.readNet(sumoNetFile)
+
+
+def loadSumoNet(sumoNetFile: str):
+    """
+    Load a SUMO network with sumolib, keeping it in memory so that the functions working on the same network parse
+    the .net.xml file only once (again if the file changes). Only the last NET_CACHE_SIZE networks are kept.
+
+    :param sumoNetFile: Path to the SUMO network file.
+    :return: the sumolib network.
+    """
+    return readSumoNet(sumoNetFile, getNetSignature(sumoNetFile))
+
+
+def buildEdgeAttributeTable(sumoNetFile: str) -> pd.DataFrame:
+    """
+    Build the table of the edge attributes of a SUMO network, reading each edge only once.
+
+    :param sumoNetFile: Path to the SUMO network file.
+    :return: a DataFrame with one row for each edge and the columns in EDGE_ATTRIBUTE_COLUMNS.
+    """
+    net = loadSumoNet(sumoNetFile)
+    rows = [(edge.getID(), edge.getLength(), edge.getLaneNumber(), edge.getSpeed(), edge.getPriority(),
+             bool(edge.getTLS())) for edge in net.getEdges()]
+    return pd.DataFrame(rows, columns=EDGE_ATTRIBUTE_COLUMNS)
+
+
+def generateEdgeAttributesFile(sumoNetFile: str = SUMO_NET_PATH,
+                               edgeAttributesFilePath: Optional[str] = None) -> pd.DataFrame:
+    """
+    Build the edge attribute table of a SUMO network and save it into a .csv file. The first line of the file
+    records the signature of the network (see getNetSignature), checked when the table is loaded.
+
+    :param sumoNetFile: Path to the SUMO network file.
+    :param edgeAttributesFilePath: Path of the .csv file in which to save the table (by default, the file of the
+    network given by getEdgeAttributesFilePath).
+    :return: the edge attribute table.
+    """
+    edgeAttributesFilePath = edgeAttributesFilePath or getEdgeAttributesFilePath(sumoNetFile)
+    table = buildEdgeAttributeTable(sumoNetFile)
+    os.makedirs(os.path.dirname(edgeAttributesFilePath), exist_ok=True)
+    with open(edgeAttributesFilePath, 'w', encoding='UTF-8', newline='') as file:
+        file.write(NET_SIGNATURE_PREFIX + getNetSignature(sumoNetFile) + "\n")
+        table.to_csv(file, sep=';', index=False)
+    print(f"Edge attributes of {len(table)} edges saved at '{edgeAttributesFilePath}'")
+    return table
+
+
+def readEdgeAttributesFile(edgeAttributesFilePath: str, netSignature: str) -> Optional[pd.DataFrame]:
+    """
+    Read an edge attribute table saved by generateEdgeAttributesFile, or None if the file is missing or was built
+    from another network (or another version of it).
+    """
+    if not os.path.isfile(edgeAttributesFilePath):
+        return None
+    with open(edgeAttributesFilePath, encoding='UTF-8') as file:
+        if file.readline().rstrip("\n") != NET_SIGNATURE_PREFIX + netSignature:
+            return None
+        return pd.read_csv(file, sep=';', dtype={'edge_id': str})
+
+
+@lru_cache(maxsize=NET_CACHE_SIZE)
+def loadEdgeAttributeTable(sumoNetFile: str, edgeAttributesFilePath: str, netSignature: str) -> pd.DataFrame:
+    table = readEdgeAttributesFile(edgeAttributesFilePath, netSignature)
+    if table is None:
+        table = generateEdgeAttributesFile(sumoNetFile, edgeAttributesFilePath)
+    return table.set_index('edge_id')
+
+
+def loadEdgeAttributes(sumoNetFile: str = SUMO_NET_PATH,
+                       edgeAttributesFilePath: Optional[str] = None) -> pd.DataFrame:
+    """
+    Get the edge attribute table of a SUMO network, indexed by edge_id. The table saved in `edgeAttributesFilePath`
+    is used if it was built from the same version of the network; otherwise it is built from the network and saved,
+    so that the network is parsed only when it changes. Loaded tables are kept in memory until the network changes.
+
+    :param sumoNetFile: Path to the SUMO network file.
+    :param edgeAttributesFilePath: Path of the .csv file containing the edge attribute table (by default, the file
+    of the network given by getEdgeAttributesFilePath).
+    :return: the edge attribute table, indexed by edge_id. The returned table is shared: do not modify it.
+    """
+    edgeAttributesFilePath = edgeAttributesFilePath or getEdgeAttributesFilePath(sumoNetFile)
+    return loadEdgeAttributeTable(sumoNetFile, edgeAttributesFilePath, getNetSignature(sumoNetFile))
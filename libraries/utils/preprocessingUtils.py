@@ -2,149 +2,272 @@ import pandas as pd
 import geopandas as gpd
 import matplotlib.pyplot as plt
 from shapely.wkt import loads as load_wkt
-from shapely.geometry import Point, shape, Polygon, mapping
+from shapely.geometry import Point, shape, Polygon, mapping, LineString
+from shapely import STRtree
+import shapely
 from scipy.spatial import cKDTree
 import numpy as np
+import ast
 import csv
+import json
 import xml.etree.ElementTree as ET
-import sys
-import subprocess
 from datetime import datetime
 from libraries.constants import *
+from libraries.utils.datastoreUtils import loadTrafficData, readPartitionedDataset, writePartitionedDataset, \
+    isPartitionedDataset, normalizeDate
+from libraries.utils.networkUtils import loadSumoNet, loadEdgeAttributes, NET_CACHE_SIZE
+from libraries.classes.SumoToolPool import getSumoToolPool, SumoToolError
 import sumolib
 import os
+import shutil
+import tempfile
+from functools import lru_cache
+from typing import Optional, Union
 
 
+def loadInputData(source: Union[str, pd.DataFrame]) -> pd.DataFrame:
+    """
+    Get the data to be processed by a preprocessing step. Each step can be run either on a .csv file, as in the
+    file-based setup, or on a DataFrame produced by the previous step, so that the steps can be chained in memory
+    without writing intermediate files.
+
+    :param source: path of the .csv file (separated by ';') or DataFrame to be processed
+    :return: the DataFrame to be processed. DataFrames are returned as they are, without copying them
+    """
+    if isinstance(source, pd.DataFrame):
+        return source
+    return pd.read_csv(source, sep=';', encoding="UTF-8")
+
+
+def splitGeopoints(geopoints: pd.Series):
+    """
+    Split the 'latitude,longitude' geopoint strings into two arrays of floats.
+
+    :param geopoints: series of geopoints
+    :return: the latitudes and the longitudes
+    """
+    coordinates = geopoints.str.split(',', expand=True).reindex(columns=[0, 1]).astype(float)
+    return coordinates[0].to_numpy(), coordinates[1].to_numpy()
+
+def parseAccuracyKeys(df: pd.DataFrame, date_column: str, sensor_id_column: str, dateFormat: str = '%d/%m/%Y') -> pd.DataFrame:
+    """
+    Build the typed (date, sensor ID) keys used to join measurements and accuracy data: dates are parsed into
+    datetime values and sensor IDs are converted to strings, so that the join does not depend on how the two files
+    were read.
+
+    Args:
+        df (DataFrame): data containing the date and sensor ID columns.
+        date_column (str): Name of the date column.
+        sensor_id_column (str): Name of the sensor ID column.
+        dateFormat (str): Format of the date column, if it is not parsed yet.
+
+    Returns:
+        DataFrame: a frame with the same index of `df` and the typed keys in the columns `date_column` and
+        `sensor_id_column`.
+    """
+    dates = df[date_column]
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, format=dateFormat)
+    return pd.DataFrame({date_column: dates, sensor_id_column: df[sensor_id_column].astype(str)}, index=df.index)
+
+
+def loadAccurateKeys(file_accuracy: Union[str, pd.DataFrame], date_column: str, sensor_id_column: str,
+                     accepted_percentage: int, dateFormat: str = '%d/%m/%Y') -> pd.DataFrame:
+    """
+    Get the (date, sensor ID) pairs of the accuracy dataset whose accuracy percentages are all above
+    `accepted_percentage`. The percentage columns (all the columns after `date_column` and `sensor_id_column`) are
+    parsed into numeric values at once, without row or column loops on the single values.
+
+    Args:
+        file_accuracy (str | DataFrame): Path to the accuracy file or accuracy DataFrame.
+        date_column (str): Name of the date column.
+        sensor_id_column (str): Name of the sensor ID column.
+        accepted_percentage (int): Minimum accepted percentage of accuracy for filtering.
+        dateFormat (str): Format of the date column.
+
+    Returns:
+        DataFrame: the accepted pairs, with typed keys in the columns `date_column` and `sensor_id_column`.
+    """
+    df_accuracy = loadInputData(file_accuracy)
+
+    # Ignore the first two columns, assumed to be `date_column` and `sensor_id_column`, and parse the percentages
+    # (e.g. '98%'). Missing values become NaN and are never accepted
+    percentageColumns = df_accuracy.columns[2:]
+    percentages = df_accuracy[percentageColumns].apply(
+        lambda column: column.astype(str).str.rstrip('%').replace('nan', np.nan).astype(float))
+    # Keep the pairs whose accuracy is above `accepted_percentage` for all the time slots
+    accepted = (percentages >= accepted_percentage).all(axis=1)
+
+    keys = parseAccuracyKeys(df_accuracy[accepted], date_column, sensor_id_column, dateFormat=dateFormat)
+    return keys.drop_duplicates().reset_index(drop=True)
 
-def filterWithAccuracy(file_input: str, file_accuracy: str,date_column: str,sensor_id_column: str, output_file: str,  accepted_percentage: int):
+
+def filterWithAccuracy(file_input: Union[str, pd.DataFrame], file_accuracy: Union[str, pd.DataFrame], date_column: str,
+                       sensor_id_column: str, output_file: Optional[str], accepted_percentage: int,
+                       accurateKeys: Optional[pd.DataFrame] = None, chunkSize: Optional[int] = None,
+                       dateFormat: str = '%d/%m/%Y') -> Optional[pd.DataFrame]:
     """
     Filter the traffic loop dataset using accuracy information.
 
     This function filters `file_input` (a traffic loop dataset) using `file_accuracy` (an accuracy dataset).
     Both files must contain columns for date and sensor ID to ensure proper filtering.
-    Measurements with accuracy percentages below `accepted_percentage` are excluded.
+    Measurements with accuracy percentages below `accepted_percentage` are excluded. The filtering is an inner
+    merge on typed (date, sensor ID) keys.
 
     Args:
-        file_input (str): Path to the input file (traffic loop dataset).
-        file_accuracy (str): Path to the accuracy file.
+        file_input (str | DataFrame): Path to the input file (traffic loop dataset) or input DataFrame.
+        file_accuracy (str | DataFrame): Path to the accuracy file or accuracy DataFrame.
         date_column (str): Name of the date column in both files.
         sensor_id_column (str): Name of the sensor ID column in both files.
-        output_file (str): Path for the output filtered file.
+        output_file (str): Path for the output filtered file. If None, the filtered data is only returned.
         accepted_percentage (int): Minimum accepted percentage of accuracy for filtering.
+        accurateKeys (DataFrame): accepted pairs already computed with `loadAccurateKeys`. When the input is
+                                  processed in chunks, this avoids cleaning the accuracy file for every chunk.
+        chunkSize (int): If set and `file_input` is a path, the input file is read and filtered `chunkSize` rows at a
+                         time, so that the whole file never needs to fit in memory. When `output_file` is also set,
+                         each filtered chunk is appended to it and nothing is kept in memory.
+        dateFormat (str): Format of the date column in both files.
 
     Returns:
-        None: Saves the filtered data to `output_file`.
-    """
-    # Load the input data and accuracy data from the specified file paths
-    df_input = pd.read_csv(file_input, sep=';', encoding="UTF-8")
-    df_accuracy = pd.read_csv(file_accuracy, sep=';', encoding="UTF-8")
+        DataFrame: the filtered data, also saved to `output_file` if given. None when the input is filtered in
+        chunks directly into `output_file`.
+    """
+    # Load the accuracy data, keeping only the accepted pairs
+    if accurateKeys is None:
+        accurateKeys = loadAccurateKeys(file_accuracy, date_column, sensor_id_column, accepted_percentage,
+                                        dateFormat=dateFormat)
+
+    if output_file is not None:
+        # Ensure the output directory exists
+        output_dir = os.path.dirname(output_file)
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+            print(f"Directory '{output_dir}' created for the output file.")
+
+    if chunkSize is not None and not isinstance(file_input, pd.DataFrame):
+        filteredChunks = []
+        header = True
+        for chunk in pd.read_csv(file_input, sep=';', encoding="UTF-8", chunksize=chunkSize):
+            filtered_chunk = filterWithAccuracy(chunk, None, date_column, sensor_id_column, None, accepted_percentage,
+                                                accurateKeys=accurateKeys, dateFormat=dateFormat)
+            if output_file is not None:
+                # Save the filtered chunk, appending it to the specified output file
+                filtered_chunk.to_csv(output_file, sep=';', index=False, mode='w' if header else 'a', header=header)
+                header = False
+            else:
+                filteredChunks.append(filtered_chunk)
+        if output_file is not None:
+            return None
+        return pd.concat(filteredChunks, ignore_index=True)
 
-    # Clean and filter the accuracy data to only include measurements above `accepted_percentage`
-    for ind, column in enumerate(df_accuracy.columns):
-        if ind > 1:  # Ignore the first two columns, assumed to be `date_column` and `sensor_id_column`
-            # Remove '%' and convert to integers
-            df_accuracy[column] = df_accuracy[column].str.replace('%', '').astype(int)
-            # Drop rows where the accuracy is below `accepted_percentage`
-            df_accuracy = df_accuracy[df_accuracy[column] >= accepted_percentage]
+    # Load the input data
+    df_input = loadInputData(file_input)
 
-    # Extract date and sensor ID columns as an identifier for filtering
-    identifier = df_accuracy[[date_column, sensor_id_column]]
-    keys = list(identifier.columns)
+    # Filter `df_input` to include only rows that match the high-accuracy entries in `df_accuracy`
+    inputKeys = parseAccuracyKeys(df_input, date_column, sensor_id_column, dateFormat=dateFormat)
+    inputKeys['position'] = np.arange(len(inputKeys))
+    matched = inputKeys.merge(accurateKeys, on=[date_column, sensor_id_column], how='inner')
+    filtered_df = df_input.iloc[np.unique(matched['position'].to_numpy())]
 
-    # Create indices based on the date and sensor ID columns for both dataframes
-    i1 = df_input.set_index(keys).index
-    i2 = df_accuracy.set_index(keys).index
+    if output_file is not None:
+        # Save the filtered data to the specified output file
+        filtered_df.to_csv(output_file, sep=';', index=False)
+    return filtered_df
 
-    # Filter `df_input` to include only rows that match the high-accuracy entries in `df_accuracy`
-    filtered_df = df_input[i1.isin(i2)]
 
-    # Ensure the output directory exists
-    output_dir = os.path.dirname(output_file)
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-        print(f"Directory '{output_dir}' created for the output file.")
+# Edge types that cannot host a traffic loop (unless the edge has the same name of the measured road)
+EXCLUDED_EDGE_TYPES = ["highway.pedestrian", "highway.track", "highway.footway", "highway.path", "highway.cycleway",
+                       "highway.steps"]
 
-    # Save the filtered data to the specified output file
-    filtered_df.to_csv(output_file, sep=';', index=False)
-    print(f"Output with filtered accuracy created at '{output_file}'.")
 
-def generateRoadNamesFile(inputFile: str, sumoNetFile: str, roadNamesFilePath: str):
+@lru_cache(maxsize=NET_CACHE_SIZE)
+def buildEdgeIndex(sumoNetFile: str):
+    """
+    Build a spatial index (STRtree) on the shapes of the edges of a SUMO network, together with the edge attributes
+    used when matching coordinates to edges.
+
+    :param sumoNetFile: Path to the SUMO network file.
+    :return: a tuple with the STRtree, the array of edge shapes and a DataFrame with 'edge_id', 'edge_name' and
+             'edge_type' of each indexed edge, in the same order of the shapes.
+    """
+    net = loadSumoNet(sumoNetFile)
+    edges = net.getEdges()
+    shapes = np.array([LineString(edge.getShape(True)) for edge in edges], dtype=object)
+    edgeInfo = pd.DataFrame({'edge_id': [edge.getID() for edge in edges],
+                             'edge_name': [edge.getName() for edge in edges],
+                             'edge_type': [edge.getType() for edge in edges]})
+    return STRtree(shapes), shapes, edgeInfo
+
+
+def generateRoadNamesFile(inputFile: Union[str, pd.DataFrame], sumoNetFile: str, roadNamesFilePath: Optional[str],
+                          radius: float = 25) -> pd.DataFrame:
     """
     Generate a road names file with edge IDs linked to each road, based on geopoint coordinates.
 
     This function uses the coordinates provided in the input file to find the closest `edge_id` in the SUMO network.
     The `edge_id` is associated with each road name based on the provided coordinates. This information is saved in
-    a CSV file.
+    a CSV file. All the coordinates are converted at once, and the edges within `radius` are found through a spatial
+    index built on the edge shapes.
 
     Args:
-        inputFile (str): Path to the CSV file containing roads to map to an edge ID. This file should include
-                         at least the columns 'Nome via' (road name) and 'geopoint' (latitude,longitude coordinates).
+        inputFile (str | DataFrame): Path to the CSV file (or DataFrame) containing roads to map to an edge ID. This
+                         file should include at least the columns 'Nome via' (road name) and 'geopoint' (latitude,longitude coordinates).
         sumoNetFile (str): Path to the SUMO network file (e.g., `net.xml`) that includes the road network.
         roadNamesFilePath (str): Path for the output CSV file where the mapped road names and edge IDs will be saved.
+                                 If None, the mapping is only returned.
+        radius (float): Maximum distance, in meters, between a geopoint and its edge.
 
     Returns:
-        None: The function saves two files:
-              - A CSV file (`roadNamesFilePath`) with the road name and its corresponding edge ID.
+        DataFrame: the road names with their corresponding edge ID, also saved to `roadNamesFilePath` if given.
     """
-    # Load the SUMO network using sumolib
-    net = sumolib.net.readNet(sumoNetFile)
+    # Load the SUMO network using sumolib, together with the spatial index of its edges
+    net = loadSumoNet(sumoNetFile)
+    tree, shapes, edgeInfo = buildEdgeIndex(sumoNetFile)
 
     # Load input data and filter unique road names and geopoints
-    input_df = pd.read_csv(inputFile, sep=';')
-    df_unique = input_df[['Nome via', 'geopoint']].drop_duplicates()
-
-    for index, row in df_unique.iterrows():
-        # Extract latitude and longitude from the geopoint
-        coord = row['geopoint']
-        lat, lon = map(float, coord.split(','))
-
-        # Convert geographic coordinates to SUMO's (x, y) coordinates
-        x, y = net.convertLonLat2XY(lon, lat)
-        print(f"SUMO reference coordinates (x, y): ({x}, {y})")
-
-        # Find neighboring edges within a 25m radius, sorted by distance
-        candidate_edges = net.getNeighboringEdges(x, y, r=25)
-        edges_and_dist = sorted(candidate_edges, key=lambda edge: edge[1])
-
-        # Attempt to find the closest edge that matches the road name or is suitable
-        closest_edge = None
-        if edges_and_dist:
-            for edge, dist in edges_and_dist:
-                edge_name = edge.getName().lower()
-                road_name = row["Nome via"].lower()
-
-                # Check if the edge name matches the road name, or find a suitable edge type
-                if edge_name == road_name or edge.getType() not in ["highway.pedestrian", "highway.track",
-                                                                    "highway.footway", "highway.path",
-                                                                    "highway.cycleway", "highway.steps"]:
-                    closest_edge = edge
-                    break
-            else:
-                # If no matching edge is found, set closest_edge to the first suitable edge
-                closest_edge = next((edge for edge, dist in edges_and_dist if
-                                     edge.getType() not in ["highway.pedestrian", "highway.track", "highway.footway",
-                                                            "highway.path", "highway.cycleway", "highway.steps"]), None)
-        if closest_edge:
-            print(f"Name: {closest_edge.getName()}")
-            print(f"Edge ID: {closest_edge.getID()}")
-            # Assign the closest edge ID to the row in df_unique
-            df_unique.at[index, 'edge_id'] = closest_edge.getID()
-        else:
-            # Drop rows where no suitable edge is found within the network
-            print(f"No suitable edge found for road '{row['Nome via']}' at coordinates ({lat}, {lon}).")
-            df_unique.drop(index, inplace=True)
+    input_df = loadInputData(inputFile)
+    df_unique = input_df[['Nome via', 'geopoint']].drop_duplicates().reset_index(drop=True)
+
+    # Extract latitude and longitude from the geopoints and convert them to SUMO's (x, y) coordinates
+    lat, lon = splitGeopoints(df_unique['geopoint'])
+    x, y = net.getGeoProj()(lon, lat)
+    xOffset, yOffset = net.getLocationOffset()
+    points = shapely.points(np.asarray(x) + xOffset, np.asarray(y) + yOffset)
+
+    # Find neighboring edges within the radius, together with their distance
+    pointIndex, edgeIndex = tree.query(points, predicate='dwithin', distance=radius)
+    candidates = edgeInfo.iloc[edgeIndex].reset_index(drop=True)
+    candidates['point'] = pointIndex
+    candidates['distance'] = shapely.distance(points[pointIndex], shapes[edgeIndex])
+    candidates = candidates[candidates['distance'] < radius]
+
+    # The closest edge that matches the road name or has a suitable type is chosen
+    roadNames = df_unique['Nome via'].str.lower().to_numpy()[candidates['point'].to_numpy()]
+    suitable = (candidates['edge_name'].str.lower().to_numpy() == roadNames) | \
+               ~candidates['edge_type'].isin(EXCLUDED_EDGE_TYPES).to_numpy()
+    closest = candidates[suitable].sort_values(['point', 'distance'], kind='stable').drop_duplicates('point')
+    df_unique['edge_id'] = closest.set_index('point')['edge_id']
+
+    # Drop rows where no suitable edge is found within the network
+    missing = df_unique['edge_id'].isna()
+    for _, row in df_unique[missing].iterrows():
+        print(f"No suitable edge found for road '{row['Nome via']}' at coordinates ({row['geopoint']}).")
+    df_unique = df_unique[~missing]
+    print(f"Edge IDs found for {len(df_unique)} of {len(missing)} road geopoints.")
 
     # Save the updated DataFrame with edge IDs to the specified CSV file path
-    df_unique.to_csv(roadNamesFilePath, sep=';', index=False)
-    print(f"CSV file with road names and edge IDs saved at '{roadNamesFilePath}'")
+    if roadNamesFilePath is not None:
+        df_unique.to_csv(roadNamesFilePath, sep=';', index=False)
+        print(f"CSV file with road names and edge IDs saved at '{roadNamesFilePath}'")
+    return df_unique
 
-def generateDetectorsCoordinatesFile(inputFile: str, detectorCoordinatesPath: str):
+def generateDetectorsCoordinatesFile(inputFile: Union[str, pd.DataFrame], detectorCoordinatesPath: str):
     """
     Generate a detector.csv file  that includes coordinates for each traffic loop.
     starting from the input file, all entries that have unique coordinates are extracted,
     allowing to distinguish all the loops in the measurement file.
     Args:
-        inputFile: Path to the CSV file containing traffic loop to be stored. This file should include
+        inputFile: Path to the CSV file (or DataFrame) containing traffic loop to be stored. This file should include
                          at least the columns 'geopoint' (latitude, longitude coordinates).
         detectorCoordinatesPath: Path for the output csv file containing induction loop coordinates.
     Returns:
@@ -153,18 +276,11 @@ def generateDetectorsCoordinatesFile(inputFile: str, detectorCoordinatesPath: st
     """
 
     # Load input data and filter unique road names and geopoints
-    input_df = pd.read_csv(inputFile, sep=';')
+    input_df = loadInputData(inputFile)
     df_unique = input_df.drop_duplicates(['geopoint'])
-    temp = []
-    for index, row in df_unique.iterrows():
-        id = row['ID_univoco_stazione_spira']
-        # Extract latitude and longitude from the geopoint
-        coord = row['geopoint']
-        lat, lon = map(float, coord.split(','))
-
-        temp.append({'id': id, 'lat': lat, 'lon': lon})
-
-    new_df = pd.DataFrame(temp, columns=['id', 'lat', 'lon'])
+    # Extract latitude and longitude from the geopoints
+    lat, lon = splitGeopoints(df_unique['geopoint'])
+    new_df = pd.DataFrame({'id': df_unique['ID_univoco_stazione_spira'].to_numpy(), 'lat': lat, 'lon': lon})
     if not os.path.exists(MVENV_DATA_PATH):
         os.makedirs(MVENV_DATA_PATH)
         print(f"Directory '{MVENV_DATA_PATH}' created for the output file.")
@@ -186,10 +302,7 @@ def mapDetectorsFromCoordinates(sumoNetFile: str, detectorCoordinatesPath: str,
 
     """
     print("starting to map the detector using geospatial coordinates...")
-    script = SUMO_TOOLS_PATH + "/detector/mapDetectors.py"
-    command = [
-        sys.executable,
-        script,
+    args = [
         "-n", sumoNetFile,
         "-d", detectorCoordinatesPath,
         "--det-output-file", SUMO_OUTPUT_PATH + "/detector.out.xml",
@@ -197,10 +310,10 @@ def mapDetectorsFromCoordinates(sumoNetFile: str, detectorCoordinatesPath: str,
     ]
 
     try:
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
-        print("Script output:", result.stdout)
-    except subprocess.CalledProcessError as e:
-        print("Script error:", e.stderr)
+        result = getSumoToolPool().run("mapDetectors", args)
+        print("Script output:", result["stdout"])
+    except SumoToolError as e:
+        print("Script error:", e.result["stderr"])
 
     # Dropping duplicates
     # Loading generated detector
@@ -220,7 +333,7 @@ def mapDetectorsFromCoordinates(sumoNetFile: str, detectorCoordinatesPath: str,
     # save modified xml file
     tree.write(detectorFilePath, encoding='utf-8', xml_declaration=True)
 
-def generateInductionLoopFile(inputFile: str, inductionLoopPath: str):
+def generateInductionLoopFile(inputFile: Union[str, pd.DataFrame], inductionLoopPath: str):
     """
     Generate a inductionLoop.csv file  A file that includes the information of traffic loops. Specifically, we extract
     the loops from the input file, detecting one loop for each unique <street name, loop id , coordinate> triplet.
@@ -234,20 +347,15 @@ def generateInductionLoopFile(inputFile: str, inductionLoopPath: str):
     """
 
     # Load input data and filter unique road names and geopoints
-    input_df = pd.read_csv(inputFile, sep=';')
+    input_df = loadInputData(inputFile)
     df_unique = input_df.drop_duplicates(['Nome via', 'ID_univoco_stazione_spira', 'geopoint'])
-    temp = []
-    for index, row in df_unique.iterrows():
-        # Extract latitude and longitude from the geopoint
-        coord = row['geopoint']
-        lat, lon = map(float, coord.split(','))
-
-        temp.append({'id': row['ID_univoco_stazione_spira'], 'roadname': row['Nome via'],'lat': lat, 'lon': lon})
-
-    new_df = pd.DataFrame(temp, columns=['id', 'roadname', 'lat', 'lon'])
+    # Extract latitude and longitude from the geopoints
+    lat, lon = splitGeopoints(df_unique['geopoint'])
+    new_df = pd.DataFrame({'id': df_unique['ID_univoco_stazione_spira'].to_numpy(),
+                           'roadname': df_unique['Nome via'].to_numpy(), 'lat': lat, 'lon': lon})
     new_df.to_csv(inductionLoopPath, sep=';', index=False)
 
-def fillMissingEdgeId(roadnameFile: str):
+def fillMissingEdgeId(roadnameFile: Union[str, pd.DataFrame]) -> pd.DataFrame:
     """
     Fill in missing edge IDs in the road names file.
     This function finds all entries in the specified road names file that lack an `edge_id`. For each entry with a missing
@@ -259,9 +367,9 @@ def fillMissingEdgeId(roadnameFile: str):
         roadnameFile (str): Path to the CSV file containing road names and edge IDs.
 
     Returns:
-        None: The function updates the CSV file in place.
+        DataFrame: the updated road names. When a file path is given, the CSV file is also updated in place.
 
-    :param roadnameFile: The path to the CSV file where road names and edge IDs are stored. The file is expected to
+    :param roadnameFile: The path to the CSV file (or DataFrame) where road names and edge IDs are stored. The file is expected to
                          contain at least two columns:
                          - 'Nome via': The name of the road.
                          - 'edge_id': The unique identifier for each edge in the SUMO network.
@@ -271,27 +379,22 @@ def fillMissingEdgeId(roadnameFile: str):
         - Prints the number of rows without an `edge_id` after attempting to fill them in.
     """
     # Load the road names data from the specified file
-    df = pd.read_csv(roadnameFile, sep=';')
-    empty = 0
+    df = loadInputData(roadnameFile)
 
-    # Iterate over each row to check for missing edge IDs
-    for index, row in df.iterrows():
-        if pd.isnull(row['edge_id']):
-            # Find other rows with the same road name ('Nome via') that have a valid edge ID
-            sameStreet = df[(df['Nome via'] == row['Nome via']) & (df['edge_id'].notna())]
-            if not sameStreet.empty:
-                # Fill in the missing edge_id with the first matching edge_id found
-                df.at[index, 'edge_id'] = sameStreet['edge_id'].values[0]
-            else:
-                # Increment count if no matching edge ID is found
-                empty += 1
+    # Fill in the missing edge_id with the first valid edge_id found for the same road name ('Nome via')
+    firstEdgeId = df.groupby('Nome via', sort=False)['edge_id'].transform('first')
+    df['edge_id'] = df['edge_id'].fillna(firstEdgeId)
+    # Count the roads for which no matching edge ID is found
+    empty = int(df['edge_id'].isna().sum())
 
     # Report the number of roads without an edge ID
     print("Roads without edge ID: " + str(empty))
     # Save the updated DataFrame back to the CSV file
-    df.to_csv(roadnameFile, sep=';', index=False)
+    if not isinstance(roadnameFile, pd.DataFrame):
+        df.to_csv(roadnameFile, sep=';', index=False)
+    return df
 
-def linkEdgeId(inputFile: str, roadnameFile: str, outputFile: str):
+def linkEdgeId(inputFile: Union[str, pd.DataFrame], roadnameFile: Union[str, pd.DataFrame], outputFile: Optional[str]) -> pd.DataFrame:
     """
     Link edge IDs from the road names file to each entry in the input file.
 
@@ -305,9 +408,10 @@ def linkEdgeId(inputFile: str, roadnameFile: str, outputFile: str):
         roadnameFile (str): Path to the CSV file containing road names and edge IDs. This file should also
                             include 'Nome via', 'geopoint', and 'edge_id' columns.
         outputFile (str): Path for the output CSV file where the modified data with linked edge IDs will be saved.
+                          If None, the data is only returned.
 
     Returns:
-        None: The function saves the updated data with edge IDs to `outputFile`.
+        DataFrame: the updated data with edge IDs, also saved to `outputFile` if given.
 
     :param inputFile: The input CSV file containing data entries that need edge IDs.
     :param roadnameFile: The CSV file containing road names and associated edge IDs.
@@ -317,29 +421,22 @@ def linkEdgeId(inputFile: str, roadnameFile: str, outputFile: str):
         - Saves the updated input data, with edge IDs linked where possible, to the specified `outputFile`.
     """
     # Load input and road names data
-    df = pd.read_csv(inputFile, sep=';')
-    dfRoadnames = pd.read_csv(roadnameFile, sep=';')
+    df = loadInputData(inputFile)
+    dfRoadnames = loadInputData(roadnameFile)
 
-    # Iterate over each row in the input DataFrame to find and link edge IDs
-    for index, row in df.iterrows():
-        # Find matching edge_id in the road names file based on road name and geopoint
-        edge = dfRoadnames.loc[
-            (dfRoadnames['Nome via'] == row['Nome via']) &
-            (dfRoadnames['geopoint'] == row['geopoint']),
-            'edge_id'
-        ]
-
-        # If no matching edge_id is found, remove the row; otherwise, link the edge_id
-        if len(edge) == 0:
-            df.drop(index, inplace=True)
-            continue
-        df.at[index, 'edge_id'] = edge.values[0]  # Assign the first match
+    # Keep the first edge_id for each road name and geopoint, so that the join never duplicates measurements
+    edges = dfRoadnames[['Nome via', 'geopoint', 'edge_id']].drop_duplicates(['Nome via', 'geopoint'])
+
+    # Link the edge_id to each row through a join on road name and geopoint. Rows without a match are removed
+    df = df.drop(columns=['edge_id'], errors='ignore').merge(edges, on=['Nome via', 'geopoint'], how='inner')
 
     # Save the modified DataFrame to the output file
-    df.to_csv(outputFile, sep=';', index=False)
-    print(f"Updated file with linked edge IDs saved at '{outputFile}'")
+    if outputFile is not None:
+        df.to_csv(outputFile, sep=';', index=False)
+        print(f"Updated file with linked edge IDs saved at '{outputFile}'")
+    return df
 
-def filterForShadowManager(inputFile: str):
+def filterForShadowManager(inputFile: Union[str, pd.DataFrame]):
     """
     Filter and format data for the Shadow Manager.
 
@@ -348,7 +445,7 @@ def filterForShadowManager(inputFile: str):
     The filtered and renamed data is then saved to a CSV file named `digital_shadow_types.csv` in the `SHADOW_TYPE_PATH` directory.
 
     Args:
-        inputFile (str): Path to the CSV file containing raw traffic loop data with various columns.
+        inputFile (str | DataFrame): Path to the CSV file (or DataFrame) containing raw traffic loop data with various columns.
 
     Returns:
         None: The function saves the processed data to `digital_shadow_types.csv` in the `SHADOW_TYPE_PATH` directory (resulting in the SHADOW_TYPE_FILE_PATH)
@@ -359,7 +456,7 @@ def filterForShadowManager(inputFile: str):
         - Creates the `SHADOW_TYPE_PATH` directory if it does not already exist.
     """
     # Load the input CSV file
-    df = pd.read_csv(inputFile, sep=';')
+    df = loadInputData(inputFile)
 
     # Select and rename relevant columns for the Shadow Manager
     df = df[['Nodo da', 'Nodo a', 'Nome via', 'direzione', 'longitudine', 'latitudine', 'geopoint',
@@ -377,19 +474,20 @@ def filterForShadowManager(inputFile: str):
     # Save the filtered DataFrame to a CSV file in the specified directory
     df.to_csv(os.path.join(SHADOW_TYPE_FILE_PATH), sep=';', index=False)
 
-def generateRealFlow(inputFile: str):
+def generateRealFlow(inputFile: Union[str, pd.DataFrame], append: bool = False):
     """
     Generate a real traffic flow file with selected columns.
     This function reads a CSV file containing traffic flow data, selects specific columns, and saves the filtered data
     to a new CSV file named `real_traffic_flow.csv` in the `REAL_TRAFFIC_FLOW_DATA_MVENV_PATH` directory.
     Args:
-        :param inputFile: The path to the input CSV file containing traffic data.
+        :param inputFile: The path to the input CSV file (or DataFrame) containing traffic data.
+        :param append: If True, the data is appended to the existing file (without header).
 
     Returns:
         None: The function saves the filtered data to `real_traffic_flow.csv` in the specified directory.
     """
     # Load the input CSV file
-    df = pd.read_csv(inputFile, sep=';')
+    df = loadInputData(inputFile)
 
     # Select the relevant columns for real traffic flow data
     columns_to_keep = [
@@ -406,8 +504,9 @@ def generateRealFlow(inputFile: str):
 
     # Save the filtered DataFrame to the output CSV file with index label 'index'
     output_file = os.path.join(REAL_TRAFFIC_FLOW_DATA_MVENV_PATH, "real_traffic_flow.csv")
-    df.to_csv(output_file, sep=';', index_label='index')
-    print(f"Filtered real traffic flow data saved at '{output_file}'")
+    df.to_csv(output_file, sep=';', index_label='index', mode='a' if append else 'w', header=not append)
+    if not append:
+        print(f"Filtered real traffic flow data saved at '{output_file}'")
 
 def generateEdgeDataFile(input_file: str, date: str = "01/02/2024", time_slot: str = "00:00-01:00", duration: str = '3600'):
     """
@@ -415,7 +514,7 @@ def generateEdgeDataFile(input_file: str, date: str = "01/02/2024", time_slot: s
     This function creates an XML file that includes edge traffic data for the specified date and time slot, based on the
     vehicle count data in `input_file`. The output XML file is saved to `EDGE_DATA_FILE_PATH`.
     Args:
-        :param input_file: Path to the CSV file containing traffic data. The file should contain:
+        :param input_file: Path to the CSV file (or date-partitioned dataset) containing traffic data. The file should contain:
                            - 'edge_id': ID of the road edge.
                            - 'data': Date of traffic measurement.
                            - Hourly time slot columns with vehicle counts (e.g., '00:00-01:00', '01:00-02:00').
@@ -428,8 +527,13 @@ def generateEdgeDataFile(input_file: str, date: str = "01/02/2024", time_slot: s
     interval = ET.SubElement(root, 'interval', begin='0', end=duration)
 
     # Load and filter data based on the specified date
-    df = pd.read_csv(input_file, sep=';')
-    df = df[df['data'].str.contains(date)]
+    if isPartitionedDataset(input_file):
+        first = int(time_slot[:2])
+        last = int(time_slot[6:8])
+        slotColumns = [f"{hour:02d}:00-{hour + 1:02d}:00" for hour in range(first, last)]
+        df = readPartitionedDataset(input_file, date=date, columns=['edge_id'] + slotColumns)
+    else:
+        df = loadTrafficData(input_file, date=date)
 
     for index, row in df.iterrows():
         edge_id = str(row['edge_id'])
@@ -455,20 +559,24 @@ def generateEdgeDataFile(input_file: str, date: str = "01/02/2024", time_slot: s
     tree.write(EDGE_DATA_FILE_PATH, encoding="UTF-8", xml_declaration=True)
     print(f"Edge data XML saved at '{EDGE_DATA_FILE_PATH}'")
 
-def dailyFilter(inputFilePath: str, date: str):
+def dailyFilter(inputFilePath: Union[str, pd.DataFrame], date: str):
     """
     Filter data by a specific date and save to a predefined daily traffic flow file.
     This function reads an input CSV file, filters rows based on the specified date, and saves the filtered data to `DAILY_TRAFFIC_FLOW_FILE_PATH'. The output file can be used
     within the Digital Twin environment for testing.
     Args:
-        :param inputFilePath: Path to the input CSV file containing raw traffic data. Expected columns include:
+        :param inputFilePath: Path to the input CSV file (or date-partitioned dataset) containing raw traffic data.
         :param date: Date to filter the data by, formatted as 'dd/mm/yyyy'.
     """
-    # Load the input CSV file
-    df = pd.read_csv(inputFilePath, sep=';')
-
-    # Filter data by the specified date
-    df_filtered = df[df['data'].str.contains(date)]
+    # Load the data of the specified date. On a date-partitioned dataset only the partition of that day is read
+    if isinstance(inputFilePath, pd.DataFrame):
+        df = inputFilePath
+        dates = df['data'] if pd.api.types.is_datetime64_any_dtype(df['data']) else pd.to_datetime(df['data'], format='%Y-%m-%d')
+        df_filtered = df[dates == pd.Timestamp(normalizeDate(date))].copy()
+    else:
+        df_filtered = loadTrafficData(inputFilePath, date=date)
+    if pd.api.types.is_datetime64_any_dtype(df_filtered['data']):
+        df_filtered['data'] = df_filtered['data'].dt.strftime('%Y-%m-%d')
 
     # Ensure the output directory exists
     os.makedirs(os.path.dirname(DAILY_TRAFFIC_FLOW_FILE_PATH), exist_ok=True)
@@ -477,130 +585,154 @@ def dailyFilter(inputFilePath: str, date: str):
     df_filtered.to_csv(DAILY_TRAFFIC_FLOW_FILE_PATH, sep=';', index=False)
     print(f"Filtered data for date '{date}' saved at '{DAILY_TRAFFIC_FLOW_FILE_PATH}'")
 
-def reorderDataset(inputFilePath: str, outputFilePath: str):
+def reorderDataset(inputFilePath: Union[str, pd.DataFrame], outputFilePath: Optional[str]) -> pd.DataFrame:
     """
     Reorder the dataset in chronological order based on the 'data' column.
     Args:
-        :param inputFilePath: Path to the input CSV file containing the dataset.
-        :param outputFilePath: Path to the output file where the reordered dataset will be saved.
+        :param inputFilePath: Path to the input CSV file (or DataFrame) containing the dataset.
+        :param outputFilePath: Path to the output file where the reordered dataset will be saved. If None, the
+        reordered dataset is only returned.
     """
     # Load the dataset
-    df = pd.read_csv(inputFilePath, sep=';')
+    df = loadInputData(inputFilePath)
 
     # Ensure `data` column is in datetime format
-    df['data'] = pd.to_datetime(df['data'], format='%Y-%m-%d')
+    if not pd.api.types.is_datetime64_any_dtype(df['data']):
+        df = df.assign(data=pd.to_datetime(df['data'], format='%Y-%m-%d'))
 
     # Sort the dataset by date
-    df_sorted = df.sort_values(by='data')
+    df_sorted = df.sort_values(by='data', kind='stable')
 
     # Save the reordered dataset
-    df_sorted.to_csv(outputFilePath, sep=';', index=False)
-    print(f"Dataset reordered by date and saved at '{outputFilePath}'")
+    if outputFilePath is not None:
+        df_sorted.to_csv(outputFilePath, sep=';', index=False)
+        print(f"Dataset reordered by date and saved at '{outputFilePath}'")
+    return df_sorted
+
+def generatePartitionedDataset(inputFilePath: str, datasetPath: str = PROCESSED_TRAFFIC_FLOW_DATASET_PATH,
+                               dateFormat: str = None):
+    """
+    Convert a processed traffic flow .csv file into a date-partitioned dataset. Each day is stored in its own partition
+    with a parsed date column and numeric slot columns, so that the modeling and simulation steps can load a single
+    day or a date range without re-reading and re-filtering the whole file.
+    Args:
+        :param inputFilePath: Path to the processed traffic flow CSV file.
+        :param datasetPath: Folder where the dataset will be saved. Default is `PROCESSED_TRAFFIC_FLOW_DATASET_PATH`.
+        :param dateFormat: Format of the 'data' column. If None, 'yyyy-mm-dd' and 'dd/mm/yyyy' are both accepted.
+    """
+    df = pd.read_csv(inputFilePath, sep=';')
+    writePartitionedDataset(df, datasetPath, dateColumn='data', dateFormat=dateFormat)
 
-def filteringDataset(inputFilePath: str, start_date: str, end_date: str, outputFilePath: str):
+def filteringDataset(inputFilePath: Union[str, pd.DataFrame], start_date: str, end_date: str, outputFilePath: Optional[str]) -> pd.DataFrame:
     """
     Filter the dataset for a specific date range and save it to a specified file.
     Args:
-        :param inputFilePath: Path to the input CSV file containing the dataset.
+        :param inputFilePath: Path to the input CSV file (or date-partitioned dataset) containing the dataset.
         :param start_date: Start date for filtering, formatted as 'mm/dd/yyyy'.
         :param end_date: End date for filtering, formatted as 'mm/dd/yyyy'.
-        :param outputFilePath: Path where the filtered dataset will be saved.
+        :param outputFilePath: Path where the filtered dataset will be saved. If None, the dataset is only returned.
 
     :side effect: Saves the filtered dataset to `outputFilePath`.
     """
-    # Load the dataset
-    df = pd.read_csv(inputFilePath, sep=';')
-
     # Convert `start_date` and `end_date` from 'mm/dd/yyyy' to 'yyyy-mm-dd' format for consistent comparison
     start_date = datetime.strptime(start_date, '%m/%d/%Y').strftime('%Y-%m-%d')
     end_date = datetime.strptime(end_date, '%m/%d/%Y').strftime('%Y-%m-%d')
 
-    # Ensure `data` column is parsed as datetime in 'dd/mm/yyyy' format
-    df['data'] = pd.to_datetime(df['data'], format='%d/%m/%Y')
+    if not isinstance(inputFilePath, pd.DataFrame) and isPartitionedDataset(inputFilePath):
+        # Only the partitions inside the date range are read
+        filtered_df = readPartitionedDataset(inputFilePath, startDate=start_date, endDate=end_date)
+    else:
+        # Load the dataset
+        df = loadInputData(inputFilePath)
 
-    # Filter the dataset for the specified date range
-    mask = (df['data'] >= start_date) & (df['data'] <= end_date)
-    filtered_df = df.loc[mask]
+        # Ensure `data` column is parsed as datetime in 'dd/mm/yyyy' format
+        if not pd.api.types.is_datetime64_any_dtype(df['data']):
+            df = df.assign(data=pd.to_datetime(df['data'], format='%d/%m/%Y'))
+
+        # Filter the dataset for the specified date range
+        mask = (df['data'] >= start_date) & (df['data'] <= end_date)
+        filtered_df = df.loc[mask]
 
     # Save the filtered dataset
-    filtered_df.to_csv(outputFilePath, sep=';', index=False)
-    print(f"Filtered data from {start_date} to {end_date} saved at '{outputFilePath}'")
+    if outputFilePath is not None:
+        filtered_df.to_csv(outputFilePath, sep=';', index=False)
+        print(f"Filtered data from {start_date} to {end_date} saved at '{outputFilePath}'")
+    return filtered_df
 
-def fillMissingDirections(inputFilePath: str, directionColumn = "direzione", defaultDirection = 'N'):
+def fillMissingDirections(inputFilePath: Union[str, pd.DataFrame], directionColumn = "direzione", defaultDirection = 'N') -> pd.DataFrame:
     """
     Fill missing direction in a traffic file. If a default direction is not set, North will be used.
     Args:
-        inputFilePath: path to the input CSV file.
+        inputFilePath: path to the input CSV file (or DataFrame).
         directionColumn: column name where directions are defined.
         defaultDirection: direction to use when a road w.o. direction is met.
 
     Returns:
-        The function updates the CSV file in place.
+        The updated DataFrame. When a file path is given, the function also updates the CSV file in place.
     """
     # Load the dataset
-    df = pd.read_csv(inputFilePath, sep=';')
+    df = loadInputData(inputFilePath)
     # Replace empty values in the direction column with 'N'.
-    df[directionColumn].fillna(defaultDirection, inplace=True)
+    df[directionColumn] = df[directionColumn].fillna(defaultDirection)
     # Save modified dataset
-    df.to_csv(inputFilePath, index=False, sep=';')
+    if not isinstance(inputFilePath, pd.DataFrame):
+        df.to_csv(inputFilePath, index=False, sep=';')
+    return df
+
+def parseGeoShape(geo_shape_str: str):
+    """
+    Converts a geo shape string of the zone file (a GeoJSON geometry) into a Shapely geometry. Strings that are not
+    valid JSON (e.g. the Python-like dicts with single quotes of older exports) are read as Python literals.
+
+    Args:
+        geo_shape_str (str): A string representing the geometry as JSON or as a Python dict literal.
 
-def addZones(inputFilePath: str, zoneFilePath: str, zoneColumn="codZone", zoneColumnID="Codice Area Statistica", withPlot=False):
+    Returns:
+        shapely.geometry: A Shapely Geometric Object.
+    """
+    try:
+        # Converts the string in a dict
+        try:
+            geo_data = json.loads(geo_shape_str)
+        except json.JSONDecodeError:
+            geo_data = ast.literal_eval(geo_shape_str)
+        geom_type = geo_data["type"].lower()
+        if geom_type not in ["polygon", "multipolygon", "point"]:
+            raise ValueError(f"Unsupported geometry type: {geom_type}")
+        return shape(geo_data)
+    except Exception as e:
+        raise ValueError(f"Invalid geo shape format: {geo_shape_str}") from e
+
+
+def addZones(inputFilePath: Union[str, pd.DataFrame], zoneFilePath: str, zoneColumn="codZone", zoneColumnID="Codice Area Statistica", withPlot=False) -> pd.DataFrame:
     """
     Add Zone information to the input file entries. Each geopoint in the input data is evaluated as a point and searched
     for which geoshape (of the zone file) contains that point. Once found, the associated zone id information is added
     to the input file. For points that do not fall within any zone, the zone with the smallest distance centroid is
-    associated.
+    associated. The zones are searched once for each unique geopoint, through a spatial join on the indexed zone
+    shapes, and then linked to all the measurements of that geopoint.
     Args:
-        inputFilePath: input file containing the geopoints to be associated
+        inputFilePath: input file (or DataFrame) containing the geopoints to be associated
         zoneFilePath: file containing the zones described as geoshape and their associated IDs
         zoneColumn: column name to be created within the input file
         withPlot: boolean value for enable or not plot of the geopoint together with the geoshapes
-    Returns: The function updates the CSV file in place.
+    Returns: The updated data. When a file path is given, the function also updates the CSV file in place.
     """
     print("Start adding zones for the input file...")
-    df = pd.read_csv(inputFilePath, sep=';')
-    # Converts the 'geopoint' column to geometry
+    df = loadInputData(inputFilePath)
+    # Converts the unique geopoints to geometry. Latitude and longitude are saved in reverse in the geopoint
+    geopoints = df['geopoint'].drop_duplicates().reset_index(drop=True)
+    coordinates = geopoints.str.split(',', expand=True).astype(float)
     points_gdf = gpd.GeoDataFrame(
-        df,
-        geometry=df['geopoint'].apply(
-            lambda x: Point(map(float, x.split(',')))
-        ),
+        {'geopoint': geopoints},
+        geometry=gpd.points_from_xy(coordinates[1], coordinates[0]),
         crs="EPSG:4326"  # Assuming WGS84 geographical coordinates
     )
-    # Inverts latitude with longitude (saved in reverse in the geopoint)
-    points_gdf['geometry'] = points_gdf['geometry'].apply(lambda p: Point(p.y, p.x) if p.geom_type == 'Point' else p)
-    points_gdf[zoneColumn] = {}
-
-    # Custom function for creating geo shapes out of the zoneFile
-    def parse_custom_geo_shape(geo_shape_str):
-        """
-        Converts a customised geo shape string into a Shapely geometry.
-
-        Args:
-            geo_shape_str (str): A string representing the geometry (e.g. JSON-like).
-
-        Returns:
-            shapely.geometry: A Shapely Geometric Object.
-        """
-        try:
-            # Converts the string in a dict
-            geo_data = eval(geo_shape_str)
-            coordinates = geo_data["coordinates"]
-            geom_type = geo_data["type"].lower()
-
-            if geom_type == "polygon":
-                return Polygon(coordinates[0])
-            elif geom_type == "point":
-                return Point(coordinates)
-            else:
-                raise ValueError(f"Unsupported geometry type: {geom_type}")
-        except Exception as e:
-            raise ValueError(f"Invalid geo shape format: {geo_shape_str}") from e
 
     geo_shapes_df = pd.read_csv(zoneFilePath, sep=';')
     geo_shapes_gdf = gpd.GeoDataFrame(
-        geo_shapes_df,
-        geometry=geo_shapes_df['Geo Shape'].apply(parse_custom_geo_shape),
+        geo_shapes_df[[zoneColumnID]],
+        geometry=geo_shapes_df['Geo Shape'].apply(parseGeoShape),
         crs="EPSG:4326"  # Assuming WGS84 geographical coordinates
     )
 
@@ -612,106 +744,264 @@ def addZones(inputFilePath: str, zoneFilePath: str, zoneColumn="codZone", zoneCo
         points_gdf.plot(ax=ax, color='red', markersize=10)
         plt.show()
 
-    # For each point, find the geoshape containing the point and add the zone ID
-    for idx, point in points_gdf.iterrows():
-        # Find the geoshape containing the point
-        containing_shape = geo_shapes_gdf[geo_shapes_gdf.geometry.contains(point.geometry)]
+    # Find the geoshape containing each point (the first one of the zone file, if more than one contains it)
+    joined = gpd.sjoin(points_gdf, geo_shapes_gdf, how='left', predicate='within')
+    joined = joined.sort_values('index_right', kind='stable')
+    joined = joined[~joined.index.duplicated(keep='first')].sort_index()
+    zones = joined[zoneColumnID]
+    print(f"Added found zone IDs for {zones.notna().sum()} of {len(zones)} geopoints. Filling the empty rows with the nearest Zone...")
 
-        if not containing_shape.empty:
-            # add the zone ID
-            points_gdf.at[idx, zoneColumn] = containing_shape.iloc[0][zoneColumnID]  # sostituisci con il nome corretto della colonna
-    print("Added found zone IDs. Filling the empty rows with the nearest Zone...")
     ### Filling NaN points
-    # Extract geoshape centroids as an array of co-ordinates
-    geo_shapes_centroids = np.array([[geom.centroid.x, geom.centroid.y] for geom in geo_shapes_gdf['geometry']])
-    # Extract the coordinates of the points as an array
-    points_coords = np.array([[geom.x, geom.y] for geom in points_gdf['geometry']])
-    # Create a KDTree for geoshape centroids
-    tree = cKDTree(geo_shapes_centroids)
-    # Find the index of the nearest geoshape for each point
-    distances, indices = tree.query(points_coords)
-    # Match the ID of the geoshape closest to the points
-    points_gdf['nearest_shape'] = indices
-    points_gdf['nearest_shape'] = points_gdf['nearest_shape'].apply(lambda idx: geo_shapes_gdf.iloc[idx][zoneColumnID])
-    # Replace NaN with the nearest geoshape
-    points_gdf[zoneColumn] = points_gdf[zoneColumn].fillna(points_gdf['nearest_shape'])
-    # Column no longer required
-    points_gdf = points_gdf.drop(columns=['nearest_shape'])
-
-    points_gdf.to_csv(inputFilePath, index=False, sep=';')
-    print("Saved the new data.")
-
-
-def fillEdgeDataInfo(inputFilePath: str, sumoNetFile: str):
-    # Load the SUMO network using sumolib
-    net = sumolib.net.readNet(sumoNetFile)
-
-    # Parsing del file XML
+    missing = zones.isna().to_numpy()
+    if missing.any():
+        # Extract geoshape centroids as an array of co-ordinates
+        centroids = shapely.centroid(geo_shapes_gdf.geometry.to_numpy())
+        geo_shapes_centroids = np.column_stack([shapely.get_x(centroids), shapely.get_y(centroids)])
+        # Extract the coordinates of the points outside any zone as an array
+        points_coords = np.column_stack([points_gdf.geometry.x, points_gdf.geometry.y])[missing]
+        # Find the index of the nearest geoshape for each point, through a KDTree of the geoshape centroids
+        distances, indices = cKDTree(geo_shapes_centroids).query(points_coords)
+        zones = zones.copy()
+        zones[missing] = geo_shapes_gdf[zoneColumnID].to_numpy()[indices]
+    points_zones = pd.DataFrame({'geopoint': points_gdf['geopoint'],
+                                 zoneColumn: zones.astype(geo_shapes_gdf[zoneColumnID].dtype)})
+
+    # Link each measurement to the zone of its geopoint
+    df = df.drop(columns=[zoneColumn], errors='ignore').merge(points_zones, on='geopoint', how='left')
+
+    if not isinstance(inputFilePath, pd.DataFrame):
+        df.to_csv(inputFilePath, index=False, sep=';')
+        print("Saved the new data.")
+    return df
+
+
+def fillEdgeDataInfo(inputFilePath: str, sumoNetFile: str, outputFilePath: str = "output_updated.xml"):
+    """
+    Add the density of each edge to an edgedata file, dividing the edge flow (qPKW) by the edge length. Lengths are
+    taken from the edge attribute table of the SUMO network, built once and shared with the other functions. Edges
+    missing in the network are reported and left without density.
+    Args:
+        inputFilePath: path of the edgedata .xml file with the qPKW attribute for each <edge> element.
+        sumoNetFile: path of the SUMO network file.
+        outputFilePath: path of the updated edgedata file.
+    """
+    edgeLengths = loadEdgeAttributes(sumoNetFile)['length']
+
     tree = ET.parse(inputFilePath)
     root = tree.getroot()
-    # Itera attraverso tutti gli elementi <edge>
-    for edge in root.findall(".//edge"):
-        edge_id = edge.get("id")  # Leggi l'attributo 'id'
-        qPKW = edge.get("qPKW")  # Leggi l'attributo 'qPKW'
-        edge_lengths = {edge.getID(): edge.getLength() for edge in net.getEdges()}
-        density = float(qPKW) / edge_lengths[edge_id]  # vehicles per km
-        edge.set("density", str(density))
-    # Salva l'output in un nuovo file XML
-    output_file = "output_updated.xml"
-    tree.write(output_file, encoding="UTF-8", xml_declaration=True)
-
-
-def generateFlow(inputFilePath: str, modelFilePath: str,outputFilePath: str, date: str, timeSlot: str):
-    """
-    Generate detector flow file starting from a traffic loop measurement file.
+    edges = root.findall(".//edge")
+    edgeIds = [edge.get("id") for edge in edges]
+    qPKW = np.array([float(edge.get("qPKW")) for edge in edges])
+    lengths = edgeLengths.reindex(edgeIds).to_numpy()
+    missing = np.isnan(lengths)
+    if missing.any():
+        print(f"Edges not found in '{sumoNetFile}', density not computed: {sorted(set(np.array(edgeIds)[missing]))}")
+    densities = qPKW / lengths  # vehicles per km
+    for edge, density, isMissing in zip(edges, densities, missing):
+        if not isMissing:
+            edge.set("density", str(density))
+    tree.write(outputFilePath, encoding="UTF-8", xml_declaration=True)
+
+
+def generateFlow(inputFilePath: str, modelFilePath: Union[str, pd.DataFrame], outputFilePath: str, date: str,
+                 timeSlot: Optional[str] = None, sumoNetFile: str = SUMO_NET_PATH,
+                 useNetSpeedForMissingEdges: bool = False) -> pd.DataFrame:
+    """
+    Generate detector flow file starting from a traffic loop measurement file. Measurements and modeled values are
+    joined in one merge and the flows of all the requested slots are computed at once.
     Args:
         inputFilePath: path of the Traffic measurement file from which to take information such as detectorID and edgeID
-        modelFilePath: path of the file that includes the information of the chosen traffic model
+        modelFilePath: path of the file (or DataFrame) that includes the information of the chosen traffic model. If
+                       it has a 'timeslot' column (as the state table saved by TrafficModeler.saveStateTable), the
+                       velocity of each slot is used (the mean velocity of its hours for a multiple-hour timeSlot);
+                       otherwise the same velocity is used for all the slots
         outputFilePath: path of the file to save the generated flow data
         date: date of the selected traffic flow
-        timeSlot: Time window value of the measurements to be evaluated reported in the format hh:mm-hh:mm
+        timeSlot: Time window value of the measurements to be evaluated reported in the format hh:mm-hh:mm. If None,
+                  the flows of the whole day are generated, one row per detector and one-hour slot, with Time set to
+                  the end of the slot in minutes from midnight
+        sumoNetFile: path of the SUMO network, whose edge speeds are used if useNetSpeedForMissingEdges is True
+        useNetSpeedForMissingEdges: if True, the edges missing in the model file use the maximum speed of the edge
+                                    in the SUMO network. Detectors whose edge has no velocity are reported and skipped
     Returns:
-        None: generates the Flow file, saving it in the path indicated in outputFilePath
-    """
-
-    input_df = pd.read_csv(inputFilePath, sep=';')
-    input_df = input_df[input_df['data'].str.contains(date)]
-    df_model = pd.read_csv(modelFilePath, sep=';', decimal=',')
-    data = []
-
-    for index, row in input_df.iterrows():
-        detectorID = row['ID_univoco_stazione_spira']
-        edge_id = row['edge_id']
-        gmodel = df_model.loc[df_model["edge_id"] == edge_id].iloc[0]
-        vPKW = gmodel['velocity'] * 3.6
+        DataFrame: the generated flow data, also saved in the path indicated in outputFilePath
+    """
+    input_df = loadTrafficData(inputFilePath, date=date)
+    if isinstance(modelFilePath, pd.DataFrame):
+        df_model = modelFilePath
+    else:
+        df_model = pd.read_csv(modelFilePath, sep=';', decimal=',')
+
+    if timeSlot is None:
+        # One row for each detector and one-hour slot of the day
+        slotColumns = [f"{hour:02d}:00-{hour + 1:02d}:00" for hour in range(24)]
+        flows = input_df[['ID_univoco_stazione_spira', 'edge_id'] + slotColumns].melt(
+            id_vars=['ID_univoco_stazione_spira', 'edge_id'], value_vars=slotColumns, var_name='timeslot',
+            value_name='qPKW')
+        flows['Time'] = (flows['timeslot'].str[:2].astype(int) + 1) * 60
+    else:
         first = int(timeSlot[:2])
         last = int(timeSlot[6:8])
-
-        # Calculate the vehicle count for the specified time slot
-        if last - first > 1:  # If the time slot spans multiple hours
-            total_count = sum(row[f"{hour:02d}:00-{(hour + 1) % 24:02d}:00"] for hour in range(first, last))
-            qPKW = str(total_count)
-            time = (last - first) * 60
-        else:
-            qPKW = str(row[timeSlot])
-            time = 60
-
-        data.append({
-            "Detector": detectorID,
-            "Time": time,
-            "qPKW": qPKW,
-            "qLKW": 0,
-            "vPKW": vPKW,
-            "vLKW": 0
-        })
-    output_df = pd.DataFrame(data)
+        # Calculate the vehicle count for the specified time slot, summing the hours of multiple-hour slots
+        slotColumns = [f"{hour:02d}:00-{hour + 1:02d}:00" for hour in range(first, last)]
+        flows = input_df[['ID_univoco_stazione_spira', 'edge_id']].copy()
+        flows['qPKW'] = input_df[slotColumns].sum(axis=1).to_numpy()
+        flows['timeslot'] = timeSlot
+        flows['Time'] = 60 if last - first == 1 else (last - first) * 60
+
+    # Link the modeled velocity of each edge (and slot, if available), keeping the first value as before
+    if 'timeslot' in df_model.columns and timeSlot is None:
+        modelKeys = ['edge_id', 'timeslot']
+        velocities = df_model[modelKeys + ['velocity']].drop_duplicates(modelKeys)
+    elif 'timeslot' in df_model.columns:
+        # only the velocities of the requested slot are used, averaged over the hours of multiple-hour slots
+        modelKeys = ['edge_id']
+        slotVelocities = df_model[df_model['timeslot'].isin(slotColumns)]
+        velocities = slotVelocities.groupby('edge_id', as_index=False, sort=False)['velocity'].mean()
+    else:
+        modelKeys = ['edge_id']
+        velocities = df_model[modelKeys + ['velocity']].drop_duplicates(modelKeys)
+    flows = flows.merge(velocities, on=modelKeys, how='left')
+    vPKW = flows['velocity'] * 3.6
+    missing = vPKW.isna()
+    if missing.any() and useNetSpeedForMissingEdges:
+        # edges without modeled values use the maximum speed of the edge (converted in km/h as the model velocity)
+        edgeSpeeds = loadEdgeAttributes(sumoNetFile)['speed']
+        vPKW[missing] = edgeSpeeds.reindex(flows.loc[missing, 'edge_id']).to_numpy() * 3.6 * 3.6
+        missing = vPKW.isna()
+    if missing.any():
+        print(f"No velocity found for edges {flows.loc[missing, 'edge_id'].unique().tolist()}: "
+              f"{flows.loc[missing, 'ID_univoco_stazione_spira'].nunique()} detectors skipped.")
+        flows = flows[~missing]
+        vPKW = vPKW[~missing]
+
+    output_df = pd.DataFrame({
+        "Detector": flows['ID_univoco_stazione_spira'],
+        "Time": flows['Time'],
+        "qPKW": flows['qPKW'],
+        "qLKW": 0,
+        "vPKW": vPKW,
+        "vLKW": 0
+    })
+    output_df = output_df.sort_values('Time', kind='stable')
     output_df.to_csv(outputFilePath, sep=';', index=False, float_format='%.4f', decimal=',')
+    return output_df
 
-def generateEdgeFromFlow(inputFlowPath: str, detectorFilePath: str, outputEdgePath: str):
-    script = r"C:\Program Files (x86)\Eclipse\Sumo\tools/detector/edgeDataFromFlow.py"
+def generateEdgeFromFlow(inputFlowPath: str, detectorFilePath: str, outputEdgePath: str) -> dict:
+    """
+    Generate the edge data file from the detector flows, through the edgeDataFromFlow SUMO tool.
+
+    :param inputFlowPath: Path of the detector flow file.
+    :param detectorFilePath: Path of the detector additional file.
+    :param outputEdgePath: Path of the output edge data file.
+    :return: the result of the edgeDataFromFlow job (see SumoToolPool.runToolJob).
+    """
     detector = detectorFilePath
     flow = inputFlowPath
     output = outputEdgePath
-    subprocess.run([sys.executable, script, "--detector-file", detector,
-                    "--detector-flow-file", flow, "--output-file", output, "--flow-columns", "qPKW", "-i", '61'])
-
+    result = getSumoToolPool().run("edgeDataFromFlow", ["--detector-file", detector,
+                                                        "--detector-flow-file", flow, "--output-file", output,
+                                                        "--flow-columns", "qPKW", "-i", '61'], check=False)
+    if result["error"] is not None:
+        print(f"edgeDataFromFlow failed: {result['error']}\n{result['stderr']}")
+    return result
+
+def runPreprocessingPipeline(trafficFlowFile: str = TRAFFIC_FLOW_OPENDATA_FILE_PATH,
+                             accuracyFile: str = ACCURACY_TRAFFIC_LOOP_OPENDATA_FILE_PATH,
+                             sumoNetFile: str = SUMO_NET_PATH, acceptedAccuracy: int = 95,
+                             startDate: Optional[str] = None, endDate: Optional[str] = None,
+                             zoneFilePath: Optional[str] = None, dailyDate: Optional[str] = None,
+                             datasetPath: Optional[str] = PROCESSED_TRAFFIC_FLOW_DATASET_PATH,
+                             chunkSize: int = 200000) -> int:
+    """
+    Run the whole preprocessing of the Open Data traffic flow dataset reading the raw file only once.
+    The raw file is read in chunks: missing directions, accuracy, date window and zones are applied to each chunk and
+    the accepted measurements are appended to a temporary file for each day, keeping in memory only the unique traffic
+    loops. These give the road names, detector coordinates and additional file and induction loops. The days are then
+    processed in chronological order, so that the measurements of a single day are in memory at a time: edge IDs are
+    linked and the day is appended to the processed traffic flow (as .csv and, if `datasetPath` is set, as
+    date-partitioned dataset) and to the real flow. Shadow types and daily flow are written at the end.
+    Args:
+        :param trafficFlowFile: Path to the raw Open Data traffic flow CSV file. The file is not modified.
+        :param accuracyFile: Path to the traffic loop accuracy CSV file.
+        :param sumoNetFile: Path to the SUMO network file.
+        :param acceptedAccuracy: Minimum accepted percentage of accuracy.
+        :param startDate: Start date of the time window, formatted as 'mm/dd/yyyy'. If None, the whole dataset is kept.
+        :param endDate: End date of the time window, formatted as 'mm/dd/yyyy'. If None, the whole dataset is kept.
+        :param zoneFilePath: File containing the statistical zones. If set, zone IDs are added to the measurements.
+        :param dailyDate: Date, formatted as 'dd/mm/yyyy', for which the daily flow file is generated.
+        :param datasetPath: Folder of the date-partitioned dataset. If None, only the .csv file is written.
+        :param chunkSize: Number of rows of the raw file read at a time.
+    Returns:
+        int: the number of processed measurements linked to the SUMO edges.
+    """
+    loopColumns = ['Nome via', 'ID_univoco_stazione_spira', 'geopoint']
+    accurateKeys = loadAccurateKeys(accuracyFile, date_column='data', sensor_id_column='codice_spira',
+                                    accepted_percentage=acceptedAccuracy)
+    stagingPath = tempfile.mkdtemp(prefix="traffic_flow_days_")
+    try:
+        # 1-4. Streaming part: directions, accuracy, date window and zones are applied chunk by chunk, and the accepted
+        # measurements are split into one file for each day (in the order of the raw file)
+        loops = []
+        readRows = acceptedRows = 0
+        for chunk in pd.read_csv(trafficFlowFile, sep=';', encoding="UTF-8", chunksize=chunkSize):
+            readRows += len(chunk)
+            chunk = fillMissingDirections(chunk)
+            chunk = filterWithAccuracy(chunk, None, date_column='data', sensor_id_column='codice_spira',
+                                       output_file=None, accepted_percentage=acceptedAccuracy, accurateKeys=accurateKeys)
+            if startDate is not None and endDate is not None:
+                chunk = filteringDataset(chunk, startDate, endDate, outputFilePath=None)
+            else:
+                chunk = chunk.assign(data=pd.to_datetime(chunk['data'], format='%d/%m/%Y'))
+            if chunk.empty:
+                continue
+            if zoneFilePath is not None:
+                chunk = addZones(chunk, zoneFilePath=zoneFilePath)
+            # the following steps work on the same date format written in the accurate traffic flow file
+            chunk = chunk.sort_values(by='data', kind='stable')
+            chunk['data'] = chunk['data'].dt.strftime('%Y-%m-%d')
+            acceptedRows += len(chunk)
+            loops.append(chunk.drop_duplicates(loopColumns)[['data'] + loopColumns])
+            for day, rows in chunk.groupby('data', sort=False):
+                dayFile = os.path.join(stagingPath, f"{day}.csv")
+                rows.to_csv(dayFile, sep=';', index=False, mode='a', header=not os.path.exists(dayFile))
+        print(f"Read {readRows} raw measurements, {acceptedRows} accepted.")
+        if acceptedRows == 0:
+            raise ValueError(f"No measurement of '{trafficFlowFile}' has been accepted")
+        # first occurrence of each traffic loop in chronological order, as in the reordered dataset
+        loops = pd.concat(loops, ignore_index=True).sort_values(by='data', kind='stable').drop_duplicates(loopColumns)
+
+        # 5-6. Road names and detectors
+        roadNames = generateRoadNamesFile(loops, sumoNetFile=sumoNetFile, roadNamesFilePath=None)
+        generateDetectorsCoordinatesFile(loops, detectorCoordinatesPath=EXTRACTED_DETECTOR_COORDINATES_FILE_PATH)
+        mapDetectorsFromCoordinates(sumoNetFile=sumoNetFile, detectorCoordinatesPath=EXTRACTED_DETECTOR_COORDINATES_FILE_PATH,
+                                    detectorFilePath=SUMO_DETECTORS_ADD_FILE_PATH)
+        generateInductionLoopFile(loops, inductionLoopPath=EXTRACTED_INDUCTION_LOOP_FILE_PATH)
+        roadNames = fillMissingEdgeId(roadNames)
+        os.makedirs(os.path.dirname(ROAD_NAMES_FILE_PATH), exist_ok=True)
+        roadNames.to_csv(ROAD_NAMES_FILE_PATH, sep=';', index=False)
+
+        # 7-9. Edge IDs, processed traffic flow and real flow, one day at a time in chronological order
+        dailyFile = f"{normalizeDate(dailyDate)}.csv" if dailyDate is not None else None
+        shadowLoops = []
+        processedRows = 0
+        for dayFile in sorted(os.listdir(stagingPath)):
+            df = linkEdgeId(pd.read_csv(os.path.join(stagingPath, dayFile), sep=';'), roadNames, outputFile=None)
+            if df.empty:
+                continue
+            df.index = pd.RangeIndex(processedRows, processedRows + len(df))
+            df.to_csv(PROCESSED_TRAFFIC_FLOW_EDGE_FILE_PATH, sep=';', index=False,
+                      mode='a' if processedRows else 'w', header=not processedRows)
+            if datasetPath is not None:
+                writePartitionedDataset(df, datasetPath, dateColumn='data', dateFormat='%Y-%m-%d')
+            generateRealFlow(df, append=processedRows > 0)
+            if dayFile == dailyFile:
+                dailyFilter(df, date=dailyDate)
+            shadowLoops.append(df.drop_duplicates(['Nome via', 'ID_univoco_stazione_spira']))
+            processedRows += len(df)
+        print(f"Processed traffic flow with {processedRows} measurements saved at '{PROCESSED_TRAFFIC_FLOW_EDGE_FILE_PATH}'")
+        if shadowLoops:
+            filterForShadowManager(pd.concat(shadowLoops, ignore_index=True))
+        return processedRows
+    finally:
+        shutil.rmtree(stagingPath, ignore_errors=True)
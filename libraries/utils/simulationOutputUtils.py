@@ -0,0 +1,119 @@
+import os
+import xml.etree.ElementTree as ET
+from typing import Dict, Iterator, Optional, Tuple
+
+import pandas as pd
+
+# Attributes read from the SUMO output files, with the corresponding column names of the simulation tables
+EDGE_DATA_ATTRIBUTES = {"id": "edge_id", "sampledSeconds": "sampled_seconds", "entered": "entered", "left": "left_count",
+                        "density": "density", "laneDensity": "lane_density", "occupancy": "occupancy",
+                        "waitingTime": "waiting_time", "timeLoss": "time_loss", "speed": "speed",
+                        "traveltime": "travel_time"}
+TRIP_INFO_ATTRIBUTES = {"id": "vehicle_id", "vType": "vtype", "depart": "depart", "departDelay": "depart_delay",
+                        "arrival": "arrival", "duration": "duration", "routeLength": "route_length",
+                        "waitingTime": "waiting_time", "timeLoss": "time_loss"}
+SUMMARY_ATTRIBUTES = {"time": "step_time", "loaded": "loaded", "inserted": "inserted", "running": "running",
+                      "waiting": "waiting", "ended": "ended", "halting": "halting", "meanSpeed": "mean_speed",
+                      "meanWaitingTime": "mean_waiting_time", "meanTravelTime": "mean_travel_time"}
+# Columns kept as text, all the others are converted to numbers
+TEXT_COLUMNS = {"edge_id", "vehicle_id", "vtype"}
+# SUMO output files written inside each time slot folder (see run.sumocfg)
+EDGE_DATA_OUTPUT_FILE = "output/edgedata-output.xml"
+TRIP_INFO_OUTPUT_FILE = "output/tripinfos.xml"
+SUMMARY_OUTPUT_FILE = "output/summary.xml"
+
+
+def iterateXmlElements(xmlFilePath: str, tag: str, parentTag: Optional[str] = None) -> Iterator[Tuple[dict, dict]]:
+    """
+    Iterate over the elements with a given tag of a (possibly large) XML file, without loading the whole tree:
+    elements are cleared once read.
+
+    :param xmlFilePath: path of the XML file
+    :param tag: tag of the elements to be read
+    :param parentTag: optional tag of the enclosing elements whose attributes are returned with each element
+    :return: a generator of (element attributes, enclosing element attributes) tuples
+    """
+    parentAttributes = {}
+    for event, element in ET.iterparse(xmlFilePath, events=("start", "end")):
+        if event == "start":
+            if element.tag == parentTag:
+                parentAttributes = dict(element.attrib)
+            continue
+        if element.tag == tag:
+            yield dict(element.attrib), parentAttributes
+            element.clear()
+        elif element.tag == parentTag:
+            element.clear()
+
+
+def buildOutputFrame(rows: list, attributes: Dict[str, str], extraColumns: Tuple[str, ...] = ()) -> pd.DataFrame:
+    """
+    Build the dataframe of a SUMO output, renaming the attributes into column names and converting them to numbers.
+    """
+    columns = list(extraColumns) + list(attributes.values())
+    df = pd.DataFrame(rows, columns=columns)
+    for column in columns:
+        if column not in TEXT_COLUMNS:
+            df[column] = pd.to_numeric(df[column], errors='coerce')
+    return df
+
+
+def readEdgeDataOutput(xmlFilePath: str) -> pd.DataFrame:
+    """
+    Read a SUMO edgedata output into a dataframe with one row for each edge and interval.
+
+    :param xmlFilePath: path of the edgedata-output.xml file
+    :return: a dataframe with the interval_begin and interval_end columns and the EDGE_DATA_ATTRIBUTES columns
+    """
+    rows = []
+    for attributes, interval in iterateXmlElements(xmlFilePath, "edge", parentTag="interval"):
+        rows.append([interval.get("begin"), interval.get("end")] +
+                    [attributes.get(attribute) for attribute in EDGE_DATA_ATTRIBUTES])
+    return buildOutputFrame(rows, EDGE_DATA_ATTRIBUTES, extraColumns=("interval_begin", "interval_end"))
+
+
+def readTripInfoOutput(xmlFilePath: str) -> pd.DataFrame:
+    """
+    Read a SUMO tripinfo output into a dataframe with one row for each completed trip.
+
+    :param xmlFilePath: path of the tripinfos.xml file
+    :return: a dataframe with the TRIP_INFO_ATTRIBUTES columns
+    """
+    rows = [[attributes.get(attribute) for attribute in TRIP_INFO_ATTRIBUTES]
+            for attributes, _ in iterateXmlElements(xmlFilePath, "tripinfo")]
+    return buildOutputFrame(rows, TRIP_INFO_ATTRIBUTES)
+
+
+def readSummaryOutput(xmlFilePath: str) -> pd.DataFrame:
+    """
+    Read a SUMO summary output into a dataframe with one row for each simulation step.
+
+    :param xmlFilePath: path of the summary.xml file
+    :return: a dataframe with the SUMMARY_ATTRIBUTES columns
+    """
+    rows = [[attributes.get(attribute) for attribute in SUMMARY_ATTRIBUTES]
+            for attributes, _ in iterateXmlElements(xmlFilePath, "step")]
+    return buildOutputFrame(rows, SUMMARY_ATTRIBUTES)
+
+
+def readSlotOutputs(slotFolderPath: str) -> Dict[str, pd.DataFrame]:
+    """
+    Read the outputs of a one-hour slot simulation: the SUMO edgedata, tripinfo and summary outputs and the
+    macroscopic model (model.csv) the simulation was configured from. Missing files are skipped.
+
+    :param slotFolderPath: path of the time slot folder (e.g. sumoenv/<configuration>/07-00-08-00)
+    :return: the dataframes by table name ("edgedata", "tripinfo", "summary", "macroscopic")
+    """
+    readers = {"edgedata": (EDGE_DATA_OUTPUT_FILE, readEdgeDataOutput),
+               "tripinfo": (TRIP_INFO_OUTPUT_FILE, readTripInfoOutput),
+               "summary": (SUMMARY_OUTPUT_FILE, readSummaryOutput)}
+    outputs = {}
+    for tableName, (fileName, reader) in readers.items():
+        filePath = os.path.join(slotFolderPath, fileName)
+        if os.path.isfile(filePath):
+            outputs[tableName] = reader(filePath)
+    modelFilePath = os.path.join(slotFolderPath, "model.csv")
+    if os.path.isfile(modelFilePath):
+        model = pd.read_csv(modelFilePath, sep=';', decimal=',', dtype={"edge_id": str})
+        outputs["macroscopic"] = model.rename(columns=lambda column: column.lower())
+    return outputs
@@ -8,6 +8,9 @@ from libraries.classes.Agent import *
 from libraries.classes.SumoSimulator import Simulator
 from libraries.classes.SubscriptionManager import QuantumLeapManager
 from libraries.classes.Broker import Broker
+from libraries.classes.AsyncBroker import AsyncBroker, replayEdgeFlows
+from libraries.classes.ContextServer import ContextServer
+from libraries.classes.QuantumLeapStandIn import QuantumLeapStandIn
 from libraries.classes.TrafficModeler import TrafficModeler
 from mobilityvenv.MobilityVirtualEnvironment import setupPhysicalSystem, startPhysicalSystem
 from data.preprocessing import preprocessingSetup
@@ -15,8 +18,8 @@ from data.preprocessing import preprocessingSetup
 
 if __name__ == "__main__":
 
-    # 0. Pre-processing phase (to be run only once)
-    # preprocessingSetup.run()
+    # 0. Pre-processing phase (to be run only once). Without dates the entire dataset is processed
+    # preprocessingSetup.run(startDate="02/01/2024", endDate="02/02/2024", dailyDate="01/02/2024")
 
     # 1. Instantiate Orion CB, IoT Agent and create three types of subscriptions.
     envVar = loadEnvVar(CONTAINER_ENV_FILE_PATH)
@@ -25,20 +28,37 @@ if __name__ == "__main__":
     cbport = envVar.get("ORIONLD_PORT")
     timescalePort = envVar.get("TIMESCALE_DB_PORT")
     quantumleapPort = envVar.get("QUANTUMLEAP_PORT")
+    # The JSON-LD contexts are served locally when JSONLD_CONTEXT_SERVER_URL is set (offline deployments)
+    if libraries.constants.JSONLD_CONTEXT_SERVER_URL is not None:
+        contextServer = ContextServer()
+        contextServer.start()
     contextBroker = Broker(pn=cbport, pnt=None, host="localhost", fiwareservice="openiot")
     cbConnection = contextBroker.createConnection()
     IoTAgent = Agent(aid="01", hostname="localhost", cb_port=cbport, south_port=iotasouth, northport=iotanorth, fw_service="openiot", fw_path="/")
-    quantumLeapManager = QuantumLeapManager(containerName="fiware-quantumleap", cbPort=cbport, quantumleapPort=quantumleapPort)
-
-    quantumLeapManager.createQuantumLeapSubscription(cbConnection=cbConnection, entityType="RoadSegment", attribute="trafficFlow", description="Notify me of Traffic Flow")
-    quantumLeapManager.createQuantumLeapSubscription(cbConnection=cbConnection, entityType="trafficflowobserved", attribute="trafficFlow", description="Notify me of Traffic Flow")
-    quantumLeapManager.createQuantumLeapSubscription(cbConnection=cbConnection, entityType="Device", attribute="trafficFlow", description="Notify me of traffic Flow")
-
-
-    #### Comment/decomment these two code lines to run the physical system.
+    if libraries.constants.QUANTUMLEAP_STANDIN_HOST is not None:
+        # notifications are only measured by the stand-in (see QuantumLeapStandIn.getStatistics or GET /v2/stats)
+        quantumLeapStandIn = QuantumLeapStandIn()
+        quantumLeapStandIn.start()
+        quantumLeapManager = QuantumLeapManager(containerName=libraries.constants.QUANTUMLEAP_STANDIN_HOST, cbPort=cbport, quantumleapPort=libraries.constants.QUANTUMLEAP_STANDIN_PORT)
+    else:
+        quantumLeapManager = QuantumLeapManager(containerName="fiware-quantumleap", cbPort=cbport, quantumleapPort=quantumleapPort)
+
+    # "live" notifies each trafficFlow change with all the attributes, "replay" only the persisted ones in a single
+    # subscription, "replay-batched" notifies them once per time interval; the stand-in also needs modifiedAt (sysAttrs) to measure the update-to-notification latency
+    quantumLeapManager.createProfileSubscriptions(cbConnection=cbConnection, profile=libraries.constants.QUANTUMLEAP_SUBSCRIPTION_PROFILE,
+                                                  systemAttributes=libraries.constants.QUANTUMLEAP_STANDIN_HOST is not None)
+    # subscriptions left by previous runs would send duplicate notifications to QuantumLeap
+    quantumLeapManager.removeStaleSubscriptions(cbConnection=cbConnection)
+
+
+    #### Comment/decomment these code lines to run the physical system. The incremental TrafficModeler keeps the
+    #### macroscopic model of the replayed date up to date with the measurements sent through the IoT Agent.
     # TODO: thread-multiprocessing
     # roads, files = setupPhysicalSystem(IoTAgent)
-    # startPhysicalSystem(roads)
+    # liveModeler = TrafficModeler(simulator=Simulator(configurationPath=SUMO_PATH + "/standalone", logFile=SUMO_PATH + "/standalone/command_log.txt"),
+    #                              trafficDataFile=PROCESSED_TRAFFIC_FLOW_EDGE_FILE_PATH, sumoNetFile=SUMO_NET_PATH, date='2024-02-01',
+    #                              incremental=True, stateFilePath=TRAFFIC_MODEL_STATE_FILE_PATH)
+    # startPhysicalSystem(roads, modeler=liveModeler)
 
     # 2. The DigitalTwinManager needs i) a DataManager for accessing data; ii) a SumoSimulator for running simulations
     #    iii) a Planner including a ScenarioGenerator for generating sumoenv scenarios.
@@ -49,8 +69,15 @@ if __name__ == "__main__":
         username="postgres",
         password="postgres"
     )
+    # hourly aggregates used for the slot retrievals (tables not yet created by QuantumLeap are skipped). The history is
+    # materialised only when an aggregate is created, afterwards its refresh policy keeps it up to date
+    timescaleManager.createContinuousAggregates()
     dataManager = DataManager("TwinDataManager")
     dataManager.addDBManager(timescaleManager)
+    # read replicas share the historical queries with the primary, which receives all the writes
+    for replicaHost, replicaPort in parseAddressList(envVar.get("TIMESCALE_DB_REPLICAS")):
+        dataManager.addDBManager(TimescaleManager(host=replicaHost, port=replicaPort, dbname="quantumleap",
+                                                  username="postgres", password="postgres"), primary=False)
 
     configurationPath = SUMO_PATH + "/standalone"
     logFile = SUMO_PATH + "/standalone/command_log.txt"
@@ -80,6 +107,14 @@ if __name__ == "__main__":
             generateEdgeDataFile(PROCESSED_TRAFFIC_FLOW_EDGE_FILE_PATH, date=simulationDate, time_slot=timeSlotFolder)
             twinPlanner.scenarioGenerator.generateRoute(inputEdgePath=EDGE_DATA_FILE_PATH, timeSlot=timeSlotFolder)
 
+    # 3b. Replay of the processed traffic flows of the simulation date on the Context Broker, one slot at a time. The
+    # entities of all the edges of a slot are updated concurrently (put replayFlows to true to run it).
+    replayFlows = False
+    if replayFlows:
+        asyncBroker = AsyncBroker(pn=cbport, pnt=None, host="localhost", fiwareservice="openiot")
+        for hour in range(24):
+            replayEdgeFlows(asyncBroker, date=simulationDate, timeSlot=f"{hour:02d}:00-{hour + 1:02d}:00")
+
     # 4. Simulation of one hour slot scenario. The function will open sumo gui. The play button must be pressed to run the simulation. When simulation ends, the function returns the folder path in which sumoenv files have been generated.
     # scenarioFolder = twinManager.simulateBasicScenarioForOneHourSlot(timeslot="00:00-01:00", date="2024/02/01", entityType='Road Segment', totalVehicles=100, minLoops=3, congestioned=False, activeGui=True, timecolumn="timeslot")
     # print(scenarioFolder)
@@ -28,6 +28,8 @@
 from libraries.constants import *
 from mobilityvenv.PhysicalSystemConnector import *
 from libraries.classes.Agent import Agent
+from libraries.classes.TrafficModeler import TrafficModeler
+from typing import Optional
 import datetime
 
 
@@ -99,11 +101,12 @@ def setupPhysicalSystem(agentInstance: Agent) -> tuple[dict,list]:
                         raise TypeError("Only Traffic Flow sensors are allowed")
     return road, files
 
-def startPhysicalSystem(roads: dict[int, PhysicalSystemConnector]):
+def startPhysicalSystem(roads: dict[int, PhysicalSystemConnector], modeler: Optional[TrafficModeler] = None):
     """
     Starts the simulation of data transmission for each Road containing one or more Traffic Loop sensors.
 
     :param roads: A dictionary of roads initialized in the setupPhysicalSystem function.
+    :param modeler: Optional incremental TrafficModeler fed with the measurements sent (see processingTlData).
     """
 
     [trafficData, files] = readingFiles(REAL_TRAFFIC_FLOW_DATA_MVENV_PATH)
@@ -117,5 +120,5 @@ def startPhysicalSystem(roads: dict[int, PhysicalSystemConnector]):
                 tempTimeSlot = "23:00-24:00"
             tempData = trafficData[file][["index", "data", tempTimeSlot, "Nome via", "ID_univoco_stazione_spira", "geopoint", "direzione"]]
             tempData.columns = tlColumnsNames
-            processingTlData(tempTimeSlot, tempData, roads)
+            processingTlData(tempTimeSlot, tempData, roads, modeler=modeler)
             time.sleep(10)
@@ -0,0 +1,152 @@
+# ****************************************************
+# Module Purpose:
+#   Serving of the artefacts produced by the simulation runs (plots, fcd.xml, tripinfos.xml, csv summaries).
+#
+#   Artefact paths are resolved through the run catalogue (ScenarioRun) instead of hard-coded folders, and can not
+#   leave the run folder. Responses carry ETag, Last-Modified and Cache-Control headers: run outputs never change once
+#   written, so they can be cached for a long time and revalidated with a 304. Single byte ranges are supported, so
+#   that large XML/CSV downloads can be resumed, and thumbnails of the images are generated on demand and kept next
+#   to the run outputs.
+#
+# ****************************************************
+import os
+import re
+from pathlib import Path
+from typing import Optional, Tuple
+
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+from .models import ScenarioRun
+from .scenarioCatalogue import getResultsPath, getScenarioCollectionPath, registerRun
+
+# Run outputs are written once, hence they can be cached for a year
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+THUMBNAILS_FOLDER = ".thumbnails"
+THUMBNAIL_MAX_WIDTH = 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+CONTENT_TYPES = {".png": "image/png", ".jpg": "image/jpeg", ".xml": "application/xml", ".csv": "text/csv"}
+
+
+def getRun(folderName: str) -> Optional[ScenarioRun]:
+    """
+    Get the catalogue entry of a run, indexing its folder if it is not catalogued yet.
+    """
+    run = ScenarioRun.objects.filter(folderName=folderName).first()
+    if run is None:
+        for kind, basePath in [(ScenarioRun.RESULT, getResultsPath()),
+                               (ScenarioRun.SCENARIO, getScenarioCollectionPath())]:
+            if basePath is not None:
+                run = registerRun(kind, os.path.join(basePath, folderName))
+                if run is not None:
+                    break
+    return run
+
+
+def resolveArtefact(folderName: str, relativePath: str) -> Path:
+    """
+    Resolve the path of an artefact of a run.
+
+    :param folderName: name of the run folder, as catalogued
+    :param relativePath: path of the artefact inside the run folder
+    :return: the absolute path of the artefact
+    :raises Http404: if the run or the artefact do not exist, or the path leaves the run folder
+    """
+    run = getRun(folderName)
+    if run is None:
+        raise Http404("Run not found")
+    runPath = Path(run.path).resolve()
+    artefactPath = (runPath / relativePath).resolve()
+    if runPath not in artefactPath.parents or not artefactPath.is_file():
+        raise Http404("Artefact not found")
+    return artefactPath
+
+
+def getThumbnail(imagePath: Path, width: int) -> Path:
+    """
+    Get a thumbnail of an image with the given width, generating it (in the THUMBNAILS_FOLDER of the image folder)
+    if missing or older than the image.
+    """
+    from PIL import Image
+
+    width = max(16, min(width, THUMBNAIL_MAX_WIDTH))
+    thumbnailPath = imagePath.parent / THUMBNAILS_FOLDER / f"{imagePath.stem}_{width}.png"
+    if not thumbnailPath.exists() or thumbnailPath.stat().st_mtime < imagePath.stat().st_mtime:
+        os.makedirs(thumbnailPath.parent, exist_ok=True)
+        with Image.open(imagePath) as image:
+            image.thumbnail((width, width * image.height // max(1, image.width)))
+            image.save(thumbnailPath, format="PNG")
+    return thumbnailPath
+
+
+def parseRange(rangeHeader: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single byte range ("bytes=start-end", "bytes=start-" or "bytes=-suffix").
+
+    :return: the first and the last byte (included), or None if the range is not satisfiable
+    """
+    match = RANGE_PATTERN.match(rangeHeader.strip())
+    if not match or (match.group(1) == "" and match.group(2) == ""):
+        return None
+    if match.group(1) == "":
+        start, end = max(0, size - int(match.group(2))), size - 1
+    else:
+        start = int(match.group(1))
+        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+def streamRange(path: Path, start: int, length: int):
+    with open(path, "rb") as file:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(STREAM_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serveArtefact(request, path: Path, immutable: bool = True) -> HttpResponse:
+    """
+    Serve a file with conditional (ETag/Last-Modified) and range support.
+
+    :param request: the HTTP request
+    :param path: absolute path of the file
+    :param immutable: if True, long-lived cache headers are sent
+    :return: a 200, 206, 304 or 416 response
+    """
+    stat = path.stat()
+    etag = quote_etag(f"{stat.st_size:x}-{stat.st_mtime_ns:x}")
+    lastModified = http_date(stat.st_mtime)
+    contentType = CONTENT_TYPES.get(path.suffix.lower(), "application/octet-stream")
+
+    ifNoneMatch = request.headers.get("If-None-Match")
+    ifModifiedSince = parse_http_date_safe(request.headers.get("If-Modified-Since", ""))
+    if (ifNoneMatch is not None and etag in [tag.strip() for tag in ifNoneMatch.split(",")]) or \
+            (ifNoneMatch is None and ifModifiedSince is not None and int(stat.st_mtime) <= ifModifiedSince):
+        response = HttpResponseNotModified()
+    else:
+        rangeHeader = request.headers.get("Range")
+        ifRange = request.headers.get("If-Range")
+        if rangeHeader and (ifRange is None or ifRange in (etag, lastModified)):
+            byteRange = parseRange(rangeHeader, stat.st_size)
+            if byteRange is None:
+                response = HttpResponse(status=416)
+                response["Content-Range"] = f"bytes */{stat.st_size}"
+                return response
+            start, end = byteRange
+            response = StreamingHttpResponse(streamRange(path, start, end - start + 1), status=206,
+                                             content_type=contentType)
+            response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+            response["Content-Length"] = str(end - start + 1)
+        else:
+            response = FileResponse(open(path, "rb"), content_type=contentType)
+    response["ETag"] = etag
+    response["Last-Modified"] = lastModified
+    response["Accept-Ranges"] = "bytes"
+    response["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if immutable else "no-cache"
+    return response
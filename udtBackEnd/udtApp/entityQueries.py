@@ -0,0 +1,86 @@
+# ****************************************************
+# Module Purpose:
+#   Queries on the Orion-LD entities collection used by the entityList view.
+#
+#   Entities are listed with keyset pagination on `_id.id` (each page starts after the last id of the previous one),
+#   reading only the fields shown in the listing, and filtered by type with an exact match on `_id.type`. Both
+#   filters are served by the indexes of EntityResolver.ensureEntityIndexes, which are created once with the
+#   createEntityIndexes management command rather than by the requests, since the collection belongs to Orion-LD. The
+#   list of entity types is cached, since it changes only when new entity types are created.
+#
+# ****************************************************
+from typing import List, Optional, Tuple
+
+from django.core.cache import cache
+
+from libraries.classes.EntityResolver import EntityResolver
+
+from .models import Device
+
+# Fields read for each entity of the listing
+ENTITY_LIST_PROJECTION = {"_id": 1, "modDate": 1}
+# Seconds for which the list of entity types is cached
+ENTITY_TYPES_CACHE_TIMEOUT = 300
+ENTITY_TYPES_CACHE_KEY = "udtApp.entityTypes"
+
+def getEntitiesCollection():
+    """
+    Get the pymongo collection of the Orion-LD entities, through the mongoengine connection of the Device model.
+    """
+    return Device._get_collection()
+
+
+def ensureEntityIndexes():
+    """
+    Create the indexes used by the keyset pagination and by the type filter, shared with the EntityResolver lookups
+    (setup step, see the createEntityIndexes management command).
+    """
+    EntityResolver.ensureEntityIndexes(getEntitiesCollection())
+
+
+def getEntityTypes() -> List[str]:
+    """
+    Get the sorted list of the entity types (full URIs), cached for ENTITY_TYPES_CACHE_TIMEOUT seconds.
+    """
+    return cache.get_or_set(ENTITY_TYPES_CACHE_KEY,
+                            lambda: sorted(getEntitiesCollection().distinct("_id.type")),
+                            ENTITY_TYPES_CACHE_TIMEOUT)
+
+
+def resolveEntityTypes(typeName: str) -> List[str]:
+    """
+    Get the entity types matching a type name, given either as full URI or as its last segment (e.g. "Device").
+    """
+    return [entityType for entityType in getEntityTypes()
+            if entityType == typeName or entityType.rsplit('/', 1)[-1] == typeName]
+
+
+def getEntityPage(typeName: str = "", after: Optional[str] = None, before: Optional[str] = None,
+                  pageSize: int = 10) -> Tuple[List[dict], bool, bool]:
+    """
+    Get a page of entities sorted by id, reading only the fields in ENTITY_LIST_PROJECTION.
+
+    :param typeName: optional type filter, as full URI or as its last segment
+    :param after: id of the last entity of the previous page, to get the next page
+    :param before: id of the first entity of the following page, to get the previous page
+    :param pageSize: number of entities of the page
+    :return: the entities of the page, whether a previous page exists and whether a next page exists
+    """
+    query = {}
+    if typeName:
+        query["_id.type"] = {"$in": resolveEntityTypes(typeName)}
+    backwards = before is not None and after is None
+    if backwards:
+        query["_id.id"] = {"$lt": before}
+    elif after is not None:
+        query["_id.id"] = {"$gt": after}
+    # one more entity is read to know if the page is followed by another one
+    cursor = getEntitiesCollection().find(query, ENTITY_LIST_PROJECTION) \
+        .sort("_id.id", -1 if backwards else 1).limit(pageSize + 1)
+    entities = list(cursor)
+    hasMore = len(entities) > pageSize
+    entities = entities[:pageSize]
+    if backwards:
+        entities.reverse()
+        return entities, hasMore, True
+    return entities, after is not None, hasMore
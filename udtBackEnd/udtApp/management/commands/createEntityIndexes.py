@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from udtApp.entityQueries import ensureEntityIndexes
+
+
+class Command(BaseCommand):
+    help = "Create on the Orion-LD entities collection the indexes used by the entity listing (one-off setup step)."
+
+    def handle(self, *args, **options):
+        ensureEntityIndexes()
+        self.stdout.write("Entity indexes available")
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from udtApp.scenarioCatalogue import syncCatalogue
+
+
+class Command(BaseCommand):
+    help = "Index the scenario and result folders into the ScenarioRun catalogue, optionally watching for new runs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--watch", action="store_true",
+                            help="keep synchronising the catalogue every --interval seconds")
+        parser.add_argument("--interval", type=float, default=30.0,
+                            help="seconds between two synchronisations in watch mode")
+
+    def handle(self, *args, **options):
+        while True:
+            count = syncCatalogue()
+            self.stdout.write(f"Scenario catalogue synchronised: {count} runs")
+            if not options["watch"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from udtApp.simulationJobs import recoverInterruptedJobs
+
+
+class Command(BaseCommand):
+    help = "Mark as failed the simulation jobs left queued or running by server processes that stopped."
+
+    def handle(self, *args, **options):
+        count = recoverInterruptedJobs()
+        self.stdout.write(f"Interrupted simulation jobs marked as failed: {count}")
@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('udtApp', '0008_delete_device_remove_trafficflow_md_delete_location_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimulationJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='queued', max_length=16)),
+                ('parameters', models.JSONField()),
+                ('progress', models.FloatField(default=0)),
+                ('message', models.CharField(blank=True, max_length=255)),
+                ('resultFolder', models.CharField(blank=True, max_length=255)),
+                ('error', models.TextField(blank=True)),
+                ('createdAt', models.DateTimeField(auto_now_add=True)),
+                ('startedAt', models.DateTimeField(blank=True, null=True)),
+                ('finishedAt', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['-createdAt'],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('udtApp', '0009_simulationjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScenarioRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('scenario', 'Scenario'), ('result', 'Result')], max_length=16)),
+                ('folderName', models.CharField(max_length=255)),
+                ('runType', models.CharField(max_length=255)),
+                ('runAt', models.DateTimeField()),
+                ('path', models.CharField(max_length=1024)),
+                ('folderModified', models.FloatField(default=0)),
+                ('imageFile', models.CharField(blank=True, max_length=255)),
+                ('summaryHeaders', models.JSONField(default=list)),
+                ('summaryRows', models.JSONField(default=list)),
+                ('indexedAt', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-runAt'],
+                'indexes': [models.Index(fields=['kind', 'runAt'], name='run_kind_date'),
+                            models.Index(fields=['kind', 'runType', 'runAt'], name='run_kind_type_date')],
+                'constraints': [models.UniqueConstraint(fields=('kind', 'folderName'), name='unique_run_folder')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('udtApp', '0010_scenariorun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='simulationjob',
+            name='owner',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='simulationjob',
+            name='heartbeatAt',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations, models
+
+
+def populateScenarioType(apps, schema_editor):
+    ScenarioRun = apps.get_model('udtApp', 'ScenarioRun')
+    for run in ScenarioRun.objects.filter(kind='scenario').only('id', 'runType'):
+        run.scenarioType = run.runType.strip().lower()
+        run.save(update_fields=['scenarioType'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('udtApp', '0011_simulationjob_owner_heartbeatat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='scenariorun',
+            name='scenarioType',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.RunPython(populateScenarioType, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='scenariorun',
+            name='run_kind_type_date',
+        ),
+        migrations.AddIndex(
+            model_name='scenariorun',
+            index=models.Index(fields=['kind', 'scenarioType', 'runAt'], name='run_kind_scenariotype_date'),
+        ),
+    ]
@@ -9,6 +9,68 @@ class Simulator(models.Model):
     configurationPath = models.CharField(max_length=255)
     routeFilePath = models.CharField(max_length=255)
 
+class SimulationJob(models.Model):
+    """
+    A calibration and simulation run (DigitalTwinManager.configureCalibrateAndRun) executed in background by the
+    simulation job workers. The job state is persisted, so that it can be polled by the status endpoints. The server
+    process owning the workers of the job refreshes its heartbeat while the job is queued or running.
+    """
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    STATUS_CHOICES = [(QUEUED, "Queued"), (RUNNING, "Running"), (COMPLETED, "Completed"), (FAILED, "Failed")]
+
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    parameters = models.JSONField()
+    progress = models.FloatField(default=0)
+    message = models.CharField(max_length=255, blank=True)
+    resultFolder = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+    createdAt = models.DateTimeField(auto_now_add=True)
+    startedAt = models.DateTimeField(null=True, blank=True)
+    finishedAt = models.DateTimeField(null=True, blank=True)
+    # server process (host:pid) whose workers run the job, and the last time it reported being alive
+    owner = models.CharField(max_length=255, blank=True)
+    heartbeatAt = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-createdAt']
+
+    def isFinished(self) -> bool:
+        return self.status in (self.COMPLETED, self.FAILED)
+
+class ScenarioRun(models.Model):
+    """
+    Catalogue entry of a run stored on the file system: a simulated scenario (scenarioCollection folders named
+    'yyyy-mm-dd_HH-MM-SS_type') or a calibration result (sumoenv folders named 'yyyy-mm-dd_model_..._params').
+    The entries are kept in sync with the folders by scenarioCatalogue, so that listing and filtering the runs are
+    indexed queries.
+    """
+    SCENARIO = "scenario"
+    RESULT = "result"
+    KIND_CHOICES = [(SCENARIO, "Scenario"), (RESULT, "Result")]
+
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    folderName = models.CharField(max_length=255)
+    # scenario type (e.g. basic, congestioned) or display name of the result
+    runType = models.CharField(max_length=255)
+    # normalised scenario type, matched exactly by the scenario filter (empty for the results)
+    scenarioType = models.CharField(max_length=255, blank=True)
+    runAt = models.DateTimeField()
+    path = models.CharField(max_length=1024)
+    folderModified = models.FloatField(default=0)
+    imageFile = models.CharField(max_length=255, blank=True)
+    summaryHeaders = models.JSONField(default=list)
+    summaryRows = models.JSONField(default=list)
+    indexedAt = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-runAt']
+        constraints = [models.UniqueConstraint(fields=['kind', 'folderName'], name='unique_run_folder')]
+        indexes = [models.Index(fields=['kind', 'runAt'], name='run_kind_date'),
+                   models.Index(fields=['kind', 'scenarioType', 'runAt'], name='run_kind_scenariotype_date')]
+
 class Misuration(models.Model):
     entity_id = models.CharField(max_length=255)
     time_index = models.DateTimeField()
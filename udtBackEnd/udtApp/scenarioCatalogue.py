@@ -0,0 +1,161 @@
+# ****************************************************
+# Module Purpose:
+#   Catalogue of the simulation runs stored on the file system, persisted in the ScenarioRun table.
+#
+#   The scenario folders (sumoenv/joined/scenarioCollection) and the calibration result folders (sumoenv) are parsed
+#   only when they are created or modified: the folder names are parsed into date and type, and the image and the
+#   mean_errors.csv summary of the results are read once and stored with the entry. The views then list, filter and
+#   show the runs through indexed queries. The catalogue is synchronised by the indexScenarios management command
+#   (at startup, and optionally as a polling watcher) and when a simulation job completes, never in the request path.
+#
+# ****************************************************
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+from typing import Optional, Tuple
+
+import pandas as pd
+from django.utils import timezone
+
+from .models import ScenarioRun
+
+# Scenario folders: "yyyy-mm-dd_HH-MM-SS_type"
+SCENARIO_FOLDER_PATTERN = re.compile(r"^(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})_(.+)$")
+# Result folders: "yyyy-mm-dd_Nome1_Nome2"
+RESULT_FOLDER_PATTERN = re.compile(r"^(\d{4}-\d{2}-\d{2})_(.+)$")
+RESULT_SUMMARY_FILE = "mean_errors.csv"
+
+
+def getProjectRoot() -> Path:
+    current_path = Path(os.path.abspath(os.getcwd())).resolve()
+    return current_path.parent
+
+
+def getScenarioCollectionPath() -> Optional[Path]:
+    """
+    Get the folder containing the simulated scenarios, or None if it does not exist.
+    """
+    project_root = getProjectRoot()
+    for base_dir in [project_root / 'sumoenv' / 'joined' / 'scenarioCollection',
+                     project_root / 'MOBIDT' / 'sumoenv' / 'joined' / 'scenarioCollection']:
+        if os.path.exists(base_dir):
+            return base_dir
+    return None
+
+
+def getResultsPath() -> Optional[Path]:
+    """
+    Get the folder containing the calibration results, or None if it does not exist.
+    """
+    project_root = getProjectRoot()
+    for base_dir in [project_root / 'sumoenv', project_root / 'MOBIDT' / 'sumoenv']:
+        if os.path.exists(base_dir):
+            return base_dir
+    return None
+
+
+def parseScenarioFolder(folderName: str) -> Optional[Tuple[datetime, str]]:
+    """
+    Parse the name of a scenario folder into its date and time and its type, or None if it does not match.
+    """
+    match = SCENARIO_FOLDER_PATTERN.match(folderName)
+    if not match:
+        return None
+    try:
+        runAt = datetime.strptime(match.group(1), '%Y-%m-%d_%H-%M-%S')
+    except ValueError:
+        return None
+    return timezone.make_aware(runAt), match.group(2)
+
+
+def normaliseScenarioType(scenarioType: str) -> str:
+    """
+    Normalise a scenario type (from a folder name or from the page filter), so that it can be matched exactly.
+    """
+    return scenarioType.strip().lower()
+
+
+def parseResultFolder(folderName: str) -> Optional[Tuple[datetime, str]]:
+    """
+    Parse the name of a result folder into its date and its display name, or None if it does not match.
+    """
+    match = RESULT_FOLDER_PATTERN.match(folderName)
+    if not match:
+        return None
+    try:
+        runAt = datetime.strptime(match.group(1), '%Y-%m-%d')
+    except ValueError:
+        return None
+    return timezone.make_aware(runAt), match.group(2).replace("_", " ").title()
+
+
+def readResultSummary(folderPath: str) -> Tuple[str, list, list]:
+    """
+    Read the artefacts shown for a result: the first .png image and the mean_errors.csv table.
+
+    :return: the image file name (empty if none), the table headers and the table rows
+    """
+    imageFile = next((file for file in sorted(os.listdir(folderPath)) if file.endswith(".png")), "")
+    headers, rows = [], []
+    csvFile = os.path.join(folderPath, RESULT_SUMMARY_FILE)
+    if os.path.exists(csvFile):
+        df = pd.read_csv(csvFile, sep=';', decimal=',')
+        # NaN values are not valid JSON
+        df = df.astype(object).where(pd.notna(df), None)
+        headers = df.columns.tolist()
+        rows = df.to_dict(orient="records")
+    return imageFile, headers, rows
+
+
+def registerRun(kind: str, folderPath: str, force: bool = False) -> Optional[ScenarioRun]:
+    """
+    Add or update the catalogue entry of a run folder. The folder is read again only if it has been modified since
+    it was indexed.
+
+    :param kind: ScenarioRun.SCENARIO or ScenarioRun.RESULT
+    :param folderPath: path of the run folder
+    :param force: if True, the folder is read even if not modified
+    :return: the catalogue entry, or None if the folder name does not match the expected format
+    """
+    folderName = os.path.basename(os.path.normpath(folderPath))
+    parsed = parseScenarioFolder(folderName) if kind == ScenarioRun.SCENARIO else parseResultFolder(folderName)
+    if parsed is None or not os.path.isdir(folderPath):
+        return None
+    runAt, runType = parsed
+    folderModified = os.path.getmtime(folderPath)
+    if kind == ScenarioRun.RESULT:
+        summaryFile = os.path.join(folderPath, RESULT_SUMMARY_FILE)
+        if os.path.exists(summaryFile):
+            folderModified = max(folderModified, os.path.getmtime(summaryFile))
+    run = ScenarioRun.objects.filter(kind=kind, folderName=folderName).first()
+    if run is not None and not force and run.folderModified == folderModified:
+        return run
+    if run is None:
+        run = ScenarioRun(kind=kind, folderName=folderName)
+    run.runType = runType
+    run.scenarioType = normaliseScenarioType(runType) if kind == ScenarioRun.SCENARIO else ""
+    run.runAt = runAt
+    run.path = str(folderPath)
+    run.folderModified = folderModified
+    if kind == ScenarioRun.RESULT:
+        run.imageFile, run.summaryHeaders, run.summaryRows = readResultSummary(folderPath)
+    run.save()
+    return run
+
+
+def syncCatalogue() -> int:
+    """
+    Synchronise the catalogue with the scenario and result folders: new or modified folders are indexed, entries
+    whose folder does not exist anymore are removed.
+
+    :return: the number of catalogued runs
+    """
+    for kind, basePath in [(ScenarioRun.SCENARIO, getScenarioCollectionPath()), (ScenarioRun.RESULT, getResultsPath())]:
+        folders = set()
+        if basePath is not None:
+            for folderName in os.listdir(basePath):
+                if registerRun(kind, os.path.join(basePath, folderName)) is not None:
+                    folders.add(folderName)
+        ScenarioRun.objects.filter(kind=kind).exclude(folderName__in=folders).delete()
+    return ScenarioRun.objects.count()
@@ -0,0 +1,180 @@
+# ****************************************************
+# Module Purpose:
+#   Background execution of the simulation jobs submitted by the simulationModeler view.
+#
+#   Jobs are stored in the SimulationJob table and executed by a local pool of worker processes, so that a calibration
+#   (up to 24 SUMO runs plus evaluation and plotting) does not keep an HTTP request open. Each worker builds the
+#   DigitalTwinManager (with its TimescaleDB connection and SUMO simulator) only once and reuses it for all the jobs it
+#   runs; progress is written to the job row while the job advances.
+#
+#   Each job records the server process owning its workers, which refreshes the heartbeat of its queued and running
+#   jobs. Jobs whose owner stopped beating (e.g. a server restart or crash) are marked as failed when a server process
+#   starts its job runner (getExecutor), periodically by the running server processes and on demand with the
+#   recoverSimulationJobs management command, never while their owner is alive.
+#
+# ****************************************************
+import logging
+import os
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from typing import Optional
+
+import django
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+
+# Number of jobs run in parallel. SUMO runs are heavy, hence a single worker by default
+SIMULATION_JOB_WORKERS = getattr(settings, "SIMULATION_JOB_WORKERS", 1)
+# Seconds between two heartbeats of the server process owning the jobs, and without heartbeat after which the owner
+# is considered gone
+SIMULATION_JOB_HEARTBEAT_INTERVAL = getattr(settings, "SIMULATION_JOB_HEARTBEAT_INTERVAL", 30)
+SIMULATION_JOB_HEARTBEAT_TIMEOUT = getattr(settings, "SIMULATION_JOB_HEARTBEAT_TIMEOUT",
+                                           4 * SIMULATION_JOB_HEARTBEAT_INTERVAL)
+
+logger = logging.getLogger(__name__)
+
+executor: Optional[ProcessPoolExecutor] = None
+# owner (host:pid) of the jobs submitted by this server process, set with the executor
+processOwner: Optional[str] = None
+# DigitalTwinManager of the worker process, built at its first job
+workerTwinManager = None
+
+
+def initializeWorker():
+    """
+    Initialize a worker process: Django is set up (needed when workers are spawned) and plots are only drawn to file.
+    """
+    os.environ.setdefault("MPLBACKEND", "Agg")
+    django.setup()
+    # database connections inherited from the server process (when workers are forked) must not be shared
+    from django.db import connections
+    connections.close_all()
+
+
+def getTwinManager():
+    """
+    Get the DigitalTwinManager of the worker process, creating it at the first call.
+    """
+    global workerTwinManager
+    if workerTwinManager is None:
+        from libraries.classes.DataManager import DataManager, TimescaleManager
+        from libraries.classes.DigitalTwinManager import DigitalTwinManager
+        from libraries.classes.SumoSimulator import Simulator
+        from libraries.constants import SUMO_PATH, CONTAINER_ENV_FILE_PATH
+        from libraries.utils.generalUtils import loadEnvVar, parseAddressList
+
+        envVar = loadEnvVar(CONTAINER_ENV_FILE_PATH)
+        timescaleManager = TimescaleManager(
+            host="localhost",
+            port=envVar.get("TIMESCALE_DB_PORT"),
+            dbname="quantumleap",
+            username="postgres",
+            password="postgres"
+        )
+        dataManager = DataManager("TwinDataManager")
+        dataManager.addDBManager(timescaleManager)
+        for replicaHost, replicaPort in parseAddressList(envVar.get("TIMESCALE_DB_REPLICAS")):
+            dataManager.addDBManager(TimescaleManager(host=replicaHost, port=replicaPort, dbname="quantumleap",
+                                                      username="postgres", password="postgres"), primary=False)
+        configurationPath = SUMO_PATH + "/standalone"
+        logFile = SUMO_PATH + "/standalone/command_log.txt"
+        sumoSimulator = Simulator(configurationPath=configurationPath, logFile=logFile)
+        workerTwinManager = DigitalTwinManager(dataManager=dataManager, simulator=sumoSimulator,
+                                               sumoConfigurationPath=configurationPath, sumoLogFile=logFile)
+    return workerTwinManager
+
+
+def runSimulationJob(jobId: int):
+    """
+    Execute a simulation job inside a worker process, keeping its row updated with status and progress.
+
+    :param jobId: the primary key of the SimulationJob to be executed
+    """
+    from .models import SimulationJob
+
+    jobs = SimulationJob.objects.filter(pk=jobId)
+    jobs.update(status=SimulationJob.RUNNING, startedAt=timezone.now(), message="Starting")
+    job = jobs.get()
+
+    def progressCallback(progress: float, message: str):
+        jobs.update(progress=progress, message=message[:255])
+
+    try:
+        folderResult = getTwinManager().configureCalibrateAndRun(**job.parameters, progressCallback=progressCallback,
+                                                                 showImage=False)
+        # the run is added to the catalogue before the job is completed, so that its results can be shown at once
+        from .models import ScenarioRun
+        from .scenarioCatalogue import registerRun
+        registerRun(ScenarioRun.RESULT, os.path.abspath(folderResult), force=True)
+        jobs.update(status=SimulationJob.COMPLETED, progress=1.0, message="Completed",
+                    resultFolder=os.path.basename(os.path.normpath(folderResult)), finishedAt=timezone.now())
+    except Exception as e:
+        jobs.update(status=SimulationJob.FAILED, message=f"{type(e).__name__}: {e}"[:255],
+                    error=traceback.format_exc(), finishedAt=timezone.now())
+
+
+def recoverInterruptedJobs() -> int:
+    """
+    Mark as failed the queued or running jobs whose owner stopped its heartbeat (e.g. a previous server process),
+    since their workers do not exist anymore. Jobs of the server processes that are alive are left untouched.
+
+    :return: the number of jobs marked as failed
+    """
+    from .models import SimulationJob
+    now = timezone.now()
+    expired = now - timedelta(seconds=SIMULATION_JOB_HEARTBEAT_TIMEOUT)
+    interrupted = SimulationJob.objects.filter(status__in=[SimulationJob.QUEUED, SimulationJob.RUNNING])
+    interrupted = interrupted.filter(heartbeatAt__isnull=True) | interrupted.filter(heartbeatAt__lt=expired)
+    return interrupted.update(status=SimulationJob.FAILED, message="Interrupted: the server running it stopped",
+                              finishedAt=now)
+
+
+def beatHeartbeat():
+    """
+    Refresh the heartbeat of the jobs owned by this server process, then recover the jobs of the stopped ones.
+    Runs in a daemon thread for the whole life of the executor.
+    """
+    from .models import SimulationJob
+    while True:
+        time.sleep(SIMULATION_JOB_HEARTBEAT_INTERVAL)
+        close_old_connections()
+        try:
+            SimulationJob.objects.filter(owner=processOwner, status__in=[SimulationJob.QUEUED, SimulationJob.RUNNING]) \
+                .update(heartbeatAt=timezone.now())
+            recoverInterruptedJobs()
+        except DatabaseError:
+            logger.exception("Simulation job heartbeat failed")
+
+
+def getExecutor() -> ProcessPoolExecutor:
+    """
+    Get the pool of worker processes, creating it (and the heartbeat of its jobs) at the first call. The jobs left
+    queued or running by stopped server processes are failed before the first job is queued.
+    """
+    global executor, processOwner
+    if executor is None:
+        recoverInterruptedJobs()
+        processOwner = f"{socket.gethostname()}:{os.getpid()}"
+        executor = ProcessPoolExecutor(max_workers=SIMULATION_JOB_WORKERS, initializer=initializeWorker)
+        threading.Thread(target=beatHeartbeat, name="simulation-job-heartbeat", daemon=True).start()
+    return executor
+
+
+def submitSimulationJob(parameters: dict):
+    """
+    Store a new simulation job and queue it to the workers.
+
+    :param parameters: keyword arguments of DigitalTwinManager.configureCalibrateAndRun (JSON serializable)
+    :return: the created SimulationJob
+    """
+    from .models import SimulationJob
+    pool = getExecutor()
+    job = SimulationJob.objects.create(parameters=parameters, message="Queued", owner=processOwner,
+                                       heartbeatAt=timezone.now())
+    pool.submit(runSimulationJob, job.pk)
+    return job
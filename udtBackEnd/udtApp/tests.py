@@ -1,3 +1,96 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from . import entityQueries
+from .artefacts import parseRange
+
+
+class FakeCursor:
+    def __init__(self, documents: list):
+        self.documents = documents
+
+    def sort(self, key, direction):
+        self.documents = sorted(self.documents, key=lambda document: document["_id"]["id"], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.documents = self.documents[:count]
+        return self
+
+    def __iter__(self):
+        return iter(self.documents)
+
+
+class FakeEntitiesCollection:
+    """
+    In-memory stand-in of the Orion-LD entities collection, supporting the queries of entityQueries.
+    """
+    def __init__(self, documents: list):
+        self.documents = documents
+
+    def distinct(self, field):
+        return list({document["_id"]["type"] for document in self.documents})
+
+    def find(self, query, projection=None):
+        def matches(document):
+            typeFilter = query.get("_id.type")
+            if typeFilter is not None and document["_id"]["type"] not in typeFilter["$in"]:
+                return False
+            idFilter = query.get("_id.id", {})
+            if "$gt" in idFilter and not document["_id"]["id"] > idFilter["$gt"]:
+                return False
+            if "$lt" in idFilter and not document["_id"]["id"] < idFilter["$lt"]:
+                return False
+            return True
+        return FakeCursor([document for document in self.documents if matches(document)])
+
+
+class RangeRequestTests(SimpleTestCase):
+    def testParseRange(self):
+        self.assertEqual(parseRange("bytes=0-99", 1000), (0, 99))
+        self.assertEqual(parseRange("bytes=900-", 1000), (900, 999))
+        self.assertEqual(parseRange("bytes=-100", 1000), (900, 999))
+        self.assertEqual(parseRange("bytes=990-2000", 1000), (990, 999))
+        self.assertIsNone(parseRange("bytes=1000-", 1000))
+        self.assertIsNone(parseRange("bytes=50-10", 1000))
+        self.assertIsNone(parseRange("bytes=-", 1000))
+        self.assertIsNone(parseRange("items=0-1", 1000))
+
+
+class EntityPageTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        documents = [{"_id": {"id": f"urn:ngsi-ld:Device:{index:02d}", "type": "https://uri.fiware.org/ns/Device"}}
+                     for index in range(5)]
+        documents += [{"_id": {"id": "urn:ngsi-ld:RoadSegment:01",
+                               "type": "https://smartdatamodels.org/dataModel.Transportation/RoadSegment"}}]
+        self.collection = FakeEntitiesCollection(documents)
+        patcher = mock.patch.object(entityQueries, "getEntitiesCollection", return_value=self.collection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def ids(entities):
+        return [entity["_id"]["id"][-2:] for entity in entities]
+
+    def testForwardPages(self):
+        entities, hasPrevious, hasNext = entityQueries.getEntityPage(typeName="Device", pageSize=2)
+        self.assertEqual((self.ids(entities), hasPrevious, hasNext), (["00", "01"], False, True))
+        entities, hasPrevious, hasNext = entityQueries.getEntityPage(typeName="Device", after=entities[-1]["_id"]["id"],
+                                                                     pageSize=2)
+        self.assertEqual((self.ids(entities), hasPrevious, hasNext), (["02", "03"], True, True))
+        entities, hasPrevious, hasNext = entityQueries.getEntityPage(typeName="Device", after=entities[-1]["_id"]["id"],
+                                                                     pageSize=2)
+        self.assertEqual((self.ids(entities), hasPrevious, hasNext), (["04"], True, False))
+
+    def testBackwardPage(self):
+        entities, hasPrevious, hasNext = entityQueries.getEntityPage(typeName="Device",
+                                                                     before="urn:ngsi-ld:Device:03", pageSize=2)
+        self.assertEqual((self.ids(entities), hasPrevious, hasNext), (["01", "02"], True, True))
+
+    def testTypeFilterByFullUri(self):
+        entities, _, _ = entityQueries.getEntityPage(
+            typeName="https://smartdatamodels.org/dataModel.Transportation/RoadSegment")
+        self.assertEqual([entity["_id"]["id"] for entity in entities], ["urn:ngsi-ld:RoadSegment:01"])
@@ -13,9 +13,13 @@ urlpatterns = [
     path("entityList", views.entityList, name='entityList'),
     path("entityList/<str:entity_id>", views.entity, name='entity'),
     path("simulationModeler", views.simulationModeler, name='simulationModeler'),
+    path("simulationJobs", views.simulationJobList, name='simulationJobList'),
+    path("simulationJobs/<int:job_id>", views.simulationJob, name='simulationJob'),
+    path("simulationJobs/<int:job_id>/status", views.simulationJobStatus, name='simulationJobStatus'),
     path("simulation", views.simulation, name='simulation'),
     path("simulation/<str:folder>/", views.serve_image, name='serve_image'),
     path("simulationResults", views.simulationResults, name='simulationResults'),
     path("simulationResults/<str:folder_name>/", views.serveResults, name='serveResults'),
     path("image/<str:folder_name>/", views.serve_image, name="serve_image"),
+    path("runs/<str:folder_name>/<path:file_path>", views.runArtefact, name="runArtefact"),
 ]
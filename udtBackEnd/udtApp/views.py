@@ -1,29 +1,22 @@
-from django.core.paginator import Paginator
 import os
-import re
-from datetime import datetime
-from pathlib import Path
+from datetime import datetime, timedelta
 
-import pandas as pd
-from django.core.paginator import Paginator
-from django.http import FileResponse, Http404
-from django.http import HttpResponse
-from django.shortcuts import render
+from django.http import Http404
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
 from django.contrib import messages
 
-from libraries.constants import PROCESSED_TRAFFIC_FLOW_EDGE_FILE_PATH, SUMO_PATH, CONTAINER_ENV_FILE_PATH
-from libraries.classes.DigitalTwinManager import DigitalTwinManager
-from libraries.classes.DataManager import *
-from libraries.classes.Planner import Planner
-from libraries.classes.DigitalTwinManager import DigitalTwinManager
-from libraries.classes.Agent import *
-from libraries.classes.SumoSimulator import Simulator
-from libraries.classes.SubscriptionManager import QuantumLeapManager
-from libraries.classes.Broker import Broker
-from libraries.utils.generalUtils import loadEnvVar
+from libraries.constants import PROCESSED_TRAFFIC_FLOW_EDGE_FILE_PATH
 # from libraries.classes.DigitalTwinManager import configureCalibrateAndRun
 from .forms import ConfigForm
-from .models import Device
+from .models import Device, SimulationJob, ScenarioRun
+from .simulationJobs import submitSimulationJob
+from .entityQueries import getEntityTypes, getEntityPage
+from .scenarioCatalogue import registerRun, getScenarioCollectionPath, getResultsPath, \
+    normaliseScenarioType
+from .artefacts import getRun, resolveArtefact, getThumbnail, serveArtefact
 
 
 def index(request):
@@ -44,46 +37,32 @@ def entity(request, entity_id):
         return HttpResponse("No device found with this ID", status=404)
 
 def entityList(request):
+    """
+    List the entities stored by Orion-LD, optionally filtered by type. Pages are read with keyset pagination
+    (parameters 'after' and 'before'), so that each page costs an indexed range query (see entityQueries).
+    """
     # Prendi il parametro 'type' dalla querystring
     device_type = request.GET.get('type', '')
+    device_types = getEntityTypes()
+    if not device_types:
+        return HttpResponse("There is no device inside the DB")
 
-    device_types = sorted(Device.objects.distinct('_id.type'))
-    print(device_types)
-    # Filtro per il tipo di dispositivo, se specificato
-    if device_type:
-        # deviceList = Device.objects.filter(_id__type__exact=device_type)
-        deviceList = Device.objects.filter(__raw__={'_id.type': {'$regex': f".*{device_type}$"}})
-    else:
-        deviceList = Device.objects.all()
-
-    print(f"Devices count: {deviceList.count()}")
-    paginator = Paginator(deviceList, 10)
-    pageNumber = request.GET.get('page')
-
-    page_obj = paginator.get_page(pageNumber)
-
+    entities, has_previous, has_next = getEntityPage(typeName=device_type, after=request.GET.get('after'),
+                                                     before=request.GET.get('before'), pageSize=10)
     context = {
-        'page_obj': page_obj,
+        'page_obj': entities,
+        'has_previous': has_previous,
+        'has_next': has_next,
+        'first_id': entities[0]['_id']['id'] if entities else None,
+        'last_id': entities[-1]['_id']['id'] if entities else None,
         'device_types': device_types,
         'request': request,  # Necessario per mantenere il filtro durante la paginazione
     }
-
-    if deviceList:
-        return render(request, 'udtApp/entityList.html', context)
-    else:
-        return HttpResponse("There is no device inside the DB")
+    return render(request, 'udtApp/entityList.html', context)
 
 def simulation(request):
-
-    # Getting the absolute path of the scenarioCollection folder
-    current_dir = os.path.abspath(os.getcwd())
-    current_path = Path(current_dir).resolve()
-    project_root = current_path.parent
-    base_dir = project_root / 'sumoenv' / 'joined' / 'scenarioCollection'
-    if not os.path.exists(base_dir):
-        base_dir = project_root / 'MOBIDT' / 'sumoenv' / 'joined' / 'scenarioCollection'
-        if not os.path.exists(base_dir):
-            return render(request, 'udtApp/emptyPage.html', {'item': 'Scenario folder'})
+    if getScenarioCollectionPath() is None:
+        return render(request, 'udtApp/emptyPage.html', {'item': 'Scenario folder'})
 
     # Get the selected type (in the page filter). Default is 'basic'
     selected_type = request.GET.get('type', 'basic')
@@ -97,22 +76,17 @@ def simulation(request):
     default_date = today.strftime('%Y-%m-%d')
 
     selected_start_datetime = datetime.strptime(f"{selected_date} {start_time}", '%Y-%m-%d %H:%M')
-    selected_end_datetime = datetime.strptime(f"{selected_date} {end_time}", '%Y-%m-%d %H:%M')
-
-    # List of folders containing 'basic' or 'congestioned' in the name
-    folders = []
-    for folder_name in os.listdir(base_dir):
-        try:
-            # La cartella ha una data nel formato YYYY-MM-DD_HH-MM-SS_tipo
-            folder_datetime_str, folder_type = folder_name.rsplit('_', 1)
-            folder_datetime = datetime.strptime(folder_datetime_str, '%Y-%m-%d_%H-%M-%S')
+    if end_time == '24:00':
+        selected_end_datetime = datetime.strptime(selected_date, '%Y-%m-%d') + timedelta(days=1)
+    else:
+        selected_end_datetime = datetime.strptime(f"{selected_date} {end_time}", '%Y-%m-%d %H:%M')
 
-            # Verifica se la cartella è del tipo selezionato e se rientra nell'intervallo orario
-            if (selected_type in folder_type) and (selected_start_datetime <= folder_datetime <= selected_end_datetime):
-                folders.append(folder_name)
-        except ValueError:
-            # Se la cartella non ha il formato atteso, ignorala
-            continue
+    # Scenarios of the selected type in the selected time interval, from the catalogue
+    folders = list(ScenarioRun.objects.filter(kind=ScenarioRun.SCENARIO,
+                                              scenarioType=normaliseScenarioType(selected_type),
+                                              runAt__range=(timezone.make_aware(selected_start_datetime),
+                                                            timezone.make_aware(selected_end_datetime)))
+                   .order_by('runAt').values_list('folderName', flat=True))
 
     context = {
         'folders': folders,
@@ -150,144 +124,126 @@ def simulation(request):
 #     return render(request, 'udtApp/simulationScenario.html', context)
 
 def simulationModeler(request):
-    envVar = loadEnvVar(CONTAINER_ENV_FILE_PATH)
-    timescalePort = envVar.get("TIMESCALE_DB_PORT")
+    """
+    Show the calibration form and, on POST, queue a calibration and simulation job. The job runs in background
+    (see simulationJobs); the response is a redirect to the job page, or the job ID (HTTP 202) for JSON clients.
+    """
     if request.method == 'POST':
-        timescaleManager = TimescaleManager(
-            host="localhost",
-            port=timescalePort,
-            dbname="quantumleap",
-            username="postgres",
-            password="postgres"
-        )
-        dataManager = DataManager("TwinDataManager")
-        dataManager.addDBManager(timescaleManager)
-        configurationPath = SUMO_PATH + "/standalone"
-        logFile = SUMO_PATH + "/standalone/command_log.txt"
-        sumoSimulator = Simulator(configurationPath=configurationPath, logFile=logFile)
-        twinManager = DigitalTwinManager(dataManager=dataManager, simulator=sumoSimulator,
-                                         sumoConfigurationPath=configurationPath, sumoLogFile=logFile)
         form = ConfigForm(request.POST)
         if form.is_valid():
-            messages.success(request, "Simulation Completed!")
             data = form.cleaned_data
             time_slot = [int(data['start_time']), int(data['end_time'])]
 
-            # Creiamo un dizionario con i parametri
-            params = {
-                'macromodel': data['macromodel'],
-                'car_following_model': data['car_following_model'],
-                'tau': str(data['tau']),
-                'time_slot': time_slot,
-                'date': data['data'].strftime('%Y-%m-%d'),
-            }
-
             # Aggiunta degli additional parameters in base al modello selezionato
             if data['car_following_model'] == 'Krauss':
                 additional_param = {'sigma': str(data['sigma']),
                                     'sigmaStep': str(data['sigma_step'])}
-                folderResult = twinManager.configureCalibrateAndRun(dataFilePath=PROCESSED_TRAFFIC_FLOW_EDGE_FILE_PATH,
-                                                  macroModelType=params['macromodel'],
-                                                  carFollowingModel=params['car_following_model'], tau=params['tau'],
-                                                  parameters=additional_param,
-                                                  date=params['date'], timeslot=time_slot, edge_id='23288872#4')
             elif data['car_following_model'] == 'IDM':
                 additional_param = {'delta': str(data['delta']),
                                     'stepping': str(data['stepping'])}
-                folderResult = twinManager.configureCalibrateAndRun(dataFilePath=PROCESSED_TRAFFIC_FLOW_EDGE_FILE_PATH,
-                                                  macroModelType=params['macromodel'],
-                                                  carFollowingModel=params['car_following_model'], tau=params['tau'],
-                                                  parameters=additional_param,
-                                                  date=params['date'], timeslot=time_slot,
-                                                  edge_id='23288872#4')
-            elif data['car_following_model'] == 'W99':
-
+            else:
                 additional_param = {'cc1': str(data['cc1']),
                                     'cc2': str(data['cc2'])}
-                folderResult = twinManager.configureCalibrateAndRun(dataFilePath=PROCESSED_TRAFFIC_FLOW_EDGE_FILE_PATH,
-                                                  macroModelType=params['macromodel'],
-                                                  carFollowingModel=params['car_following_model'], tau=params['tau'],
-                                                  parameters=additional_param,
-                                                  date=params['date'], timeslot=time_slot,
-                                                  edge_id='23288872#4')
-                print("Executed simulation " + str(folderResult))
-            messages.success(request, "Simulation Completed!")
-            folderResult = os.path.basename(os.path.normpath(folderResult))
-            print(str(folderResult))
-            return serveResults(request, folderResult)
-            # return render(request, 'udtApp/result.html', {'result': context})
+
+            # keyword arguments of DigitalTwinManager.configureCalibrateAndRun
+            params = {
+                'dataFilePath': PROCESSED_TRAFFIC_FLOW_EDGE_FILE_PATH,
+                'macroModelType': data['macromodel'],
+                'carFollowingModel': data['car_following_model'],
+                'tau': str(data['tau']),
+                'parameters': additional_param,
+                'date': data['data'].strftime('%Y-%m-%d'),
+                'timeslot': time_slot,
+                'edge_id': '23288872#4',
+            }
+            job = submitSimulationJob(params)
+            if 'application/json' in request.headers.get('Accept', ''):
+                return JsonResponse({'job_id': job.pk, 'status_url': reverse('simulationJobStatus', args=[job.pk])},
+                                    status=202)
+            messages.success(request, f"Simulation queued (job {job.pk})")
+            return redirect('simulationJob', job_id=job.pk)
     else:
         form = ConfigForm()
 
     return render(request, 'udtApp/simulationModeler.html', {'form': form})
-def serve_image(request, folder_name):
-    BASE_DIR = "C:/Users/manfr/PycharmProjects/IntelliFlowTwin/sumoenv"
-    """View per servire l'immagine 'plotResults.png' dalla cartella specificata."""
-    image_path = os.path.join(BASE_DIR, folder_name, "plotResults.png")
 
-    if os.path.exists(image_path):
-        return FileResponse(open(image_path, "rb"), content_type="image/png")
-    else:
-        raise Http404("Immagine non trovata")
-def simulationResults(request):
-    # Regex per il formato "yyyy_mm_dd_Nome1_Nome2"
-    FOLDER_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}_(.+)$")  # Nota il $ alla fine
+def simulationJobStatus(request, job_id):
+    """
+    Status and progress of a simulation job, as JSON. When the job is completed, the URL of its results is included.
+    """
+    job = get_object_or_404(SimulationJob, pk=job_id)
+    return JsonResponse({
+        'job_id': job.pk,
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'error': job.error if job.status == SimulationJob.FAILED else None,
+        'created_at': job.createdAt.isoformat(),
+        'started_at': job.startedAt.isoformat() if job.startedAt else None,
+        'finished_at': job.finishedAt.isoformat() if job.finishedAt else None,
+        'result_url': reverse('serveResults', args=[job.resultFolder]) if job.resultFolder else None,
+    })
+
+def simulationJob(request, job_id):
+    """
+    Page following a simulation job: it polls simulationJobStatus and opens the results when the job completes.
+    """
+    job = get_object_or_404(SimulationJob, pk=job_id)
+    return render(request, 'udtApp/simulationJob.html', {'job': job})
+
+def simulationJobList(request):
+    """
+    The most recent simulation jobs, as JSON.
+    """
+    jobs = SimulationJob.objects.all()[:50]
+    return JsonResponse({'jobs': [{'job_id': job.pk, 'status': job.status, 'progress': job.progress,
+                                   'message': job.message, 'created_at': job.createdAt.isoformat()}
+                                  for job in jobs]})
 
-    # Getting the absolute path of the scenarioCollection folder
-    current_dir = os.path.abspath(os.getcwd())
-    current_path = Path(current_dir).resolve()
-    project_root = current_path.parent
-    base_dir = project_root / 'sumoenv'
-    if not os.path.exists(base_dir):
-        base_dir = project_root / 'MOBIDT' / 'sumoenv'
-        if not os.path.exists(base_dir):
-            return render(request, 'udtApp/emptyPage.html', {'item': 'Scenario folder'})
-    folders = []
-    for folder in os.listdir(base_dir):
-        if os.path.isdir(os.path.join(base_dir, folder)):
-            match = FOLDER_PATTERN.match(folder)
-            if match:
-                print(match)
-                display_name = match.group(1).replace("_", " ").title()  # Rimuove underscore
-                folders.append({"full_name": folder, "display_name": display_name})
+def serve_image(request, folder_name):
+    """
+    Serve the result plot of a run ('plotResults.png' or the image found in the run folder). With ?width=N a
+    thumbnail of that width is served instead.
+    """
+    run = getRun(folder_name)
+    if run is None:
+        raise Http404("Immagine non trovata")
+    imagePath = resolveArtefact(folder_name, run.imageFile or "plotResults.png")
+    width = request.GET.get('width')
+    if width and width.isdigit():
+        imagePath = getThumbnail(imagePath, int(width))
+    # versioned URLs (?v=...) never change, the others are revalidated through the ETag
+    return serveArtefact(request, imagePath, immutable='v' in request.GET)
+
+def runArtefact(request, folder_name, file_path):
+    """
+    Serve any artefact of a run (e.g. output/fcd.xml, tripinfos.xml, mean_errors.csv), with range support.
+    """
+    return serveArtefact(request, resolveArtefact(folder_name, file_path), immutable='v' in request.GET)
 
+def simulationResults(request):
+    if getResultsPath() is None:
+        return render(request, 'udtApp/emptyPage.html', {'item': 'Scenario folder'})
+    folders = [{"full_name": run.folderName, "display_name": run.runType}
+               for run in ScenarioRun.objects.filter(kind=ScenarioRun.RESULT).only('folderName', 'runType')]
     return render(request, "udtApp/simulationResults.html", {"folders": folders})
 
 
 
 def serveResults(request, folder_name):
-    FOLDER_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}_(.+)$")  # Nota il $ alla fine
-    # folder_path = os.path.join(settings.MEDIA_ROOT, "your_directory", folder_name)
-    current_dir = os.path.abspath(os.getcwd())
-    current_path = Path(current_dir).resolve()
-    project_root = current_path.parent
-    base_dir = project_root / 'sumoenv'
-    folder_path = os.path.join(base_dir, folder_name)
-    # Controlla che la cartella esista e rispetti il pattern
-    if os.path.exists(folder_path):
-        files = os.listdir(folder_path)
-
-        # Find a .png file inside the directory
-        image_file = None
-        for file in files:
-            if file.endswith(".png"):
-                image_file = file
-                break
-        csv_file = os.path.join(folder_path, "mean_errors.csv")
-        table_data = None
-        headers = []
-        if os.path.exists(csv_file):  # Se il file esiste, lo carica
-            df = pd.read_csv(csv_file, sep=';', decimal=',')  # Legge il CSV
-            table_data = df.to_dict(orient="records")  # Converte in lista di dizionari
-            headers = df.columns.tolist()  # Prende le intestazioni
-        context = {
-            "folder_name": folder_name,
-            "image_url": f"/media/{folder_name}/{image_file}" if image_file else None,
-            "table_data": table_data,
-            "headers": headers
-            }
-        print(f"{folder_path}/{image_file}")
-        return render(request, "udtApp/result.html", context)
-            # return render(request, "view_folder.html", {"folder_name": folder_name, "files": files})
-    else:
-        return render(request, "error.html", {"message": "Folder not found or access not allowed."})
\ No newline at end of file
+    run = ScenarioRun.objects.filter(kind=ScenarioRun.RESULT, folderName=folder_name).first()
+    if run is None:
+        # the run may have been created after the last synchronisation of the catalogue
+        resultsPath = getResultsPath()
+        if resultsPath is not None:
+            run = registerRun(ScenarioRun.RESULT, os.path.join(resultsPath, folder_name))
+    if run is None:
+        return render(request, "error.html", {"message": "Folder not found or access not allowed."})
+    context = {
+        "folder_name": folder_name,
+        "image_url": reverse('runArtefact', args=[folder_name, run.imageFile]) + f"?v={int(run.folderModified)}"
+        if run.imageFile else None,
+        "table_data": run.summaryRows or None,
+        "headers": run.summaryHeaders,
+    }
+    return render(request, "udtApp/result.html", context)